@@ -177,7 +177,7 @@ class InvoiceAdmin(ImportExportModelAdmin):
     actions = ['mark_as_paid', 'mark_as_overdue']
     
     def mark_as_paid(self, request, queryset):
-        updated = queryset.update(status='paid')
+        updated = queryset.update(status='paid', updated_at=now())
         self.message_user(request, f"{updated} invoices marked as paid.")
     mark_as_paid.short_description = "Mark selected invoices as paid"
     
@@ -6,8 +6,7 @@ from .models import (
     ConnectionRequest, Contract, Invoice, Payment, SupportTicket
 )
 
-from django.apps import apps
-from django.db.models import Q
+from .utils.reference_cache import get_status
 
 class ContextAwareStatusWidget(ForeignKeyWidget):
     def __init__(self, model, context_name, field='status', **kwargs):
@@ -16,17 +15,11 @@ class ContextAwareStatusWidget(ForeignKeyWidget):
     
     def clean(self, value, row=None, *args, **kwargs):
         if value:
-            try:
-                # Get StatusContext
-                StatusContext = apps.get_model('api', 'StatusContext')
-                context = StatusContext.objects.get(context=self.context_name)
-                
-                # Try to find status in the correct context
-                return self.model.objects.get(
-                    Q(status=value) & Q(context=context)
-                )
-            except (self.model.DoesNotExist, StatusContext.DoesNotExist):
+            # Find the status in the correct context
+            status = get_status(self.context_name, value)
+            if status is None:
                 raise ValueError(f"Status '{value}' not found in context '{self.context_name}'")
+            return status
         return None
 
 class UserResource(resources.ModelResource):
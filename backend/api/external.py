@@ -81,14 +81,14 @@ class ExternalCustomerView(APIView):
         if pk is None:
             # If admin, return list of all customers
             if request.is_admin:
-                customers = Customer.objects.all()
+                customers = CustomerSerializer.setup_eager_loading(Customer.objects.all())
                 serializer = CustomerSerializer(customers, many=True)
                 return Response(serializer.data)
             else:
                 return Response({'error': 'Missing customer ID'}, status=status.HTTP_400_BAD_REQUEST)
         
         try:
-            customer = Customer.objects.get(pk=pk)
+            customer = CustomerSerializer.setup_eager_loading(Customer.objects.all()).get(pk=pk)
             
             # For customer self-access, check based on user token or API key
             # Since your Customer model doesn't have a token field, we need an alternative approach
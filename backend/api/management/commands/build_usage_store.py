@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from api.services.usage_store import build_usage_store
+import time
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the memory-mapped daily usage history store from raw usage records'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            help='Days of history to keep, up to today (default: USAGE_STORE_DAYS)'
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        store = build_usage_store(days=options['days'])
+        elapsed = time.monotonic() - started
+        contracts, days = store.download.shape
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully built usage store for {store.start} - {store.end} '
+            f'({contracts} contracts x {days} days in {elapsed:.2f}s)'
+        ))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from api.services.partitioning import PARTITIONED_MODELS, MONTHS_AHEAD, create_partitions, partition_tables
+
+
+class Command(BaseCommand):
+    help = 'Create the upcoming monthly partitions of NetworkUsage and BalanceTransaction'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--months-ahead',
+            type=int,
+            default=MONTHS_AHEAD,
+            help=f'Number of months after the current one to create partitions for (default: {MONTHS_AHEAD})'
+        )
+
+    def handle(self, *args, **options):
+        # Tables created before partitioning was introduced are converted first
+        for model_name in partition_tables():
+            self.stdout.write(f'Converted {model_name} to a partitioned table')
+
+        for model_name in PARTITIONED_MODELS:
+            created = create_partitions(model_name, options['months_ahead'])
+            for name in created:
+                self.stdout.write(f'Created partition {name}')
+            self.stdout.write(self.style.SUCCESS(
+                f'{model_name}: {len(created)} partition(s) created'
+            ))
@@ -0,0 +1,47 @@
+from datetime import date
+from django.core.management.base import BaseCommand
+from api.services.partitioning import PARTITIONED_MODELS, add_months, detach_partitions
+
+
+class Command(BaseCommand):
+    help = 'Detach (and optionally archive or drop) old monthly partitions of NetworkUsage and BalanceTransaction'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--model',
+            choices=list(PARTITIONED_MODELS),
+            action='append',
+            help='Model whose partitions are detached (repeatable; default: all)'
+        )
+        parser.add_argument(
+            '--keep-months',
+            type=int,
+            default=24,
+            help='Number of months, counting the current one, that stay attached (default: 24)'
+        )
+        parser.add_argument(
+            '--archive-dir',
+            type=str,
+            help='Write each detached partition to <dir>/<partition>.csv.gz and drop it'
+        )
+        parser.add_argument(
+            '--drop',
+            action='store_true',
+            help='Drop detached partitions without archiving them'
+        )
+
+    def handle(self, *args, **options):
+        if options['keep_months'] < 1:
+            self.stderr.write(self.style.ERROR('--keep-months must be at least 1'))
+            return
+
+        before_month = add_months(date.today().replace(day=1), 1 - options['keep_months'])
+        for model_name in options['model'] or PARTITIONED_MODELS:
+            detached = detach_partitions(
+                model_name, before_month, archive_dir=options['archive_dir'], drop=options['drop']
+            )
+            for name in detached:
+                self.stdout.write(f'Detached partition {name}')
+            self.stdout.write(self.style.SUCCESS(
+                f'{model_name}: {len(detached)} partition(s) before {before_month} detached'
+            ))
@@ -3,21 +3,31 @@ from django.utils.timezone import now
 from datetime import timedelta
 from django.conf import settings
 from django.core.mail import send_mail
-from api.models import Contract, Invoice, Customer
-from django.db.models import Q
-from calendar import monthrange
+from api.models import Invoice
+from api.services.billing import (
+    get_active_contracts, get_billing_day_contracts, generate_billing_day_invoices
+)
 from twilio.rest import Client
+import time
 
 class Command(BaseCommand):
     help = 'Generate invoices for contracts due for monthly payment tomorrow and send notifications'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Number of invoices inserted per bulk query (default: 1000)'
+        )
+
     def handle(self, *args, **options):
         today = now().date()
         tomorrow = today + timedelta(days=1)
 
         # Mark overdue invoices
         overdue_invoices = Invoice.objects.filter(due_date__date__lt=today, status='pending')
-        overdue_count = overdue_invoices.update(status='overdue')
+        overdue_count = overdue_invoices.update(status='overdue', updated_at=now())
 
         self.stdout.write(
             self.style.WARNING(
@@ -25,60 +35,36 @@ class Command(BaseCommand):
             )
         )
 
-        active_contracts = Contract.objects.filter(
-            Q(end_date__isnull=True) | Q(end_date__gt=now())
-        )
+        scanned_count = get_active_contracts().count()
 
         self.stdout.write(f"Today: {today}, Tomorrow: {tomorrow}")
-        self.stdout.write(f"Found {active_contracts.count()} active contracts")
+        self.stdout.write(f"Found {scanned_count} active contracts")
 
-        invoices_created = 0
-        notifications_sent = 0
+        started = time.monotonic()
+        invoices_created = generate_billing_day_invoices(tomorrow, chunk_size=options['chunk_size'])
+        elapsed = time.monotonic() - started
+        rate = invoices_created / elapsed if elapsed > 0 else 0
 
-        for contract in active_contracts:
-            start_date = contract.start_date.date()
-            start_day = start_date.day
-            
-            year = tomorrow.year
-            month = tomorrow.month
-            last_day_of_month = monthrange(year, month)[1]
-            billing_day_this_month = min(start_day, last_day_of_month)
-            expected_billing_date = start_date.replace(year=year, month=month, day=billing_day_this_month)
-            
-            self.stdout.write(f"Contract ID: {contract.id}, Start date: {start_date}, Start day: {start_day}, Expected billing: {expected_billing_date}, Match with tomorrow: {expected_billing_date == tomorrow}")
-            
-            # Check if invoice already exists
-            existing_invoice = Invoice.objects.filter(
-                contract=contract,
-                due_date__date=tomorrow
-            ).first()
-            
-            if existing_invoice:
-                self.stdout.write(f"  - Invoice already exists: #{existing_invoice.id}, due date: {existing_invoice.due_date.date()}")
-
-            if expected_billing_date == tomorrow:
-                if not existing_invoice:
-                    invoice = Invoice.objects.create(
-                        contract=contract,
-                        amount=contract.tariff.price,
-                        due_date=tomorrow,
-                        description=f"Monthly fee for {contract.tariff.name} - {tomorrow}"
-                    )
-                    invoices_created += 1
-                    self.stdout.write(f"  - Created new invoice #{invoice.id} for contract #{contract.id}")
-                else:
-                    invoice = existing_invoice  # Use the existing invoice
-                    self.stdout.write(f"  - Using existing invoice #{invoice.id} for contract #{contract.id}")
-                    
-                customer = contract.customer
-                if customer.preferred_notification == 'email':
-                    self._send_email_notification(customer, invoice)
-                    notifications_sent += 1
-                    self.stdout.write(f"  - Sent email notification to {customer.user.email}")
-                elif customer.preferred_notification == 'sms':
-                    self._send_sms_notification(customer, invoice)
-                    notifications_sent += 1
-                    self.stdout.write(f"  - Sent SMS notification to {customer.phone_number}")
+        self.stdout.write(
+            f"Scanned {scanned_count} contracts, created {invoices_created} invoices "
+            f"in {elapsed:.2f}s ({rate:.0f} invoices/s)"
+        )
+
+        # Notify every customer billed tomorrow, including invoices created by an earlier run
+        due_invoices = Invoice.objects.filter(
+            due_date__date=tomorrow,
+            contract__in=get_billing_day_contracts(tomorrow)
+        ).select_related('contract__customer__user')
+
+        notifications_sent = 0
+        for invoice in due_invoices.iterator(chunk_size=options['chunk_size']):
+            customer = invoice.contract.customer
+            if customer.preferred_notification == 'email':
+                self._send_email_notification(customer, invoice)
+                notifications_sent += 1
+            elif customer.preferred_notification == 'sms':
+                self._send_sms_notification(customer, invoice)
+                notifications_sent += 1
 
         self.stdout.write(
             self.style.SUCCESS(
@@ -1,12 +1,13 @@
 from django.core.management.base import BaseCommand
 from django.utils.timezone import now
-from api.models import Contract, NetworkUsage
-import random
-from decimal import Decimal
+from api.services.usage_ingest import generate_usage_rows, read_usage_csv, read_usage_jsonl, ingest_usage
 
 
 class Command(BaseCommand):
-    help = 'Generate random network usage data for all active contracts'
+    help = (
+        'Generate random network usage data for all active contracts, '
+        'or load usage records from a CSV or JSON-lines file'
+    )
 
     def add_arguments(self, parser):
         # Optional date argument (defaults to today)
@@ -31,59 +32,52 @@ class Command(BaseCommand):
             help='Maximum GB of usage to generate (default: 10.0)'
         )
 
+        # Optional file of (contract_id, date, download_gb, upload_gb) records
+        parser.add_argument(
+            '--file',
+            type=str,
+            help='CSV or JSON-lines file of usage records to load instead of generating data'
+        )
+
+        parser.add_argument(
+            '--format',
+            choices=['csv', 'jsonl'],
+            help='Format of --file (default: from the file extension)'
+        )
+
     def handle(self, *args, **options):
-        # Get the date for network usage (today by default)
-        usage_date = now().date()
-        if options['date']:
+        if options['file']:
+            file_format = options['format'] or ('jsonl' if options['file'].endswith(('.jsonl', '.json')) else 'csv')
+            reader = read_usage_jsonl if file_format == 'jsonl' else read_usage_csv
+            source = options['file']
             try:
-                from datetime import datetime
-                usage_date = datetime.strptime(options['date'], '%Y-%m-%d').date()
-            except ValueError:
-                self.stderr.write(self.style.ERROR('Invalid date format. Use YYYY-MM-DD'))
+                with open(options['file'], newline='', encoding='utf-8-sig') as usage_file:
+                    result = ingest_usage(reader(usage_file))
+            except (OSError, ValueError) as e:
+                self.stderr.write(self.style.ERROR(str(e)))
                 return
+        else:
+            # Get the date for network usage (today by default)
+            usage_date = now().date()
+            if options['date']:
+                try:
+                    from datetime import datetime
+                    usage_date = datetime.strptime(options['date'], '%Y-%m-%d').date()
+                except ValueError:
+                    self.stderr.write(self.style.ERROR('Invalid date format. Use YYYY-MM-DD'))
+                    return
+            source = usage_date
+            result = ingest_usage(generate_usage_rows(usage_date, options['min_gb'], options['max_gb']))
 
-        # Get min and max values for usage generation
-        min_gb = options['min_gb']
-        max_gb = options['max_gb']
-        
-        # Get all active contracts
-        active_contracts = Contract.objects.filter(
-            end_date__gt=now()
-        ).select_related('customer', 'customer__user')
-        
-        if not active_contracts:
-            self.stdout.write(self.style.WARNING('No active contracts found.'))
+        if not result['rows']:
+            self.stdout.write(self.style.WARNING('No usage records to load.'))
             return
-        
-        # Counter for statistics
-        created_count = 0
-        updated_count = 0
-        
-        # Generate or update network usage for each active contract
-        for contract in active_contracts:
-            # Generate random values for download and upload (with 2 decimal places)
-            download_gb = Decimal(str(round(random.uniform(min_gb, max_gb), 2)))
-            upload_gb = Decimal(str(round(random.uniform(min_gb, max_gb), 2)))
-            
-            # Create or update the NetworkUsage record
-            usage, created = NetworkUsage.objects.update_or_create(
-                contract=contract,
-                date=usage_date,
-                defaults={
-                    'download_gb': download_gb,
-                    'upload_gb': upload_gb
-                }
-            )
-            
-            if created:
-                created_count += 1
-            else:
-                updated_count += 1
-        
+
         # Output results
         self.stdout.write(
             self.style.SUCCESS(
-                f'Successfully generated network usage for {created_count + updated_count} contracts '
-                f'({created_count} new, {updated_count} updated) for {usage_date}'
+                f'Successfully loaded network usage for {result["inserted"] + result["updated"]} contract-days '
+                f'({result["inserted"]} new, {result["updated"]} updated, {result["skipped"]} skipped) from {source} '
+                f'in {result["seconds"]:.2f}s ({result["rows_per_second"]:.0f} rows/s)'
             )
-        )
\ No newline at end of file
+        )
@@ -2,11 +2,33 @@ from django.core.management.base import BaseCommand
 from django.utils.timezone import now
 from django.db.models import Q
 from api.models import Customer, Invoice
+import time
 
 class Command(BaseCommand):
     help = 'Process payments for pending invoices using customer balances'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch',
+            action='store_true',
+            help='Settle invoices for chunks of customers with bulk writes instead of one customer at a time'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=500,
+            help='Number of customers locked and settled per transaction in batch mode (default: 500)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Batch mode only: report what would be paid without writing anything'
+        )
+
     def handle(self, *args, **options):
+        if options['batch']:
+            return self.handle_batch(options['chunk_size'], options['dry_run'])
+
         self.stdout.write('Starting automatic payment processing...')
         
         # Get all customers with positive balance
@@ -49,3 +71,40 @@ class Command(BaseCommand):
                     break
                     
         self.stdout.write(self.style.SUCCESS(f'Successfully processed {total_paid} payments'))
+
+    def handle_batch(self, chunk_size, dry_run):
+        from api.services.billing import settle_pending_invoices
+
+        mode = ' (dry run)' if dry_run else ''
+        self.stdout.write(f'Starting batch payment processing{mode}...')
+
+        customer_ids = Customer.objects.filter(balance__gt=0).order_by('id').values_list('id', flat=True)
+
+        started = time.monotonic()
+        total_paid = 0
+        total_amount = 0
+        last_id = 0
+
+        while True:
+            chunk = list(customer_ids.filter(id__gt=last_id)[:chunk_size])
+            if not chunk:
+                break
+            last_id = chunk[-1]
+
+            settled = settle_pending_invoices(chunk, dry_run=dry_run)
+            total_paid += len(settled)
+            total_amount += sum(amount for _, _, amount, _ in settled)
+
+            if dry_run:
+                for invoice_id, customer_id, amount, balance_after in settled:
+                    self.stdout.write(
+                        f'Would pay invoice #{invoice_id} for customer #{customer_id} '
+                        f'(Amount: {amount}₴, Balance after: {balance_after}₴)'
+                    )
+
+        elapsed = time.monotonic() - started
+        rate = total_paid / elapsed if elapsed > 0 else 0
+        verb = 'Would process' if dry_run else 'Successfully processed'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {total_paid} payments totalling {total_amount}₴ in {elapsed:.2f}s ({rate:.0f} invoices/s)'
+        ))
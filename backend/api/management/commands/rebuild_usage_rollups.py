@@ -0,0 +1,57 @@
+from datetime import datetime, timedelta
+from django.core.management.base import BaseCommand
+from django.db.models import Max, Min
+from api.models import NetworkUsage
+from api.services.usage_rollups import rebuild_usage_rollups
+import time
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the daily and monthly network usage rollups from raw usage records'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--start',
+            type=str,
+            help='First date to rebuild (YYYY-MM-DD). Defaults to the earliest usage record.'
+        )
+        parser.add_argument(
+            '--end',
+            type=str,
+            help='Last date to rebuild (YYYY-MM-DD). Defaults to the latest usage record.'
+        )
+        parser.add_argument(
+            '--days-per-batch',
+            type=int,
+            default=31,
+            help='Number of days rebuilt per transaction (default: 31)'
+        )
+
+    def handle(self, *args, **options):
+        bounds = NetworkUsage.objects.aggregate(first=Min('date'), last=Max('date'))
+        try:
+            start_date = datetime.strptime(options['start'], '%Y-%m-%d').date() if options['start'] else bounds['first']
+            end_date = datetime.strptime(options['end'], '%Y-%m-%d').date() if options['end'] else bounds['last']
+        except ValueError:
+            self.stderr.write(self.style.ERROR('Invalid date format. Use YYYY-MM-DD'))
+            return
+
+        if not start_date or not end_date:
+            self.stdout.write(self.style.WARNING('No network usage records found.'))
+            return
+
+        started = time.monotonic()
+        total_rows = 0
+        batch_start = start_date
+
+        while batch_start <= end_date:
+            batch_end = min(batch_start + timedelta(days=options['days_per_batch'] - 1), end_date)
+            total_rows += rebuild_usage_rollups(batch_start, batch_end)
+            self.stdout.write(f'Rebuilt usage rollups for {batch_start} - {batch_end}')
+            batch_start = batch_end + timedelta(days=1)
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully rebuilt usage rollups for {start_date} - {end_date} '
+            f'({total_rows} customer-days in {elapsed:.2f}s)'
+        ))
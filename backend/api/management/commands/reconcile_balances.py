@@ -0,0 +1,58 @@
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from api.models import Customer
+from api.services.ledger import reconcile_balances
+from api.tasks.sharding import get_id_shards
+import time
+
+
+def reconcile_shard(shard):
+    try:
+        return reconcile_balances(*shard)
+    finally:
+        # Each worker thread has its own connection
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = 'Verify customer balances against the balance transaction ledger'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=settings.SWEEP_SHARD_CONCURRENCY,
+            help='Number of customer shards checked in parallel (default: SWEEP_SHARD_CONCURRENCY)'
+        )
+        parser.add_argument(
+            '--shard-size',
+            type=int,
+            default=settings.SWEEP_SHARD_SIZE,
+            help='Minimum number of customers per shard (default: SWEEP_SHARD_SIZE)'
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        workers = max(options['workers'], 1)
+        shards = get_id_shards(Customer.objects.all(), options['shard_size'], workers)
+
+        if workers == 1 or len(shards) <= 1:
+            results = [reconcile_balances(*shard) for shard in shards]
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(reconcile_shard, shards))
+
+        checked = sum(result[0] for result in results)
+        mismatches = [mismatch for result in results for mismatch in result[1]]
+        for customer_id, balance, ledger in mismatches:
+            self.stderr.write(self.style.ERROR(
+                f'Customer #{customer_id}: balance {balance}₴, ledger {ledger}₴ (difference {balance - ledger}₴)'
+            ))
+
+        elapsed = time.monotonic() - started
+        summary = f'Checked {checked} customers in {len(shards)} shards ({elapsed:.2f}s)'
+        if mismatches:
+            raise CommandError(f'{summary}: {len(mismatches)} balances do not match the ledger')
+        self.stdout.write(self.style.SUCCESS(f'{summary}: all balances match the ledger'))
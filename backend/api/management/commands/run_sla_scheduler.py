@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from api.services.sla_scheduler import SLAScheduler
+
+
+class Command(BaseCommand):
+    help = 'Run the SLA scheduler, marking tickets as breached as soon as their deadline passes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of tickets marked per transaction (default: 500)'
+        )
+        parser.add_argument(
+            '--resync-interval',
+            type=int,
+            default=300,
+            help='Seconds between full reloads of pending deadlines (default: 300)'
+        )
+
+    def handle(self, *args, **options):
+        scheduler = SLAScheduler(
+            batch_size=options['batch_size'],
+            resync_interval=options['resync_interval']
+        )
+        self.stdout.write(self.style.SUCCESS('SLA scheduler started'))
+        try:
+            scheduler.run()
+        except KeyboardInterrupt:
+            self.stdout.write('SLA scheduler stopped')
@@ -1,6 +1,6 @@
 from django.core.exceptions import ValidationError
+from django.db.models import Prefetch
 from rest_framework import serializers
-from django.apps import apps
 
 class ContextAwareModelMixin:
     """Mixin that provides context awareness for models with status fields"""
@@ -14,12 +14,12 @@ class ContextAwareModelMixin:
         """Validate status belongs to the expected context"""
         super().clean()
         
-        if hasattr(self, 'status') and self.status:
+        status_id = getattr(self, 'status_id', None)
+        if status_id:
+            from .utils.reference_cache import get_status_context
             context_name = self.get_context_name()
-            Status = apps.get_model('api', 'Status')
-            valid_statuses = Status.get_statuses_by_context(context_name)
             
-            if not valid_statuses.filter(id=self.status.id).exists():
+            if get_status_context(status_id) != context_name:
                 raise ValidationError({
                     'status': f"Status must be from the '{context_name}' context."
                 })
@@ -42,14 +42,48 @@ class ContextAwareSerializerMixin:
         
     def validate_status(self, status):
         """Validate status field"""
-        from django.apps import apps
-        Status = apps.get_model('api', 'Status')
+        from .utils.reference_cache import get_status_context
         
         context_name = self.get_model_context_name()
-        valid_statuses = Status.get_statuses_by_context(context_name)
         
-        if not valid_statuses.filter(id=status.id).exists():
+        if get_status_context(status.id) != context_name:
             raise serializers.ValidationError(
                 f"Invalid status for {context_name}. Status must be from the '{context_name}' context."
             )
-        return status
\ No newline at end of file
+        return status
+
+
+class EagerLoadingMixin:
+    """Mixin for serializers that know which related rows their fields read"""
+    
+    @classmethod
+    def get_eager_loading_plan(cls):
+        """
+        Map of serializer field name to the related lookups it reads:
+        {'field': {'select': [...], 'prefetch': [...], 'annotate': {...}}}.
+        A prefetch list names parent lookups before their children.
+        """
+        return {}
+    
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        """Apply the lookups of every rendered field so a page costs a fixed number of queries"""
+        plan = cls.get_eager_loading_plan()
+        select, prefetch, annotate = [], {}, {}
+        
+        for field in cls.Meta.fields:
+            field_plan = plan.get(field, {})
+            select.extend(field_plan.get('select', []))
+            for lookup in field_plan.get('prefetch', []):
+                # The first plan naming a lookup wins; Django rejects the same lookup with two querysets
+                key = lookup.prefetch_to if isinstance(lookup, Prefetch) else lookup
+                prefetch.setdefault(key, lookup)
+            annotate.update(field_plan.get('annotate', {}))
+        
+        if select:
+            queryset = queryset.select_related(*select)
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch.values())
+        if annotate:
+            queryset = queryset.annotate(**annotate)
+        return queryset
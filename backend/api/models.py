@@ -154,6 +154,9 @@ class Customer(models.Model, ContextAwareModelMixin):
     
     @property
     def current_score(self):
+        if hasattr(self, 'latest_score'):
+            # Annotated by CustomerSerializer.setup_eager_loading
+            return self.latest_score or 0
         latest = self.scores.order_by('-calculated_at').first()
         return latest.score if latest else 0
 
@@ -284,6 +287,10 @@ class TariffService(models.Model):
 
 def get_default_connection_request_status():
     try:
+        from .utils.reference_cache import get_status_id
+        status_id = get_status_id('ConnectionRequest', 'New')
+        if status_id:
+            return status_id
         # Get or create the context first to avoid complex lookups during migration
         context, _ = StatusContext.objects.get_or_create(context='ConnectionRequest')
         status, _ = Status.objects.get_or_create(status='New', context=context)
@@ -399,7 +406,7 @@ class Contract(models.Model):
         if self.status != 'terminated':
             self.end_date = today
             self.status = 'terminated'
-            Contract.objects.filter(id=self.id).update(end_date=today, status='terminated')
+            Contract.objects.filter(id=self.id).update(end_date=today, status='terminated', updated_at=today)
             self.refresh_from_db()
             return True
         return False
@@ -473,6 +480,7 @@ class Invoice(models.Model):
     contract = models.ForeignKey(Contract, on_delete=models.PROTECT, related_name='invoices')
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     issue_date = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     due_date = models.DateTimeField()
     description = models.TextField()
     status = models.CharField(
@@ -506,7 +514,7 @@ class Invoice(models.Model):
         )
 
         # Perform bulk update on all overdue invoices
-        overdue_invoices.update(status='overdue')
+        overdue_invoices.update(status='overdue', updated_at=now())
 
         return overdue_invoices
 
@@ -545,17 +553,27 @@ class SupportTicket(models.Model):
     sla_deadline = models.DateTimeField(null=True, blank=True)
     is_sla_breached = models.BooleanField(default=False)
     
+    class Meta:
+        indexes = [
+            # Only tickets still waiting for a breach check are indexed (see services.sla)
+            models.Index(
+                fields=['sla_deadline'],
+                condition=models.Q(is_sla_breached=False),
+                name='ticket_sla_pending_idx'
+            ),
+        ]
+    
     def __str__(self):
         return f"Ticket #{self.id} - {self.subject} ({self.status})"
 
     def assign_employee(self, employee):
         """Assign an employee and automatically change the status to 'Open'."""
+        from .utils.reference_cache import get_status
         self.assigned_to = employee
-        try:
-            open_status = Status.objects.get(status='Open', context__context='SupportTicket')
+        open_status = get_status('SupportTicket', 'Open')
+        if open_status:
             self.status = open_status
-        except Status.DoesNotExist:
-            pass # Keep existing status if 'Open' not found
+        # Keep existing status if 'Open' not found
         self.save()
 
     def check_sla_breach(self):
@@ -602,6 +620,32 @@ class NetworkUsage(models.Model):
     class Meta:
         unique_together = ('contract', 'date')
 
+class DailyTariffUsage(models.Model):
+    """Rollup of NetworkUsage per day and tariff, maintained by services.usage_rollups."""
+    date = models.DateField()
+    tariff = models.ForeignKey(Tariff, on_delete=models.CASCADE, null=True, blank=True)
+    download_gb = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    upload_gb = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ('date', 'tariff')
+
+class DailyCustomerUsage(models.Model):
+    """Rollup of NetworkUsage per day and customer, maintained by services.usage_rollups."""
+    date = models.DateField()
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE)
+    download_gb = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    upload_gb = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ('date', 'customer')
+
+class MonthlyUsage(models.Model):
+    """Rollup of NetworkUsage per calendar month, maintained by services.usage_rollups."""
+    month = models.DateField(unique=True)
+    download_gb = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    upload_gb = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
 class BalanceTransaction(models.Model):
     TOPUP = 'topup'
     CHARGE = 'charge'
@@ -628,6 +672,16 @@ class BalanceTransaction(models.Model):
             models.Index(fields=['transaction_type', 'created_at']),
         ]
 
+class BalanceSnapshot(models.Model):
+    """Ledger balance of a customer as of a point in time, maintained by services.ledger."""
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='balance_snapshots')
+    as_of = models.DateTimeField()
+    balance = models.DecimalField(max_digits=12, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('customer', 'as_of')
+
 class ClientScore(models.Model):
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='scores')
     score = models.IntegerField()
@@ -700,6 +754,59 @@ class Notification(models.Model):
     def __str__(self):
         return f"Notification ({self.notification_type}) for {self.customer.user.email}"
 
+class DataJob(models.Model):
+    """CSV import or export run in the background in chunks (see services.data_jobs)."""
+    IMPORT = 'import'
+    EXPORT = 'export'
+    KIND_CHOICES = [
+        (IMPORT, 'Import'),
+        (EXPORT, 'Export'),
+    ]
+    RESOURCE_CHOICES = [
+        ('customers', 'Customers'),
+        ('employees', 'Employees'),
+        ('tariffs', 'Tariffs'),
+        ('invoice_pdfs', 'Invoice PDFs'),
+    ]
+    PENDING = 'pending'
+    RUNNING = 'running'
+    COMPLETED = 'completed'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (COMPLETED, 'Completed'),
+        (FAILED, 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    resource = models.CharField(max_length=20, choices=RESOURCE_CHOICES)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='data_jobs')
+    source_file = models.CharField(max_length=500, blank=True)
+    result_file = models.CharField(max_length=500, blank=True)
+    # Query parameters of the export request, which filter the exported rows
+    parameters = models.JSONField(default=dict, blank=True)
+    total_rows = models.PositiveIntegerField(null=True, blank=True)
+    # Checkpoint: rows finished so far, plus the resume position of exports
+    processed_rows = models.PositiveIntegerField(default=0)
+    checkpoint = models.JSONField(default=dict, blank=True)
+    created_count = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True)
+    error_message = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'updated_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} of {self.resource} #{self.id} ({self.status})"
+
 @receiver(post_migrate)
 def create_user_groups(sender, **kwargs):
     if sender.name == 'api':
@@ -2,14 +2,20 @@ from rest_framework import serializers
 from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError
 from django.utils.timezone import now
-from .mixins import ContextAwareSerializerMixin
+from django.db.models import OuterRef, Prefetch, Subquery
+from django.urls import reverse
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from .mixins import ContextAwareSerializerMixin, EagerLoadingMixin
+from .utils.roles import role_claims
 
 from .models import (
     User, Customer, Employee, Address, Region, Service, Tariff, TariffService,
     ConnectionRequest, ConnectionRequestAssignment, Contract, Payment, Invoice,
     SupportTicket, NetworkUsage, EmployeeRole, Status, PaymentMethod, 
     Equipment, EquipmentCategory, ContractEquipment, BalanceTransaction,
-    ClientScore, TariffRecommendation, Notification
+    ClientScore, TariffRecommendation, Notification, DataJob
 )
 
 class UserSerializer(serializers.ModelSerializer):
@@ -44,6 +50,36 @@ class UserRegisterSerializer(serializers.ModelSerializer):
         user = User.objects.create_user(**validated_data)
         return user
 
+class RoleTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """
+    Login serializer that embeds the user's groups, employee role and
+    customer profile id in the tokens, so permission checks need no queries.
+    The claims are trusted only while the user's roles version is unchanged.
+    """
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        for claim, value in role_claims(user).items():
+            token[claim] = value
+        return token
+
+class RoleRefreshToken(RefreshToken):
+    """
+    Refresh token whose access tokens carry the user's current role claims
+    instead of the ones copied from login.
+    """
+    @property
+    def access_token(self):
+        access = super().access_token
+        user = User.objects.filter(pk=self.payload.get(jwt_settings.USER_ID_CLAIM)).first()
+        if user is not None:
+            for claim, value in role_claims(user).items():
+                access[claim] = value
+        return access
+
+class RoleTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = RoleRefreshToken
+
 class RegionSerializer(serializers.ModelSerializer):
     class Meta:
         model = Region
@@ -69,7 +105,7 @@ class EmployeeRoleSerializer(serializers.ModelSerializer):
         model = EmployeeRole
         fields = ("id", "name")
 
-class CustomerSerializer(serializers.ModelSerializer):
+class CustomerSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     user_details = UserSerializer(source="user", read_only=True)
     status_name = serializers.ReadOnlyField(source="status.status")
     addresses = AddressSerializer(many=True, read_only=True)
@@ -79,9 +115,31 @@ class CustomerSerializer(serializers.ModelSerializer):
     support_tickets = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
 
     def get_all_invoices(self, obj):
-        invoices = Invoice.objects.filter(contract__customer=obj)
+        if 'contracts' in getattr(obj, '_prefetched_objects_cache', {}):
+            # Invoices prefetched per contract (see get_eager_loading_plan)
+            invoices = [invoice for contract in obj.contracts.all() for invoice in contract.invoices.all()]
+        else:
+            invoices = Invoice.objects.filter(contract__customer=obj)
         return InvoiceSerializer(invoices, many=True).data
     
+    @classmethod
+    def get_eager_loading_plan(cls):
+        contracts = Prefetch('contracts', queryset=Contract.objects.select_related('service', 'tariff'))
+        return {
+            'user_details': {'select': ['user']},
+            'status_name': {'select': ['status']},
+            'addresses': {'prefetch': [Prefetch('addresses', queryset=Address.objects.select_related('region'))]},
+            'contracts': {'prefetch': [contracts]},
+            'all_invoices': {'prefetch': [contracts, 'contracts__invoices']},
+            'payments': {'prefetch': ['payments']},
+            'support_tickets': {'prefetch': ['support_tickets']},
+            'current_score': {'annotate': {
+                'latest_score': Subquery(
+                    ClientScore.objects.filter(customer=OuterRef('pk')).order_by('-calculated_at').values('score')[:1]
+                )
+            }},
+        }
+    
     class Meta:
         model = Customer
         fields = ("id", "user", "user_details", "status", "status_name", "phone_number", 
@@ -336,6 +394,31 @@ class CustomerDetailSerializer(CustomerSerializer):
     class Meta(CustomerSerializer.Meta):
         fields = CustomerSerializer.Meta.fields + ('transactions',)
 
+    @classmethod
+    def get_eager_loading_plan(cls):
+        # Nested contracts, payments and tickets render their own related objects
+        contracts = Prefetch(
+            'contracts', queryset=Contract.objects.select_related('service', 'tariff', 'address__region')
+        )
+        return {
+            **super().get_eager_loading_plan(),
+            'contracts': {'prefetch': [
+                contracts,
+                'contracts__tariff__services',
+                Prefetch(
+                    'contracts__contractequipment_set',
+                    queryset=ContractEquipment.objects.select_related('equipment__category')
+                ),
+                'contracts__invoices',
+            ]},
+            'payments': {'prefetch': [Prefetch('payments', queryset=Payment.objects.select_related('method'))]},
+            'support_tickets': {'prefetch': [Prefetch(
+                'support_tickets',
+                queryset=SupportTicket.objects.select_related('status', 'assigned_to__user', 'assigned_to__role')
+            )]},
+            'transactions': {'prefetch': ['transactions']},
+        }
+
 
 class ClientScoreSerializer(serializers.ModelSerializer):
     class Meta:
@@ -349,3 +432,28 @@ class NotificationSerializer(serializers.ModelSerializer):
         model = Notification
         fields = ("id", "customer", "notification_type", "message", "is_read", "created_at")
         read_only_fields = ("created_at",)
+
+class DataJobSerializer(serializers.ModelSerializer):
+    progress = serializers.SerializerMethodField()
+    has_result = serializers.SerializerMethodField()
+    download_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = DataJob
+        fields = (
+            "id", "kind", "resource", "parameters", "status", "total_rows", "processed_rows", "progress",
+            "created_count", "errors", "error_message", "has_result", "download_url",
+            "created_by", "created_at", "updated_at", "finished_at"
+        )
+        read_only_fields = fields
+
+    def get_progress(self, obj):
+        if not obj.total_rows:
+            return 100.0 if obj.status == DataJob.COMPLETED else 0.0
+        return round(100.0 * obj.processed_rows / obj.total_rows, 1)
+
+    def get_has_result(self, obj):
+        return bool(obj.result_file)
+
+    def get_download_url(self, obj):
+        return reverse('datajob-download', args=[obj.id])
@@ -2,52 +2,24 @@ from django.db.models import Sum, Count, Q, Avg, F
 from django.db.models.functions import TruncMonth, TruncDay
 from django.utils import timezone
 from datetime import timedelta
+import numpy as np
 from ..models import (
     Customer, BalanceTransaction, SupportTicket, TariffRecommendation, 
-    Employee, Contract, Invoice, ConnectionRequest, Tariff, Service, NetworkUsage,
-    Equipment
+    Employee, Contract, Invoice, ConnectionRequest, Tariff, Service, DailyTariffUsage,
+    DailyCustomerUsage, MonthlyUsage, Equipment, Payment
 )
+from .usage_store import UsageStore
 
-def get_dashboard_stats():
+def get_payment_stats(now):
     """
-    Returns aggregated statistics for the Manager Dashboard.
+    Dashboard section fed by Payment: recent and total revenue.
     """
-    now = timezone.now()
     thirty_days_ago = now - timedelta(days=30)
     
-    # Basic Counts
-    total_customers = Customer.objects.count()
-    total_employees = Employee.objects.count()
-    active_contracts = Contract.objects.filter(status='active').count()
-    
-    # Invoices
-    paid_invoices = Invoice.objects.filter(status='paid').count()
-    pending_invoices = Invoice.objects.filter(status='pending').count()
-    overdue_invoices = Invoice.objects.filter(status='overdue').count()
-    
-    # Revenue (last 30 days) - Sum of all payments received
-    from ..models import Payment
-    monthly_payments = Payment.objects.filter(
-        payment_date__gte=thirty_days_ago
-    ).aggregate(total=Sum('amount'))['total'] or 0
-    
-    # Tickets by status
-    ticket_stats = SupportTicket.objects.aggregate(
-        open=Count('id', filter=Q(status__status__iexact='Open') | Q(status__status__iexact='New')),
-        in_progress=Count('id', filter=Q(status__status__iexact='In Progress')),
-        resolved=Count('id', filter=Q(status__status__iexact='Resolved'))
-    )
-    
-    # Recent items
-    latest_tickets = SupportTicket.objects.select_related('customer__user', 'status').order_by('-created_at')[:5]
-    recent_requests = ConnectionRequest.objects.select_related('customer__user', 'status').order_by('-created_at')[:5]
-    
-    # --- Client Statistics (original) ---
-    client_stats = Customer.objects.aggregate(
-        total=Count('id'),
-        active=Count('id', filter=Q(status__status__iexact='Active')),
-        blocked=Count('id', filter=Q(status__status__iexact='Blocked')),
-        new_this_month=Count('id', filter=Q(user__created_at__gte=thirty_days_ago))
+    # Revenue (last 30 days and all time) in one conditional aggregate
+    totals = Payment.objects.aggregate(
+        monthly_payments=Sum('amount', filter=Q(payment_date__gte=thirty_days_ago)),
+        total_revenue=Sum('amount')
     )
     
     # --- Revenue (last 6 months) ---
@@ -60,6 +32,55 @@ def get_dashboard_stats():
         .order_by('month')
     )
     
+    return {
+        'monthly_payments': float(totals['monthly_payments'] or 0),
+        'monthly_revenue': list(monthly_revenue),
+        'total_revenue': float(totals['total_revenue'] or 0),
+    }
+
+def get_invoice_stats(now):
+    """
+    Dashboard section fed by Invoice: counts and amounts by status.
+    """
+    totals = Invoice.objects.aggregate(
+        total_count=Count('id'),
+        paid=Count('id', filter=Q(status='paid')),
+        pending=Count('id', filter=Q(status='pending')),
+        overdue=Count('id', filter=Q(status='overdue')),
+        total_invoiced=Sum('amount'),
+        pending_amount=Sum('amount', filter=Q(status='pending')),
+        overdue_amount=Sum('amount', filter=Q(status='overdue'))
+    )
+    
+    total_invoices_count = totals['total_count']
+    payment_collection_rate = (totals['paid'] / total_invoices_count * 100) if total_invoices_count > 0 else 0
+    
+    return {
+        'paid_invoices': totals['paid'],
+        'pending_invoices': totals['pending'],
+        'overdue_invoices': totals['overdue'],
+        'total_invoiced': float(totals['total_invoiced'] or 0),
+        'pending_amount': float(totals['pending_amount'] or 0),
+        'overdue_amount': float(totals['overdue_amount'] or 0),
+        'payment_collection_rate': float(payment_collection_rate),
+    }
+
+def get_ticket_stats(now):
+    """
+    Dashboard section fed by SupportTicket: ticket counters, latest and overdue tickets.
+    """
+    thirty_days_ago = now - timedelta(days=30)
+    
+    # Tickets by status
+    ticket_stats = SupportTicket.objects.aggregate(
+        open=Count('id', filter=Q(status__status__iexact='Open') | Q(status__status__iexact='New')),
+        in_progress=Count('id', filter=Q(status__status__iexact='In Progress')),
+        resolved=Count('id', filter=Q(status__status__iexact='Resolved')),
+        total=Count('id')
+    )
+    
+    latest_tickets = SupportTicket.objects.select_related('customer__user', 'status').order_by('-created_at')[:5]
+    
     # --- Top 5 most problematic clients ---
     top_problem_clients = (
         Customer.objects
@@ -69,14 +90,6 @@ def get_dashboard_stats():
         .select_related('user', 'status')[:5]
     )
     
-    # --- Pending tariff recommendations ---
-    pending_recommendations = (
-        TariffRecommendation.objects
-        .filter(is_reviewed=False)
-        .select_related('customer__user', 'current_tariff', 'recommended_tariff')
-        .order_by('-created_at')[:10]
-    )
-    
     # --- Overdue tickets ---
     overdue_tickets_list = (
         SupportTicket.objects
@@ -84,6 +97,53 @@ def get_dashboard_stats():
         .select_related('customer__user', 'status')
         .order_by('sla_deadline')[:10]
     )
+    
+    # --- Performance Metrics ---
+    total_support_tickets = ticket_stats['total']
+    resolved_support_tickets = ticket_stats['resolved']
+    ticket_resolution_rate = (resolved_support_tickets / total_support_tickets * 100) if total_support_tickets > 0 else 0
+    
+    return {
+        'open_tickets': ticket_stats['open'],
+        'in_progress_tickets': ticket_stats['in_progress'],
+        'resolved_tickets': ticket_stats['resolved'],
+        'latest_tickets': latest_tickets,
+        'top_problem_clients': top_problem_clients,
+        'overdue_tickets': overdue_tickets_list,
+        'total_support_tickets': total_support_tickets,
+        'resolved_support_tickets': resolved_support_tickets,
+        'ticket_resolution_rate': float(ticket_resolution_rate),
+    }
+
+def get_overview_stats(now):
+    """
+    Dashboard section for everything else: customers, contracts, tariffs,
+    services, equipment and network usage.
+    """
+    thirty_days_ago = now - timedelta(days=30)
+    
+    # Basic Counts
+    total_employees = Employee.objects.count()
+    active_contracts = Contract.objects.filter(status='active').count()
+    
+    # Recent items
+    recent_requests = ConnectionRequest.objects.select_related('customer__user', 'status').order_by('-created_at')[:5]
+    
+    # --- Client Statistics (also provides the customer total) ---
+    client_stats = Customer.objects.aggregate(
+        total=Count('id'),
+        active=Count('id', filter=Q(status__status__iexact='Active')),
+        blocked=Count('id', filter=Q(status__status__iexact='Blocked')),
+        new_this_month=Count('id', filter=Q(user__created_at__gte=thirty_days_ago))
+    )
+    
+    # --- Pending tariff recommendations ---
+    pending_recommendations = (
+        TariffRecommendation.objects
+        .filter(is_reviewed=False)
+        .select_related('customer__user', 'current_tariff', 'recommended_tariff')
+        .order_by('-created_at')[:10]
+    )
 
     # --- Tariff Statistics ---
     tariff_stats = (
@@ -95,31 +155,10 @@ def get_dashboard_stats():
         .order_by('-active_contracts')
     )
     
+    tariff_stats = list(tariff_stats)
     for t in tariff_stats:
         t['monthly_revenue'] = float(t['monthly_revenue']) if t['monthly_revenue'] else 0.0
 
-    # --- Service Distribution ---
-    service_stats = (
-        Service.objects.annotate(
-            active_contracts=Count('contract', filter=Q(contract__status='active'))
-        )
-        .values('name', 'active_contracts')
-    )
-
-    # --- Additional Financial Metrics ---
-    total_revenue = Payment.objects.aggregate(total=Sum('amount'))['total'] or 0
-    total_invoiced = Invoice.objects.aggregate(total=Sum('amount'))['total'] or 0
-    pending_amount = Invoice.objects.filter(status='pending').aggregate(total=Sum('amount'))['total'] or 0
-    overdue_amount = Invoice.objects.filter(status='overdue').aggregate(total=Sum('amount'))['total'] or 0
-    
-    total_invoices_count = Invoice.objects.count()
-    payment_collection_rate = (paid_invoices / total_invoices_count * 100) if total_invoices_count > 0 else 0
-    
-    # --- Performance Metrics ---
-    total_support_tickets = SupportTicket.objects.count()
-    resolved_support_tickets = ticket_stats['resolved']
-    ticket_resolution_rate = (resolved_support_tickets / total_support_tickets * 100) if total_support_tickets > 0 else 0
-    
     # --- Service Distribution ---
     service_stats = (
         Service.objects.annotate(
@@ -129,6 +168,7 @@ def get_dashboard_stats():
         .values('id', 'name', 'active_contracts', 'monthly_revenue', 'is_active')
     )
     
+    service_stats = list(service_stats)
     for s in service_stats:
         s['monthly_revenue'] = float(s['monthly_revenue']) if s['monthly_revenue'] else 0.0
 
@@ -139,6 +179,7 @@ def get_dashboard_stats():
         )
         .values('id', 'name', 'price', 'stock_quantity', 'category__name', 'state', 'active_assignments')
     )
+    equipment_stats_list = list(equipment_stats_list)
     
     category_breakdown = {}
     for item in equipment_stats_list:
@@ -146,64 +187,67 @@ def get_dashboard_stats():
         category_breakdown[cat_name] = category_breakdown.get(cat_name, 0) + 1
         item['category_name'] = cat_name 
 
+    # Table totals are derived from the per-row statistics above instead of extra count() queries
     return {
-        'total_customers': total_customers,
+        'total_customers': client_stats['total'],
         'total_employees': total_employees,
         'active_contracts': active_contracts,
-        'monthly_payments': float(monthly_payments),
-        'paid_invoices': paid_invoices,
-        'pending_invoices': pending_invoices,
-        'overdue_invoices': overdue_invoices,
-        'total_revenue': float(total_revenue),
-        'total_invoiced': float(total_invoiced),
-        'pending_amount': float(pending_amount),
-        'overdue_amount': float(overdue_amount),
-        'payment_collection_rate': float(payment_collection_rate),
-        'total_support_tickets': total_support_tickets,
-        'resolved_support_tickets': resolved_support_tickets,
-        'ticket_resolution_rate': float(ticket_resolution_rate),
-        'total_services': Service.objects.count(),
-        'active_services': Service.objects.filter(is_active=True).count(),
-        'total_equipment': Equipment.objects.count(),
-        'low_stock_items': Equipment.objects.filter(stock_quantity__lte=5).count(),
-        'most_expensive': Equipment.objects.order_by('-price').first(),
+        'total_services': len(service_stats),
+        'active_services': sum(1 for s in service_stats if s['is_active']),
+        'total_equipment': len(equipment_stats_list),
+        'low_stock_items': sum(1 for item in equipment_stats_list if item['stock_quantity'] <= 5),
+        'most_expensive': max(equipment_stats_list, key=lambda item: item['price'], default=None),
         'category_breakdown': category_breakdown,
-        'equipment_statistics': list(equipment_stats_list),
-        'open_tickets': ticket_stats['open'],
-        'in_progress_tickets': ticket_stats['in_progress'],
-        'resolved_tickets': ticket_stats['resolved'],
-        'latest_tickets': latest_tickets,
+        'equipment_statistics': equipment_stats_list,
         'recent_requests': recent_requests,
         'client_stats': client_stats,
-        'monthly_revenue': list(monthly_revenue),
-        'top_problem_clients': top_problem_clients,
         'pending_recommendations': pending_recommendations,
-        'overdue_tickets': overdue_tickets_list,
-        'tariff_statistics': list(tariff_stats),
-        'service_statistics': list(service_stats),
-        'total_tariffs': Tariff.objects.count(),
-        'active_tariffs': Tariff.objects.filter(is_active=True).count(),
+        'tariff_statistics': tariff_stats,
+        'service_statistics': service_stats,
+        'total_tariffs': len(tariff_stats),
+        'active_tariffs': sum(1 for t in tariff_stats if t['is_active']),
         'most_popular': tariff_stats[0] if tariff_stats else None,
         'usage': get_network_usage_stats()
     }
 
+# Dashboard sections, each computed (and cached, see services.dashboard) on its own
+DASHBOARD_SECTIONS = {
+    'payments': get_payment_stats,
+    'invoices': get_invoice_stats,
+    'tickets': get_ticket_stats,
+    'overview': get_overview_stats,
+}
+
+def get_dashboard_stats():
+    """
+    Returns aggregated statistics for the Manager Dashboard.
+    """
+    now = timezone.now()
+    stats = {}
+    for get_section_stats in DASHBOARD_SECTIONS.values():
+        stats.update(get_section_stats(now))
+    return stats
+
 def get_network_usage_stats(days=30):
     """
     Returns detailed network usage statistics for the specified period.
-    NetworkUsage links to Contract (not Customer directly).
-    Path to customer: contract__customer
-    Path to tariff: contract__tariff
+    Reads the DailyTariffUsage, DailyCustomerUsage and MonthlyUsage rollups
+    (see services.usage_rollups), so the cost depends on the period and not
+    on the size of the raw NetworkUsage history. Per-contract averages are
+    reduced from the usage store (see services.usage_store) and are None
+    until it has been built.
     """
-    end_date = timezone.now()
+    end_date = timezone.now().date()
     start_date = end_date - timedelta(days=days)
     
-    usage_qs = NetworkUsage.objects.filter(date__range=[start_date, end_date])
+    tariff_qs = DailyTariffUsage.objects.filter(date__range=[start_date, end_date])
+    customer_qs = DailyCustomerUsage.objects.filter(date__range=[start_date, end_date])
     
     # 1. Summary
-    summary = usage_qs.aggregate(
+    summary = customer_qs.aggregate(
         total_download=Sum('download_gb'),
         total_upload=Sum('upload_gb'),
-        unique_customers=Count('contract__customer', distinct=True),
+        unique_customers=Count('customer', distinct=True),
     )
     total_usage = float((summary['total_download'] or 0) + (summary['total_upload'] or 0))
     unique_customers = summary['unique_customers'] or 1
@@ -216,7 +260,7 @@ def get_network_usage_stats(days=30):
     
     # 2. Daily Trends
     daily_usage = (
-        usage_qs.values('date')
+        tariff_qs.values('date')
         .annotate(
             total_download=Sum('download_gb'),
             total_upload=Sum('upload_gb'),
@@ -225,10 +269,9 @@ def get_network_usage_stats(days=30):
         .order_by('date')
     )
     
-    # 3. Monthly Trends
+    # 3. Monthly Trends (whole months overlapping the last 180 days)
     monthly_usage = (
-        NetworkUsage.objects.filter(date__gte=end_date - timedelta(days=180))
-        .annotate(month=TruncMonth('date'))
+        MonthlyUsage.objects.filter(month__gte=(end_date - timedelta(days=180)).replace(day=1))
         .values('month')
         .annotate(
             total_download=Sum('download_gb'),
@@ -237,20 +280,19 @@ def get_network_usage_stats(days=30):
         .order_by('month')
     )
     
-    # 4. Usage by Tariff (via contract -> tariff)
+    # 4. Usage by Tariff
     tariff_usage = (
-        usage_qs.filter(contract__status='active')
-        .values('contract__tariff__name')
+        tariff_qs.values('tariff__name')
         .annotate(total_gb=Sum('download_gb') + Sum('upload_gb'))
         .order_by('-total_gb')
     )
     
-    # 5. Customer Usage Details (Top 10, via contract -> customer -> user)
+    # 5. Customer Usage Details (Top 10)
     customer_usage = (
-        usage_qs.values(
-            'contract__customer_id',
-            'contract__customer__user__first_name',
-            'contract__customer__user__last_name'
+        customer_qs.values(
+            'customer_id',
+            'customer__user__first_name',
+            'customer__user__last_name'
         )
         .annotate(
             total_download=Sum('download_gb'),
@@ -260,6 +302,23 @@ def get_network_usage_stats(days=30):
         .order_by('-total_gb')[:10]
     )
 
+    # 6. Average daily usage per contract over the last 90 complete days
+    # (only from the usage store: the raw history is too large to scan here)
+    average_usage = None
+    store = UsageStore.open()
+    averages_start, averages_end = end_date - timedelta(days=90), end_date - timedelta(days=1)
+    if store is not None and store.covers(averages_start, averages_end):
+        _, _, contract_averages = store.daily_averages(averages_start, averages_end)
+        if len(contract_averages):
+            p50, p90 = np.percentile(contract_averages, [50, 90])
+            average_usage = {
+                'contracts': len(contract_averages),
+                'mean_daily_gb': float(contract_averages.mean()),
+                'median_daily_gb': float(p50),
+                'p90_daily_gb': float(p90),
+                'max_daily_gb': float(contract_averages.max())
+            }
+
     return {
         'summary': usage_summary,
         'daily_usage': [
@@ -281,19 +340,20 @@ def get_network_usage_stats(days=30):
         ],
         'tariff_usage': [
             {
-                'tariff_name': item['contract__tariff__name'] or 'Unknown',
+                'tariff_name': item['tariff__name'] or 'Unknown',
                 'total_gb': float(item['total_gb'])
             }
             for item in tariff_usage
         ],
         'customer_usage': [
             {
-                'customer_id': item['contract__customer_id'],
-                'customer_name': f"{item['contract__customer__user__last_name']}, {item['contract__customer__user__first_name']}",
+                'customer_id': item['customer_id'],
+                'customer_name': f"{item['customer__user__last_name']}, {item['customer__user__first_name']}",
                 'download_gb': float(item['total_download']),
                 'upload_gb': float(item['total_upload']),
                 'total_gb': float(item['total_gb'])
             }
             for item in customer_usage
-        ]
+        ],
+        'contract_averages': average_usage
     }
@@ -1,118 +1,193 @@
-from django.db.models import Count, Q
-from ..models import Employee, SupportTicket, ConnectionRequest, ConnectionRequestAssignment, Status
-from .notifications import send_notification
+import heapq
+from django.db import transaction
+from django.db.models import Count
+from ..models import Employee, SupportTicket, ConnectionRequest, ConnectionRequestAssignment
+from ..utils.reference_cache import get_status, get_status_id
+from .notifications import send_notifications
+from .dashboard import invalidate_dashboard_sections
+from .sla import OPEN_TICKET_STATUSES
 
-def auto_assign_technician(ticket):
+# Connection request statuses that still count towards a technician's workload
+OPEN_REQUEST_STATUSES = ('New', 'In Progress', 'Pending')
+
+
+class WorkloadQueue:
     """
-    Finds the available staff with the fewest open tickets.
-    Technicians for 'technical' and 'connection' tickets.
-    Support staff for 'billing' and 'other' tickets.
+    Least-loaded-first queues of employees, one per pool (role).
+
+    Loads are shared between pools, so an employee can sit in several of
+    them; entries whose load is out of date are skipped when popped.
     """
-    role_name = 'technician' if ticket.ticket_type in ['technical', 'connection'] else 'Support'
-    
-    # Find available staff
-    staff = (
-        Employee.objects
-        .filter(
-            role__name__iexact=role_name,
-            is_available=True
-        )
-        .annotate(
-            open_ticket_count=Count(
-                'supportticket',
-                filter=Q(supportticket__status__status__in=['Open', 'In Progress', 'New'])
-            )
-        )
-        .order_by('open_ticket_count')
-        .first()
+
+    def __init__(self, loads):
+        self.loads = dict(loads)
+        self.pools = {}
+        self.members = {}
+
+    def add(self, pool, employee_id):
+        self.members.setdefault(employee_id, set()).add(pool)
+        heapq.heappush(self.pools.setdefault(pool, []), (self.loads.get(employee_id, 0), employee_id))
+
+    def take(self, pool):
+        """
+        Returns the least-loaded employee id of the pool and counts one more
+        item against it, or None when the pool is empty.
+        """
+        heap = self.pools.get(pool)
+        while heap:
+            load, employee_id = heap[0]
+            if load == self.loads.get(employee_id, 0):
+                break
+            heapq.heappop(heap)
+        if not heap:
+            return None
+
+        employee_id = heap[0][1]
+        self.loads[employee_id] = self.loads.get(employee_id, 0) + 1
+        for member_pool in self.members[employee_id]:
+            heapq.heappush(self.pools[member_pool], (self.loads[employee_id], employee_id))
+        return employee_id
+
+
+def _ticket_role(ticket):
+    # Technicians handle 'technical' and 'connection' tickets, Support the rest
+    return 'technician' if ticket.ticket_type in ['technical', 'connection'] else 'support'
+
+def assign_tickets(tickets):
+    """
+    Assigns tickets to the available staff with the fewest open tickets.
+    Workloads are counted once, each ticket goes to the least-loaded employee
+    of its role ('other' tickets fall back to any available employee), and the
+    results are saved with one bulk update and one batch of notifications.
+    Returns {ticket id: employee} for the tickets that were assigned.
+    """
+    tickets = list(tickets)
+    if not tickets:
+        return {}
+
+    staff = {e.id: e for e in Employee.objects.filter(is_available=True).select_related('role')}
+    loads = (
+        SupportTicket.objects
+        .filter(assigned_to__in=staff.keys(), status__status__in=OPEN_TICKET_STATUSES)
+        .values_list('assigned_to')
+        .annotate(open_ticket_count=Count('id'))
+        .order_by()
     )
-    
-    if staff is None:
-        # Fallback: if no specific role available, try any available employee if it's 'other'
-        if ticket.ticket_type == 'other':
-            staff = Employee.objects.filter(is_available=True).annotate(
-                open_ticket_count=Count('supportticket', filter=Q(supportticket__status__status__in=['Open', 'In Progress', 'New']))
-            ).order_by('open_ticket_count').first()
-        
-    if staff is None:
-        return None
-    
-    ticket.assigned_to = staff
-    
-    # Update status to 'Open' if it was 'New'
-    try:
-        from ..models import StatusContext
-        context = StatusContext.objects.filter(context='SupportTicket').first()
-        open_status = Status.objects.filter(status='Open', context=context).first()
+    queue = WorkloadQueue(loads)
+    for employee in staff.values():
+        queue.add(employee.role.name.lower(), employee.id)
+        queue.add(None, employee.id)
+
+    open_status = get_status('SupportTicket', 'Open')
+
+    assigned = {}
+    for ticket in tickets:
+        employee_id = queue.take(_ticket_role(ticket))
+        if employee_id is None and ticket.ticket_type == 'other':
+            employee_id = queue.take(None)
+        if employee_id is None:
+            continue
+        ticket.assigned_to = staff[employee_id]
         if open_status:
             ticket.status = open_status
-    except Exception:
-        pass
-        
-    ticket.save(update_fields=['assigned_to', 'status'])
-    
-    # Send notification to customer
-    try:
-        send_notification(
-            customer=ticket.customer,
-            notification_type='ticket_assigned',
-            message=f'An employee has been assigned to your ticket #{ticket.id}: {ticket.subject}'
+        assigned[ticket.id] = ticket.assigned_to
+
+    if not assigned:
+        return assigned
+
+    assigned_tickets = [ticket for ticket in tickets if ticket.id in assigned]
+    with transaction.atomic():
+        SupportTicket.objects.bulk_update(assigned_tickets, ['assigned_to', 'status'], batch_size=500)
+    # bulk_update sends no post_save signals
+    invalidate_dashboard_sections('tickets')
+
+    send_notifications(
+        (
+            ticket.customer,
+            'ticket_assigned',
+            f'An employee has been assigned to your ticket #{ticket.id}: {ticket.subject}'
         )
-    except Exception:
-        pass
-        
-    return staff
+        for ticket in assigned_tickets
+    )
+    return assigned
 
-def auto_assign_connection_request(conn_req):
+def assign_connection_requests(conn_reqs):
     """
-    Finds the available technician with the fewest open connection requests.
+    Assigns connection requests to the available technicians with the fewest
+    open connection requests, least-loaded first. New requests are moved to
+    'In Progress'. Assignments, status changes and notifications are written
+    in bulk. Returns {request id: technician} for the requests that were assigned.
     """
-    technician = (
-        Employee.objects
-        .filter(
-            role__name__iexact='technician',
-            is_available=True
-        )
-        .annotate(
-            open_req_count=Count(
-                'connectionrequestassignment',
-                filter=Q(connectionrequest__status__status__in=['New', 'In Progress', 'Pending'])
-            )
-        )
-        .order_by('open_req_count')
-        .first()
+    conn_reqs = list(conn_reqs)
+    if not conn_reqs:
+        return {}
+
+    technicians = {
+        e.id: e for e in Employee.objects.filter(role__name__iexact='technician', is_available=True)
+    }
+    loads = (
+        ConnectionRequestAssignment.objects
+        .filter(employee__in=technicians.keys(), connection_request__status__status__in=OPEN_REQUEST_STATUSES)
+        .values_list('employee')
+        .annotate(open_req_count=Count('id'))
+        .order_by()
+    )
+    queue = WorkloadQueue(loads)
+    for technician_id in technicians:
+        queue.add('technician', technician_id)
+
+    in_progress_status = get_status('ConnectionRequest', 'In Progress')
+    new_status_id = get_status_id('ConnectionRequest', 'New')
+
+    existing = set(
+        ConnectionRequestAssignment.objects
+        .filter(connection_request__in=conn_reqs)
+        .values_list('connection_request_id', 'employee_id')
     )
-    
-    if technician is None:
-        return None
-    
-    # Check if already assigned to this technician
-    if not ConnectionRequestAssignment.objects.filter(connection_request=conn_req, employee=technician).exists():
-        ConnectionRequestAssignment.objects.create(
+
+    assigned = {}
+    assignments = []
+    moved = []
+    for conn_req in conn_reqs:
+        technician_id = queue.take('technician')
+        if technician_id is None:
+            break
+        assigned[conn_req.id] = technicians[technician_id]
+        if (conn_req.id, technician_id) in existing:
+            continue
+        assignments.append(ConnectionRequestAssignment(
             connection_request=conn_req,
-            employee=technician,
+            employee_id=technician_id,
             role='technician'
+        ))
+        if in_progress_status and conn_req.status_id == new_status_id:
+            conn_req.status = in_progress_status
+            moved.append(conn_req)
+
+    with transaction.atomic():
+        ConnectionRequestAssignment.objects.bulk_create(assignments, batch_size=500)
+        ConnectionRequest.objects.bulk_update(moved, ['status'], batch_size=500)
+
+    send_notifications(
+        (
+            assignment.connection_request.customer,
+            'request_assigned',
+            f'A technician has been assigned to your connection request #{assignment.connection_request.id}'
         )
-        
-        # Update status to 'In Progress' if it was 'New'
-        try:
-            from ..models import StatusContext
-            context = StatusContext.objects.filter(context='ConnectionRequest').first()
-            in_progress_status = Status.objects.filter(status='In Progress', context=context).first()
-            if in_progress_status and conn_req.status.status == 'New':
-                conn_req.status = in_progress_status
-                conn_req.save(update_fields=['status'])
-        except Exception:
-            pass
-            
-        # Send notification to customer
-        try:
-            send_notification(
-                customer=conn_req.customer,
-                notification_type='request_assigned',
-                message=f'A technician has been assigned to your connection request #{conn_req.id}'
-            )
-        except Exception:
-            pass
-            
-    return technician
+        for assignment in assignments
+    )
+    return assigned
+
+def auto_assign_technician(ticket):
+    """
+    Finds the available staff with the fewest open tickets.
+    Technicians for 'technical' and 'connection' tickets.
+    Support staff for 'billing' and 'other' tickets.
+    """
+    return assign_tickets([ticket]).get(ticket.id)
+
+def auto_assign_connection_request(conn_req):
+    """
+    Finds the available technician with the fewest open connection requests.
+    """
+    return assign_connection_requests([conn_req]).get(conn_req.id)
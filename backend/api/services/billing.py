@@ -1,32 +1,131 @@
+from calendar import monthrange
 from django.db import transaction
+from django.db.models import Q, Exists, OuterRef
 from django.utils import timezone
-from ..models import BalanceTransaction, Customer
+from ..models import BalanceTransaction, Customer, Contract, Invoice
+from .dashboard import invalidate_dashboard_sections
+from .ledger import post_transactions
 
 def record_transaction(customer, amount, transaction_type, description=''):
     """
     Atomic balance update and transaction logging.
+    Callers posting many transactions at once should use ledger.post_transactions.
     """
+    return post_transactions([(customer.id, amount, transaction_type, description)])[0]
+
+def get_active_contracts():
+    return Contract.objects.filter(
+        Q(end_date__isnull=True) | Q(end_date__gt=timezone.now())
+    )
+
+def get_billing_day_contracts(billing_date):
+    """
+    Active contracts whose monthly billing day falls on billing_date.
+    The billing day is the contract start day, clamped to the last day of the
+    month (a contract started on the 31st is billed on Feb 28/29).
+    """
+    last_day_of_month = monthrange(billing_date.year, billing_date.month)[1]
+    if billing_date.day == last_day_of_month:
+        day_filter = Q(start_date__day__gte=billing_date.day)
+    else:
+        day_filter = Q(start_date__day=billing_date.day)
+    return get_active_contracts().filter(day_filter)
+
+def generate_billing_day_invoices(billing_date, chunk_size=1000):
+    """
+    Creates the monthly invoice for every contract billed on billing_date
+    that does not have one yet. Returns the number of invoices created.
+    """
+    existing_invoice = Invoice.objects.filter(
+        contract=OuterRef('pk'),
+        due_date__date=billing_date
+    )
+    rows = (
+        get_billing_day_contracts(billing_date)
+        .filter(tariff__isnull=False)
+        .filter(~Exists(existing_invoice))
+        .order_by('id')
+        .values_list('id', 'tariff__price', 'tariff__name')
+    )
+
+    created = 0
+    batch = []
+    for contract_id, price, tariff_name in rows.iterator(chunk_size=chunk_size):
+        batch.append(Invoice(
+            contract_id=contract_id,
+            amount=price,
+            due_date=billing_date,
+            description=f"Monthly fee for {tariff_name} - {billing_date}"
+        ))
+        if len(batch) >= chunk_size:
+            Invoice.objects.bulk_create(batch)
+            created += len(batch)
+            batch = []
+
+    if batch:
+        Invoice.objects.bulk_create(batch)
+        created += len(batch)
+
+    # bulk_create sends no post_save signals
+    if created:
+        invalidate_dashboard_sections('invoices')
+    return created
+
+def settle_pending_invoices(customer_ids, dry_run=False):
+    """
+    Pays pending and overdue invoices from the balances of a chunk of customers.
+    Invoices are settled oldest due date first; a customer's settlement stops at
+    the first invoice the remaining balance cannot cover.
+    Returns a list of (invoice_id, customer_id, amount, balance_after) tuples.
+    """
+    settled = []
     with transaction.atomic():
-        customer = Customer.objects.select_for_update().get(id=customer.id)
-        
-        # Update balance
-        customer.balance += amount
-        
-        # Task 4 logic: Track when balance becomes negative
-        if customer.balance < 0 and customer.balance_negative_since is None:
-            customer.balance_negative_since = timezone.now()
-        elif customer.balance >= 0:
-            customer.balance_negative_since = None
-            
-        customer.save(update_fields=['balance', 'balance_negative_since'])
-        
-        # Create transaction record
-        transaction_record = BalanceTransaction.objects.create(
-            customer=customer,
-            amount=amount,
-            balance_after=customer.balance,
-            transaction_type=transaction_type,
-            description=description
+        customers = {
+            c.id: c for c in Customer.objects.select_for_update()
+            .filter(id__in=customer_ids, balance__gt=0)
+            .only('id', 'balance', 'balance_negative_since')
+        }
+        if not customers:
+            return settled
+
+        invoices = (
+            Invoice.objects.select_for_update(of=('self',))
+            .filter(contract__customer_id__in=customers.keys(), status__in=['pending', 'overdue'])
+            .order_by('due_date', 'id')
+            .values_list('id', 'contract__customer_id', 'amount')
         )
-        
-        return transaction_record
+
+        blocked = set()
+        for invoice_id, customer_id, amount in invoices:
+            if customer_id in blocked:
+                continue
+            customer = customers[customer_id]
+            if customer.balance < amount:
+                blocked.add(customer_id)
+                continue
+            customer.balance -= amount
+            settled.append((invoice_id, customer_id, amount, customer.balance))
+
+        if dry_run or not settled:
+            return settled
+
+        BalanceTransaction.objects.bulk_create([
+            BalanceTransaction(
+                customer_id=customer_id,
+                amount=-amount,
+                balance_after=balance_after,
+                transaction_type=BalanceTransaction.CHARGE,
+                description=f'Payment for invoice #{invoice_id}'
+            )
+            for invoice_id, customer_id, amount, balance_after in settled
+        ])
+        Invoice.objects.filter(id__in=[row[0] for row in settled]).update(status='paid', updated_at=timezone.now())
+
+        # Balances only ever decrease down to zero here, so none can turn negative
+        charged = [customers[customer_id] for customer_id in {row[1] for row in settled}]
+        for customer in charged:
+            customer.balance_negative_since = None
+        Customer.objects.bulk_update(charged, ['balance', 'balance_negative_since'])
+
+    invalidate_dashboard_sections('invoices')
+    return settled
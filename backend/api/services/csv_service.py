@@ -1,42 +1,250 @@
 import csv
 import io
 import logging
-from django.db import transaction
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group
+from django.contrib.postgres.aggregates import StringAgg
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction, DatabaseError
+from django.db.models import Value
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
 logger = logging.getLogger(__name__)
 
+# Rows fetched per round trip while streaming an export
+EXPORT_CHUNK_SIZE = 2000
+
+class _Echo:
+    """
+    File-like object whose write() returns the written line, so csv.writer
+    can produce lines for a generator instead of filling a buffer.
+    """
+    def write(self, value):
+        return value
+
+def stream_csv(header, rows, rows_per_chunk=500):
+    """
+    Yields a CSV file (with BOM for Excel) in chunks of rows_per_chunk lines.
+    """
+    writer = csv.writer(_Echo())
+    chunk = ['\ufeff', writer.writerow(header)]
+    for row in rows:
+        chunk.append(writer.writerow(row))
+        if len(chunk) >= rows_per_chunk:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+
+# Rows written per transaction by the bulk import
+IMPORT_CHUNK_SIZE = 1000
+
+ADDRESS_COLUMNS = ('street', 'building', 'city', 'region')
+
+def hash_passwords(passwords, workers=None):
+    """
+    Hashes passwords in a process pool (hashing is CPU bound and holds the GIL).
+    Falls back to hashing in this process inside daemonic processes such as
+    Celery prefork workers, which cannot start children.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(passwords) < 2 * workers or multiprocessing.current_process().daemon:
+        return [make_password(password) for password in passwords]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(make_password, passwords, chunksize=max(1, len(passwords) // (workers * 4))))
+
+def _validate_customer_row(row, seen_emails, seen_phones):
+    """
+    Checks one import row without touching the database.
+    Returns the cleaned values, or raises ValueError.
+    """
+    from api.models import Customer, phone_regex
+    from api.utils.reference_cache import get_reference_id
+
+    missing = [column for column in ('email', 'first_name', 'last_name', 'phone_number') if not (row.get(column) or '').strip()]
+    if missing:
+        raise ValueError(f"Missing required field(s): {', '.join(missing)}")
+
+    email = User.objects.normalize_email(row['email'].strip())
+    phone_number = row['phone_number'].strip()
+    try:
+        validate_email(email)
+        phone_regex(phone_number)
+    except ValidationError as e:
+        raise ValueError('; '.join(e.messages))
+    if email in seen_emails:
+        raise ValueError(f"Duplicate email {email} in file")
+    if phone_number in seen_phones:
+        raise ValueError(f"Duplicate phone number {phone_number} in file")
+
+    # The model field rejects NaN, infinities and values that do not fit numeric(10, 2)
+    try:
+        balance = Customer._meta.get_field('balance').clean(row.get('balance') or 0, None)
+    except ValidationError as e:
+        raise ValueError(f"Invalid balance {row.get('balance')}: {'; '.join(e.messages)}")
+
+    address = None
+    given = [column for column in ADDRESS_COLUMNS if (row.get(column) or '').strip()]
+    if given:
+        if len(given) != len(ADDRESS_COLUMNS):
+            raise ValueError(f"Address needs all of: {', '.join(ADDRESS_COLUMNS)}")
+        region_id = get_reference_id('Region', row['region'].strip())
+        if region_id is None:
+            raise ValueError(f"Region '{row['region'].strip()}' not found")
+        address = {
+            'street': row['street'].strip(),
+            'building': row['building'].strip(),
+            'city': row['city'].strip(),
+            'apartment': (row.get('apartment') or '').strip() or None,
+            'region_id': region_id,
+        }
+
+    seen_emails.add(email)
+    seen_phones.add(phone_number)
+    return {
+        'email': email,
+        'first_name': row['first_name'].strip(),
+        'last_name': row['last_name'].strip(),
+        'password': row.get('password') or 'password123',
+        'phone_number': phone_number,
+        'balance': balance,
+        'address': address,
+    }
+
+def _existing(model, field, values, batch_size=5000):
+    values = list(values)
+    found = set()
+    for i in range(0, len(values), batch_size):
+        found.update(model.objects.filter(**{f'{field}__in': values[i:i + batch_size]}).values_list(field, flat=True))
+    return found
+
+def import_customer_rows(rows, first_row_num=2, chunk_size=IMPORT_CHUNK_SIZE, hash_workers=None):
+    """
+    Bulk imports customers from parsed CSV rows (dicts). Every row is
+    validated first, email and phone uniqueness is checked with set queries,
+    passwords are hashed in a process pool, and users, group memberships,
+    customers and addresses are written with bulk_create, chunk_size rows
+    per transaction. Returns (created_count, errors) like import_customers.
+    """
+    from api.models import Customer, Address, Status
+    from api.utils.reference_cache import get_status
+
+    customer_status = get_status('Customer', 'Active')
+    if customer_status is None:
+        raise Status.DoesNotExist("Status 'Active' not found in context 'Customer'")
+
+    errors = {}
+    valid = []
+    seen_emails, seen_phones = set(), set()
+    for row_num, row in enumerate(rows, start=first_row_num):
+        try:
+            valid.append((row_num, _validate_customer_row(row, seen_emails, seen_phones)))
+        except ValueError as e:
+            errors[row_num] = str(e)
+
+    taken_emails = _existing(User, 'email', [v['email'] for _, v in valid])
+    taken_phones = _existing(Customer, 'phone_number', [v['phone_number'] for _, v in valid])
+    new_rows = []
+    for row_num, values in valid:
+        if values['email'] in taken_emails:
+            errors[row_num] = f"User with email {values['email']} already exists"
+        elif values['phone_number'] in taken_phones:
+            errors[row_num] = f"Customer with phone number {values['phone_number']} already exists"
+        else:
+            new_rows.append((row_num, values))
+
+    hashes = hash_passwords([values['password'] for _, values in new_rows], hash_workers)
+    customer_group = Group.objects.get(name='Customer')
+    Membership = User.groups.through
+    created_count = 0
+
+    for start in range(0, len(new_rows), chunk_size):
+        chunk = new_rows[start:start + chunk_size]
+        try:
+            with transaction.atomic():
+                users = User.objects.bulk_create([
+                    User(
+                        email=values['email'], first_name=values['first_name'],
+                        last_name=values['last_name'], password=password_hash
+                    )
+                    for (_, values), password_hash in zip(chunk, hashes[start:start + chunk_size])
+                ])
+                Membership.objects.bulk_create([
+                    Membership(user_id=user.id, group_id=customer_group.id) for user in users
+                ])
+                customers = Customer.objects.bulk_create([
+                    Customer(
+                        user=user, status=customer_status,
+                        phone_number=values['phone_number'], balance=values['balance']
+                    )
+                    for user, (_, values) in zip(users, chunk)
+                ])
+                Address.objects.bulk_create([
+                    Address(customer=customer, **values['address'])
+                    for customer, (_, values) in zip(customers, chunk) if values['address']
+                ])
+        except DatabaseError as e:
+            # A concurrent writer took one of the emails or phone numbers since the check,
+            # or a value the checks let through was rejected; the chunk was rolled back
+            for row_num, _ in chunk:
+                errors[row_num] = str(e)
+            continue
+        created_count += len(chunk)
+
+    return created_count, [f"Row {row_num}: {errors[row_num]}" for row_num in sorted(errors)]
+
 class CSVService:
+    CUSTOMER_COLUMNS = ['id', 'first_name', 'last_name', 'email', 'phone_number', 'status', 'balance']
+    EMPLOYEE_COLUMNS = ['id', 'first_name', 'last_name', 'email', 'role', 'is_available']
+    TARIFF_COLUMNS = ['id', 'name', 'price', 'speed_mbps', 'traffic_limit_gb', 'is_active', 'description', 'services']
+
+    @staticmethod
+    def customer_rows(customers):
+        """
+        Export rows of customers; user and status columns are joined in SQL.
+        """
+        rows = customers.values_list(
+            'id', 'user__first_name', 'user__last_name', 'user__email',
+            'phone_number', 'status__status', 'balance'
+        ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        return (row[:5] + (row[5] or 'Unknown', row[6]) for row in rows)
+
+    @staticmethod
+    def employee_rows(employees):
+        """
+        Export rows of employees; user and role columns are joined in SQL.
+        """
+        return employees.values_list(
+            'id', 'user__first_name', 'user__last_name', 'user__email', 'role__name', 'is_available'
+        ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+    @staticmethod
+    def tariff_rows(tariffs):
+        """
+        Export rows of tariffs; service names are aggregated in SQL.
+        """
+        return tariffs.annotate(
+            service_names=StringAgg('services__name', delimiter=', ', ordering='services__name', default=Value(''))
+        ).values_list(
+            'id', 'name', 'price', 'speed_mbps', 'traffic_limit_gb', 'is_active', 'description', 'service_names'
+        ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
     @staticmethod
     def export_customers(customers):
-        buffer = io.StringIO()
-        buffer.write('\ufeff') # BOM for Excel
-        writer = csv.writer(buffer)
-        writer.writerow(['id', 'first_name', 'last_name', 'email', 'phone_number', 'status', 'balance'])
-        
-        for customer in customers:
-            writer.writerow([
-                customer.id, customer.user.first_name, customer.user.last_name,
-                customer.user.email, customer.phone_number, 
-                customer.status.status if customer.status else 'Unknown', 
-                customer.balance
-            ])
-        return buffer.getvalue()
+        return stream_csv(CSVService.CUSTOMER_COLUMNS, CSVService.customer_rows(customers))
 
     @staticmethod
     def export_employees(employees):
-        buffer = io.StringIO()
-        buffer.write('\ufeff') # BOM for Excel
-        writer = csv.writer(buffer)
-        writer.writerow(['id', 'first_name', 'last_name', 'email', 'role', 'is_available'])
-        
-        for emp in employees:
-            writer.writerow([
-                emp.id, emp.user.first_name, emp.user.last_name,
-                emp.user.email, emp.role.name, emp.is_available
-            ])
-        return buffer.getvalue()
+        return stream_csv(CSVService.EMPLOYEE_COLUMNS, CSVService.employee_rows(employees))
+
+    @staticmethod
+    def export_tariffs(tariffs):
+        return stream_csv(CSVService.TARIFF_COLUMNS, CSVService.tariff_rows(tariffs))
 
     @staticmethod
     def import_customers(csv_file):
@@ -45,8 +253,11 @@ class CSVService:
         created_count = 0
         errors = []
         
-        from api.models import Status, StatusContext
-        customer_status = Status.objects.get(status='Active', context__context='Customer')
+        from api.models import Status
+        from api.utils.reference_cache import get_status
+        customer_status = get_status('Customer', 'Active')
+        if customer_status is None:
+            raise Status.DoesNotExist("Status 'Active' not found in context 'Customer'")
 
         for row_num, row in enumerate(csv_data, start=2):
             try:
@@ -71,16 +282,28 @@ class CSVService:
         
         return created_count, errors
 
+    @staticmethod
+    def import_customers_bulk(csv_file, hash_workers=None):
+        """
+        Bulk import mode of import_customers for large files, see import_customer_rows.
+        """
+        decoded_file = csv_file.read().decode('utf-8-sig')
+        return import_customer_rows(csv.DictReader(io.StringIO(decoded_file)), hash_workers=hash_workers)
+
     @staticmethod
     def import_employees(csv_file):
         decoded_file = csv_file.read().decode('utf-8')
-        csv_data = csv.DictReader(io.StringIO(decoded_file))
+        return CSVService.import_employee_rows(csv.DictReader(io.StringIO(decoded_file)))
+
+    @staticmethod
+    def import_employee_rows(rows, first_row_num=2):
         created_count = 0
         errors = []
         
         from api.models import Employee, EmployeeRole
+        from api.utils.reference_cache import get_reference_id
         
-        for row_num, row in enumerate(csv_data, start=2):
+        for row_num, row in enumerate(rows, start=first_row_num):
             try:
                 with transaction.atomic():
                     user = User.objects.create_user(
@@ -90,10 +313,12 @@ class CSVService:
                         password=row.get('password', 'password123')
                     )
                     
-                    role, _ = EmployeeRole.objects.get_or_create(name=row['role'])
+                    role_id = get_reference_id('EmployeeRole', row['role'])
+                    if role_id is None:
+                        role_id = EmployeeRole.objects.get_or_create(name=row['role'])[0].id
                     Employee.objects.create(
                         user=user,
-                        role=role,
+                        role_id=role_id,
                         is_available=row.get('is_available', 'True').lower() == 'true'
                     )
                     created_count += 1
@@ -102,32 +327,19 @@ class CSVService:
         
         return created_count, errors
 
-    @staticmethod
-    def export_tariffs(tariffs):
-        buffer = io.StringIO()
-        buffer.write('\ufeff') # BOM for Excel
-        writer = csv.writer(buffer)
-        writer.writerow(['id', 'name', 'price', 'speed_mbps', 'traffic_limit_gb', 'is_active', 'description', 'services'])
-        
-        for t in tariffs:
-            services_str = ", ".join([s.name for s in t.services.all()])
-            writer.writerow([
-                t.id, t.name, t.price, t.speed_mbps,
-                t.traffic_limit_gb, t.is_active, t.description,
-                services_str
-            ])
-        return buffer.getvalue()
-
     @staticmethod
     def import_tariffs(csv_file):
         decoded_file = csv_file.read().decode('utf-8')
-        csv_data = csv.DictReader(io.StringIO(decoded_file))
+        return CSVService.import_tariff_rows(csv.DictReader(io.StringIO(decoded_file)))
+
+    @staticmethod
+    def import_tariff_rows(rows, first_row_num=2):
         created_count = 0
         errors = []
         
         from api.models import Tariff, Service
         
-        for row_num, row in enumerate(csv_data, start=2):
+        for row_num, row in enumerate(rows, start=first_row_num):
             try:
                 with transaction.atomic():
                     tariff, created = Tariff.objects.update_or_create(
@@ -0,0 +1,102 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from .analytics import DASHBOARD_SECTIONS
+
+SNAPSHOT_KEY = 'dashboard:snapshot:{}'
+VERSION_KEY = 'dashboard:snapshot:version'
+
+def serialize_dashboard_stats(data):
+    """
+    Turns the querysets and model instances returned by the analytics
+    sections into plain API data, so a section can be cached as is.
+    """
+    from ..serializers import (
+        ConnectionRequestSerializer, SupportTicketSerializer, TariffRecommendationSerializer
+    )
+
+    formatters = {
+        'latest_tickets': lambda tickets: SupportTicketSerializer(tickets, many=True).data,
+        'overdue_tickets': lambda tickets: SupportTicketSerializer(tickets, many=True).data,
+        'recent_requests': lambda requests: ConnectionRequestSerializer(requests, many=True).data,
+        'pending_recommendations': lambda recs: TariffRecommendationSerializer(recs, many=True).data,
+        'monthly_revenue': lambda months: [
+            {
+                'month': item['month'].strftime('%Y-%m') if item['month'] else None,
+                'total': float(item['total']) if item['total'] else 0
+            }
+            for item in months
+        ],
+        'top_problem_clients': lambda clients: [
+            {
+                'id': c.id,
+                'full_name': c.user.get_full_name(),
+                'ticket_count': c.ticket_count,
+                'status': c.status.status,
+                'balance': float(c.balance)
+            }
+            for c in clients
+        ],
+        'most_expensive': lambda equipment: {
+            'name': equipment['name'],
+            'price': float(equipment['price'])
+        } if equipment else None,
+    }
+    return {
+        key: formatters[key](value) if key in formatters else value
+        for key, value in data.items()
+    }
+
+def _next_version():
+    cache.add(VERSION_KEY, 0, None)
+    return cache.incr(VERSION_KEY)
+
+def build_dashboard_section(section):
+    """
+    Computes one dashboard section and stores it as a versioned snapshot.
+    """
+    snapshot = {
+        'version': _next_version(),
+        'generated_at': timezone.now(),
+        'data': serialize_dashboard_stats(DASHBOARD_SECTIONS[section](timezone.now())),
+    }
+    cache.set(SNAPSHOT_KEY.format(section), snapshot, settings.DASHBOARD_SNAPSHOT_TIMEOUT)
+    return snapshot
+
+def refresh_dashboard_snapshot():
+    """
+    Recomputes every dashboard section. Returns the number of sections built.
+    """
+    for section in DASHBOARD_SECTIONS:
+        build_dashboard_section(section)
+    return len(DASHBOARD_SECTIONS)
+
+def get_dashboard_snapshot(fresh=False):
+    """
+    Returns the dashboard assembled from cached sections, rebuilding only
+    missing or invalidated sections (or all of them when fresh is True).
+    The snapshot version is the newest section version and generated_at
+    the time the oldest section was computed.
+    """
+    keys = {section: SNAPSHOT_KEY.format(section) for section in DASHBOARD_SECTIONS}
+    cached = {} if fresh else cache.get_many(keys.values())
+
+    sections = [
+        cached.get(key) or build_dashboard_section(section)
+        for section, key in keys.items()
+    ]
+
+    data = {}
+    for snapshot in sections:
+        data.update(snapshot['data'])
+    return {
+        'version': max(snapshot['version'] for snapshot in sections),
+        'generated_at': min(snapshot['generated_at'] for snapshot in sections),
+        'data': data,
+    }
+
+def invalidate_dashboard_sections(*sections):
+    """
+    Drops cached sections so the next read recomputes them.
+    """
+    cache.delete_many([SNAPSHOT_KEY.format(section) for section in sections])
@@ -0,0 +1,236 @@
+import csv
+import itertools
+import os
+import zipfile
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.db import connection, transaction
+from django.http import HttpRequest, QueryDict
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from rest_framework.request import Request
+from ..models import DataJob, Customer, Employee, Invoice, Tariff
+from .csv_service import CSVService, import_customer_rows
+from .pdf_service import generate_invoices_document, render_invoices
+
+# Model, header and row source of each exportable resource
+EXPORTS = {
+    'customers': (Customer, CSVService.CUSTOMER_COLUMNS, CSVService.customer_rows),
+    'employees': (Employee, CSVService.EMPLOYEE_COLUMNS, CSVService.employee_rows),
+    'tariffs': (Tariff, CSVService.TARIFF_COLUMNS, CSVService.tariff_rows),
+}
+
+# View and action whose get_queryset and filter backends select the rows of each export
+EXPORT_VIEWS = {
+    'customers': ('api.views.customer.CustomerViewSet', 'export_csv'),
+    'employees': ('api.views.employee.EmployeeViewSet', 'export_csv'),
+    'tariffs': ('api.views.billing.TariffViewSet', 'export_csv'),
+    'invoice_pdfs': ('api.views.billing.InvoiceViewSet', 'pdf_bundle'),
+}
+
+# Row importer of each importable resource: (rows, first_row_num) -> (created_count, errors)
+IMPORTS = {
+    'customers': import_customer_rows,
+    'employees': CSVService.import_employee_rows,
+    'tariffs': CSVService.import_tariff_rows,
+}
+
+# First key of the PostgreSQL advisory lock held while a job runs
+JOB_LOCK_NAMESPACE = 4201
+
+def _job_dir(job):
+    path = os.path.join(settings.DATA_JOB_DIR, str(job.id))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def create_import_job(resource, uploaded_file, user=None):
+    """
+    Stores an uploaded CSV file in the job directory and creates a pending import job.
+    """
+    job = DataJob.objects.create(kind=DataJob.IMPORT, resource=resource, created_by=user)
+    path = os.path.join(_job_dir(job), 'source.csv')
+    with open(path, 'wb') as destination:
+        for chunk in uploaded_file.chunks():
+            destination.write(chunk)
+    job.source_file = path
+    job.save(update_fields=['source_file', 'updated_at'])
+    return job
+
+def create_export_job(resource, user=None, parameters=None):
+    """
+    Creates a pending export job of the rows of the resource that its
+    view returns for the query parameters ({name: [values]}).
+    """
+    return DataJob.objects.create(
+        kind=DataJob.EXPORT, resource=resource, created_by=user, parameters=parameters or {}
+    )
+
+def _save_checkpoint(job):
+    job.save(update_fields=['total_rows', 'processed_rows', 'checkpoint', 'created_count', 'errors', 'updated_at'])
+
+def _run_import(job):
+    importer = IMPORTS[job.resource]
+    with open(job.source_file, newline='', encoding='utf-8-sig') as source:
+        if job.total_rows is None:
+            job.total_rows = sum(1 for _ in csv.DictReader(source))
+            source.seek(0)
+            _save_checkpoint(job)
+
+        # Rows before the checkpoint were committed by an earlier run
+        rows = itertools.islice(csv.DictReader(source), job.processed_rows, None)
+        while True:
+            chunk = list(itertools.islice(rows, settings.DATA_JOB_CHUNK_SIZE))
+            if not chunk:
+                break
+            # The chunk and its checkpoint commit together, so a resumed job neither skips nor repeats rows
+            with transaction.atomic():
+                created, errors = importer(chunk, first_row_num=job.processed_rows + 2)
+                job.processed_rows += len(chunk)
+                job.created_count += created
+                job.errors.extend(errors)
+                _save_checkpoint(job)
+
+def _export_queryset(job):
+    """
+    Rows of the job's export, filtered by the resource's view as it filters
+    the request for the user who started the job. Ordered by pk, which the
+    checkpoints resume from.
+    """
+    http_request = HttpRequest()
+    http_request.method = 'GET'
+    http_request.GET = QueryDict(mutable=True)
+    for name, values in job.parameters.items():
+        http_request.GET.setlist(name, values)
+    request = Request(http_request)
+    request.user = job.created_by or AnonymousUser()
+    request.auth = None
+
+    view_path, action = EXPORT_VIEWS[job.resource]
+    view = import_string(view_path)(request=request, action=action, format_kwarg=None, args=(), kwargs={})
+    return view.filter_queryset(view.get_queryset()).order_by('pk')
+
+def _run_export(job):
+    model, columns, rows_for = EXPORTS[job.resource]
+    directory = _job_dir(job)
+    part_path = os.path.join(directory, f'{job.resource}.csv.part')
+    base = _export_queryset(job)
+    if job.total_rows is None:
+        job.total_rows = base.count()
+        _save_checkpoint(job)
+
+    # Drop whatever an interrupted run wrote after its last checkpoint
+    offset = job.checkpoint.get('offset', 0)
+    last_id = job.checkpoint.get('last_id', 0)
+    if os.path.exists(part_path):
+        os.truncate(part_path, offset)
+
+    with open(part_path, 'a', newline='', encoding='utf-8') as part:
+        writer = csv.writer(part)
+        if offset == 0:
+            part.write('\ufeff')  # BOM for Excel
+            writer.writerow(columns)
+        while True:
+            ids = list(base.filter(pk__gt=last_id).values_list('pk', flat=True)[:settings.DATA_JOB_CHUNK_SIZE])
+            if not ids:
+                break
+            writer.writerows(rows_for(model.objects.filter(pk__in=ids).order_by('pk')))
+            part.flush()
+            os.fsync(part.fileno())
+            last_id = ids[-1]
+            job.processed_rows += len(ids)
+            job.checkpoint = {'last_id': last_id, 'offset': os.fstat(part.fileno()).st_size}
+            _save_checkpoint(job)
+
+    job.result_file = os.path.join(directory, f'{job.resource}.csv')
+    os.replace(part_path, job.result_file)
+
+def _run_invoice_bundle(job):
+    """
+    Renders the invoices issued in the job's month into a zip of PDFs, or
+    into one multi-page PDF with combine. A resumed job writes the file
+    again, but takes the invoices it rendered before from the PDF cache.
+    """
+    month = job.parameters['month'][0]
+    first_day = datetime.strptime(month, '%Y-%m')
+    invoices = _export_queryset(job).filter(
+        issue_date__year=first_day.year, issue_date__month=first_day.month
+    ).select_related('contract__customer__user')
+    job.total_rows = invoices.count()
+    job.processed_rows = 0
+    _save_checkpoint(job)
+
+    directory = _job_dir(job)
+    if job.parameters.get('combine', [''])[0] in ('1', 'true'):
+        job.result_file = os.path.join(directory, f'invoices_{month}.pdf')
+        with open(f'{job.result_file}.part', 'wb') as part:
+            part.write(generate_invoices_document(invoices).getvalue())
+        job.processed_rows = job.total_rows
+        _save_checkpoint(job)
+    else:
+        job.result_file = os.path.join(directory, f'invoices_{month}.zip')
+        last_id = 0
+        with zipfile.ZipFile(f'{job.result_file}.part', 'w', zipfile.ZIP_DEFLATED) as archive:
+            while True:
+                chunk = list(invoices.filter(pk__gt=last_id)[:settings.DATA_JOB_CHUNK_SIZE])
+                if not chunk:
+                    break
+                for invoice_id, content in render_invoices(chunk).items():
+                    archive.writestr(f'invoice_{invoice_id}.pdf', content)
+                last_id = chunk[-1].id
+                job.processed_rows += len(chunk)
+                _save_checkpoint(job)
+    os.replace(f'{job.result_file}.part', job.result_file)
+
+def run_data_job(job_id):
+    """
+    Runs a job, resuming from its last checkpoint, until it completes.
+    A job already being run by another worker is left alone.
+    """
+    job = DataJob.objects.get(id=job_id)
+    if job.status in (DataJob.COMPLETED, DataJob.FAILED):
+        return job
+
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_try_advisory_lock(%s, %s)', [JOB_LOCK_NAMESPACE, job.id])
+        if not cursor.fetchone()[0]:
+            return job
+    try:
+        job.refresh_from_db()
+        job.status = DataJob.RUNNING
+        job.save(update_fields=['status', 'updated_at'])
+
+        if job.kind == DataJob.IMPORT:
+            _run_import(job)
+        elif job.resource == 'invoice_pdfs':
+            _run_invoice_bundle(job)
+        else:
+            _run_export(job)
+
+        job.status = DataJob.COMPLETED
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'result_file', 'finished_at', 'updated_at'])
+        return job
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_unlock(%s, %s)', [JOB_LOCK_NAMESPACE, job.id])
+
+def fail_data_job(job_id, exc):
+    DataJob.objects.filter(id=job_id).update(
+        status=DataJob.FAILED,
+        error_message=str(exc),
+        finished_at=timezone.now(),
+        updated_at=timezone.now()
+    )
+
+def stalled_data_jobs():
+    """
+    Ids of unfinished jobs that made no progress for DATA_JOB_STALL_TIMEOUT
+    seconds, e.g. because their worker was killed.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.DATA_JOB_STALL_TIMEOUT)
+    return list(
+        DataJob.objects.filter(
+            status__in=[DataJob.PENDING, DataJob.RUNNING], updated_at__lt=cutoff
+        ).values_list('id', flat=True)
+    )
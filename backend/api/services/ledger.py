@@ -0,0 +1,133 @@
+from datetime import datetime, time
+from django.db import connection, transaction
+from django.utils import timezone
+from ..models import BalanceSnapshot, BalanceTransaction, Customer
+
+# Balance of each customer in [first_id, last_id] rebuilt from its last snapshot
+# at or before as_of plus the transactions after it (all of them, starting from
+# the opening balance of the first one, when there is no snapshot yet).
+# The lateral joins read each customer's tail through the (customer, created_at)
+# index, pruning partitions older than the snapshot.
+LEDGER_QUERY = f"""
+    SELECT c.id, c.balance, COALESCE(s.balance, o.balance, 0) + COALESCE(t.amount, 0), COALESCE(t.count, 0), s.as_of
+    FROM {Customer._meta.db_table} c
+    LEFT JOIN LATERAL (
+        SELECT as_of, balance FROM {BalanceSnapshot._meta.db_table}
+        WHERE customer_id = c.id AND as_of <= %(as_of)s
+        ORDER BY as_of DESC LIMIT 1
+    ) s ON true
+    LEFT JOIN LATERAL (
+        SELECT balance_after - amount AS balance FROM {BalanceTransaction._meta.db_table}
+        WHERE customer_id = c.id AND s.as_of IS NULL
+        ORDER BY created_at, id LIMIT 1
+    ) o ON true
+    LEFT JOIN LATERAL (
+        SELECT SUM(amount) AS amount, COUNT(*) AS count FROM {BalanceTransaction._meta.db_table}
+        WHERE customer_id = c.id AND created_at >= COALESCE(s.as_of, '-infinity') AND created_at < %(as_of)s
+    ) t ON true
+    WHERE c.id BETWEEN %(first_id)s AND %(last_id)s
+"""
+
+
+def post_transactions(entries):
+    """
+    Applies (customer_id, amount, transaction_type, description) entries in
+    order within one database transaction. Every customer of the batch is
+    locked once, in id order, so a batch of top-ups costs one lock per
+    customer instead of one per transaction.
+    Returns the created BalanceTransaction records in entry order.
+    """
+    entries = list(entries)
+    if not entries:
+        return []
+
+    with transaction.atomic():
+        customers = {
+            customer.id: customer for customer in Customer.objects.select_for_update()
+            .filter(id__in={entry[0] for entry in entries})
+            .order_by('id')
+        }
+        records = []
+        for customer_id, amount, transaction_type, description in entries:
+            customer = customers.get(customer_id)
+            if customer is None:
+                raise Customer.DoesNotExist(f'Customer {customer_id} does not exist')
+            customer.balance += amount
+
+            # Task 4 logic: Track when balance becomes negative
+            if customer.balance < 0 and customer.balance_negative_since is None:
+                customer.balance_negative_since = timezone.now()
+            elif customer.balance >= 0:
+                customer.balance_negative_since = None
+
+            records.append(BalanceTransaction(
+                customer=customer,
+                amount=amount,
+                balance_after=customer.balance,
+                transaction_type=transaction_type,
+                description=description or ''
+            ))
+
+        BalanceTransaction.objects.bulk_create(records)
+        Customer.objects.bulk_update(customers.values(), ['balance', 'balance_negative_since'])
+    return records
+
+def snapshot_cutoff():
+    """
+    Start of today: transactions before it were committed long before a
+    snapshot is taken, so none can appear behind a snapshot afterwards.
+    """
+    return datetime.combine(timezone.now().date(), time.min)
+
+def ledger_balances(first_id, last_id, as_of=None):
+    """
+    Rows of (customer_id, balance, ledger balance, tail transactions, snapshot as_of)
+    of the customers with ids in [first_id, last_id]. The ledger balance is
+    the balance as of as_of (default: including every transaction).
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            LEDGER_QUERY + ' ORDER BY c.id',
+            {'first_id': first_id, 'last_id': last_id, 'as_of': as_of or datetime.max}
+        )
+        return cursor.fetchall()
+
+def ledger_balance(customer, as_of=None):
+    """
+    Balance of a customer rebuilt from its last snapshot and the ledger after it.
+    """
+    return ledger_balances(customer.id, customer.id, as_of)[0][2]
+
+def take_balance_snapshots(first_id, last_id, as_of=None):
+    """
+    Stores the ledger balance as of as_of (default: snapshot_cutoff()) of
+    every customer in [first_id, last_id] with transactions since its last
+    snapshot. Snapshots also keep balances rebuildable once old ledger
+    partitions are detached. Returns the number of snapshots created.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {BalanceSnapshot._meta.db_table} (customer_id, as_of, balance, created_at)
+            SELECT id, %(as_of)s, ledger_balance, %(now)s
+            FROM ({LEDGER_QUERY}) AS ledger (id, balance, ledger_balance, tail_count, snapshot_as_of)
+            WHERE tail_count > 0
+            ON CONFLICT (customer_id, as_of) DO NOTHING
+            """,
+            {'first_id': first_id, 'last_id': last_id, 'as_of': as_of or snapshot_cutoff(), 'now': timezone.now()}
+        )
+        return cursor.rowcount
+
+def reconcile_balances(first_id, last_id):
+    """
+    Compares Customer.balance with the ledger for the customers with ids in
+    [first_id, last_id]. Returns (customers checked, [(customer_id, balance,
+    ledger balance)] of the customers whose balances differ).
+    """
+    rows = ledger_balances(first_id, last_id)
+    mismatches = [
+        (customer_id, balance, ledger)
+        for customer_id, balance, ledger, _, _ in rows
+        if balance != ledger
+    ]
+    return len(rows), mismatches
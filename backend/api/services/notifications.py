@@ -1,4 +1,4 @@
-from django.core.mail import send_mail
+from django.core.mail import send_mail, send_mass_mail
 from django.conf import settings
 import logging
 from ..models import Notification
@@ -34,3 +34,33 @@ def send_notification(customer, notification_type, message):
             logger.error(f"Failed to send email to {customer.user.email}: {str(e)}")
             
     return notif
+
+def send_notifications(notifications):
+    """
+    Batch version of send_notification for (customer, notification_type, message)
+    tuples: creates the records with one INSERT and sends the emails over a
+    single mail connection.
+    """
+    notifications = [item for item in notifications if item[0]]
+    created = Notification.objects.bulk_create([
+        Notification(customer=customer, notification_type=notification_type, message=message)
+        for customer, notification_type, message in notifications
+    ])
+
+    emails = [
+        (
+            f"Notification: {notification_type.replace('_', ' ').title()}",
+            message,
+            settings.DEFAULT_FROM_EMAIL,
+            [customer.user.email]
+        )
+        for customer, notification_type, message in notifications
+        if customer.preferred_notification == 'email'
+    ]
+    if emails:
+        try:
+            send_mass_mail(emails, fail_silently=False)
+        except Exception as e:
+            logger.error(f"Failed to send {len(emails)} notification emails: {str(e)}")
+
+    return created
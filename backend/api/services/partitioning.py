@@ -0,0 +1,200 @@
+import gzip
+import os
+import re
+from datetime import date
+from django.apps import apps
+from django.db import connections, transaction, DEFAULT_DB_ALIAS
+
+# Tables range-partitioned by month, with their partition column
+PARTITIONED_MODELS = {
+    'NetworkUsage': 'date',
+    'BalanceTransaction': 'created_at',
+}
+
+# Monthly partitions kept ready beyond the current month
+MONTHS_AHEAD = 3
+
+PARTITION_SUFFIX = re.compile(r'_p(\d{4})_(\d{2})$')
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+def partition_name(table, month):
+    return f'{table}_p{month:%Y_%m}'
+
+def _model_table(model_name):
+    model = apps.get_model('api', model_name)
+    return model._meta.db_table, PARTITIONED_MODELS[model_name]
+
+def _is_partitioned(cursor, table):
+    cursor.execute('SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)', [table])
+    row = cursor.fetchone()
+    return row[0] == 'p' if row else None
+
+def _create_partition(cursor, table, column, month):
+    """
+    Creates the partition of a month, moving rows that landed in the default
+    partition for that month into it. Returns False if it already exists.
+    """
+    name = partition_name(table, month)
+    cursor.execute('SELECT to_regclass(%s) IS NOT NULL', [name])
+    if cursor.fetchone()[0]:
+        return False
+
+    start, end = month, add_months(month, 1)
+    default = f'{table}_default'
+    cursor.execute(f'SELECT EXISTS (SELECT 1 FROM {default} WHERE {column} >= %s AND {column} < %s)', [start, end])
+    if not cursor.fetchone()[0]:
+        cursor.execute(f"CREATE TABLE {name} PARTITION OF {table} FOR VALUES FROM ('{start}') TO ('{end}')")
+        return True
+
+    # A new range may not overlap rows held by the default partition
+    cursor.execute(f'ALTER TABLE {table} DETACH PARTITION {default}')
+    cursor.execute(f"CREATE TABLE {name} PARTITION OF {table} FOR VALUES FROM ('{start}') TO ('{end}')")
+    cursor.execute(
+        f'WITH moved AS (DELETE FROM {default} WHERE {column} >= %s AND {column} < %s RETURNING *) '
+        f'INSERT INTO {name} SELECT * FROM moved',
+        [start, end]
+    )
+    cursor.execute(f'ALTER TABLE {table} ATTACH PARTITION {default} DEFAULT')
+    return True
+
+def partition_table(model_name, using=DEFAULT_DB_ALIAS, months_ahead=MONTHS_AHEAD):
+    """
+    Converts the table of a model into one range-partitioned by month, with
+    a partition for every month from its oldest row to months_ahead months
+    from now, plus a default partition for anything outside those ranges.
+
+    Rows, defaults, check and foreign key constraints and indexes keep their
+    names. The primary key becomes (id, partition column), as PostgreSQL
+    requires, and id is served by a sequence instead of an identity column.
+    Does nothing and returns False if the table is missing or already partitioned.
+    """
+    table, column = _model_table(model_name)
+    connection = connections[using]
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        if _is_partitioned(cursor, table) is not False:
+            return False
+
+        cursor.execute(
+            """
+            SELECT conname, contype, pg_get_constraintdef(oid)
+            FROM pg_constraint WHERE conrelid = %s::regclass AND contype IN ('p', 'u', 'f')
+            """,
+            [table]
+        )
+        constraints = cursor.fetchall()
+        cursor.execute(
+            """
+            SELECT indexdef FROM pg_indexes
+            WHERE schemaname = current_schema() AND tablename = %s
+              AND indexname NOT IN (SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass)
+            """,
+            [table, table]
+        )
+        indexes = [row[0] for row in cursor.fetchall()]
+        for name, kind, definition in constraints:
+            if kind == 'u' and column not in definition:
+                raise ValueError(f'Unique constraint {name} of {table} does not include {column}')
+
+        cursor.execute(f'SELECT MIN({column})::date, COALESCE(MAX(id), 0) FROM {table}')
+        oldest, max_id = cursor.fetchone()
+
+        old_table = f'{table}_unpartitioned'
+        cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+        cursor.execute(f'ALTER TABLE {table} RENAME TO {old_table}')
+        cursor.execute(
+            f'CREATE TABLE {table} (LIKE {old_table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+            f'PARTITION BY RANGE ({column})'
+        )
+        cursor.execute(f'CREATE TABLE {table}_default PARTITION OF {table} DEFAULT')
+        this_month = date.today().replace(day=1)
+        month = min(oldest.replace(day=1), this_month) if oldest else this_month
+        while month <= add_months(this_month, months_ahead):
+            _create_partition(cursor, table, column, month)
+            month = add_months(month, 1)
+
+        cursor.execute(f'INSERT INTO {table} SELECT * FROM {old_table}')
+        cursor.execute(f'DROP TABLE {old_table}')
+
+        for name, kind, definition in constraints:
+            if kind == 'p':
+                definition = f'PRIMARY KEY (id, {column})'
+            cursor.execute(f'ALTER TABLE {table} ADD CONSTRAINT {name} {definition}')
+        for definition in indexes:
+            cursor.execute(definition)
+
+        cursor.execute(f'CREATE SEQUENCE {table}_id_seq OWNED BY {table}.id')
+        cursor.execute(f"ALTER TABLE {table} ALTER COLUMN id SET DEFAULT nextval('{table}_id_seq')")
+        cursor.execute(f"SELECT setval('{table}_id_seq', %s, false)", [max_id + 1])
+    return True
+
+def partition_tables(using=DEFAULT_DB_ALIAS):
+    """
+    Partitions every table of PARTITIONED_MODELS that is not partitioned yet.
+    Returns the names of the converted models.
+    """
+    return [model_name for model_name in PARTITIONED_MODELS if partition_table(model_name, using)]
+
+def create_partitions(model_name, months_ahead=MONTHS_AHEAD, using=DEFAULT_DB_ALIAS):
+    """
+    Creates the missing partitions from the current month to months_ahead
+    months from now. Returns the names of the created partitions.
+    """
+    table, column = _model_table(model_name)
+    created = []
+    with transaction.atomic(using=using), connections[using].cursor() as cursor:
+        if not _is_partitioned(cursor, table):
+            return created
+        month = date.today().replace(day=1)
+        for _ in range(months_ahead + 1):
+            if _create_partition(cursor, table, column, month):
+                created.append(partition_name(table, month))
+            month = add_months(month, 1)
+    return created
+
+def list_partitions(model_name, using=DEFAULT_DB_ALIAS):
+    """
+    [(month, partition name)] of the attached monthly partitions, oldest first.
+    """
+    table, _ = _model_table(model_name)
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            'SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+            'WHERE i.inhparent = to_regclass(%s)',
+            [table]
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    partitions = []
+    for name in names:
+        match = PARTITION_SUFFIX.search(name)
+        if match:
+            partitions.append((date(int(match.group(1)), int(match.group(2)), 1), name))
+    return sorted(partitions)
+
+def detach_partitions(model_name, before_month, archive_dir=None, drop=False, using=DEFAULT_DB_ALIAS):
+    """
+    Detaches the monthly partitions of months before before_month. Detached
+    partitions stay behind as plain tables, unless they are archived to
+    <archive_dir>/<partition>.csv.gz (and then dropped) or drop is set.
+    Returns the names of the detached partitions.
+    """
+    table, _ = _model_table(model_name)
+    detached = []
+    for month, name in list_partitions(model_name, using):
+        if month >= before_month:
+            break
+        with transaction.atomic(using=using), connections[using].cursor() as cursor:
+            # Deferred foreign key checks of rows written earlier in the transaction would block the DROP
+            cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+            cursor.execute(f'ALTER TABLE {table} DETACH PARTITION {name}')
+            if archive_dir:
+                os.makedirs(archive_dir, exist_ok=True)
+                with gzip.open(os.path.join(archive_dir, f'{name}.csv.gz'), 'wt', encoding='utf-8', newline='') as archive:
+                    cursor.copy_expert(f'COPY {name} TO STDOUT WITH (FORMAT csv, HEADER)', archive)
+            if archive_dir or drop:
+                cursor.execute(f'DROP TABLE {name}')
+        detached.append(name)
+    return detached
@@ -1,15 +1,23 @@
+import functools
+import glob
+import hashlib
 import io
-from datetime import datetime
+import multiprocessing
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from django.conf import settings
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import letter
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.styles import getSampleStyleSheet
 from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, HRFlowable
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 
+@functools.lru_cache(maxsize=None)
 def setup_fonts():
-    """Register fonts that support Cyrillic characters"""
+    """Register fonts that support Cyrillic characters (once per process)"""
     try:
         pdfmetrics.registerFont(TTFont('DejaVuSans', 'DejaVuSans.ttf'))
         pdfmetrics.registerFont(TTFont('DejaVuSans-Bold', 'DejaVuSans-Bold.ttf'))
@@ -18,27 +26,44 @@ def setup_fonts():
         # Fallback to standard fonts if custom ones aren't available
         return 'Helvetica', 'Helvetica-Bold'
 
-def generate_contract_pdf(contract):
-    buffer = io.BytesIO()
+@functools.lru_cache(maxsize=None)
+def get_styles():
+    """
+    Paragraph styles shared by all documents, built once per process.
+    Documents only read them, so one instance serves every render.
+    """
     font_normal, font_bold = setup_fonts()
-    
-    doc = SimpleDocTemplate(buffer, pagesize=letter, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=18)
-    elements = []
     styles = getSampleStyleSheet()
-    
+
     title_style = styles["Heading1"]
     title_style.fontName = font_bold
-    title_style.alignment = 1 
-    
+    title_style.alignment = 1
+
     subtitle_style = styles["Heading2"]
     subtitle_style.fontName = font_bold
-    
+
     normal_style = styles["Normal"]
     normal_style.fontName = font_normal
+    return {'title': title_style, 'subtitle': subtitle_style, 'normal': normal_style}
+
+def _build(elements, **doc_options):
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter, **doc_options)
+    doc.build(elements)
+    buffer.seek(0)
+    return buffer
+
+def _contract_elements(contract):
+    font_normal, font_bold = setup_fonts()
+    styles = get_styles()
+    title_style = styles["title"]
+    subtitle_style = styles["subtitle"]
+    normal_style = styles["normal"]
+    elements = []
     
     elements.append(Paragraph(f"Contract #{contract.id}", title_style))
     elements.append(Spacer(1, 0.25*inch))
-    elements.append(Paragraph(f"Generated on: {datetime.now().strftime('%B %d, %Y')}", normal_style))
+    elements.append(Paragraph(f"Last updated: {contract.updated_at.strftime('%B %d, %Y')}", normal_style))
     elements.append(Spacer(1, 0.25*inch))
     
     # Customer Info
@@ -74,21 +99,15 @@ def generate_contract_pdf(contract):
         ("PADDING", (0, 0), (-1, -1), 6),
     ]))
     elements.append(contract_table)
-    
-    doc.build(elements)
-    buffer.seek(0)
-    return buffer
+    return elements
 
-def generate_invoice_pdf(invoice):
-    buffer = io.BytesIO()
+def generate_contract_pdf(contract):
+    return _build(_contract_elements(contract), rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=18)
+
+def _invoice_elements(invoice):
     font_normal, font_bold = setup_fonts()
-    doc = SimpleDocTemplate(buffer, pagesize=letter)
+    title_style = get_styles()["title"]
     elements = []
-    styles = getSampleStyleSheet()
-    
-    title_style = styles["Heading1"]
-    title_style.fontName = font_bold
-    title_style.alignment = 1
     
     elements.append(Paragraph(f"Invoice #{invoice.id}", title_style))
     elements.append(Spacer(1, 0.25*inch))
@@ -106,13 +125,175 @@ def generate_invoice_pdf(invoice):
         ("PADDING", (0, 0), (-1, -1), 10),
     ]))
     elements.append(t)
-    
-    doc.build(elements)
-    buffer.seek(0)
-    return buffer
+    return elements
+
+def generate_invoice_pdf(invoice):
+    return _build(_invoice_elements(invoice))
+
+def _receipt_elements(payment):
+    font_normal, font_bold = setup_fonts()
+    title_style = get_styles()["title"]
+    elements = []
+
+    elements.append(Paragraph(f"Receipt #{payment.id}", title_style))
+    elements.append(Spacer(1, 0.25*inch))
+
+    data = [
+        ["Customer:", f"{payment.customer.user.first_name} {payment.customer.user.last_name}"],
+        ["Amount:", f"${payment.amount}"],
+        ["Method:", payment.method.method],
+        ["Date:", payment.payment_date.strftime("%B %d, %Y %H:%M")],
+        ["Invoice:", f"#{payment.invoice_id}" if payment.invoice_id else "N/A"],
+    ]
+    t = Table(data, colWidths=[1.5*inch, 3*inch])
+    t.setStyle(TableStyle([
+        ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
+        ("FONT", (0, 0), (-1, -1), font_normal),
+        ("PADDING", (0, 0), (-1, -1), 10),
+    ]))
+    elements.append(t)
+    return elements
 
 def generate_receipt_pdf(payment):
+    return _build(_receipt_elements(payment))
+
+# Bump whenever the layout of a document changes, so cached files are re-rendered
+TEMPLATE_VERSION = 2
+
+# Values each document is rendered from (keep in sync with the *_elements functions)
+DOCUMENT_FIELDS = {
+    'contracts': lambda contract: (
+        contract.id, contract.customer.user.first_name, contract.customer.user.last_name,
+        contract.customer.user.email, contract.customer.phone_number, contract.service.name,
+        contract.tariff.name if contract.tariff else None, contract.start_date.date(), contract.is_active,
+        contract.updated_at.date(),
+    ),
+    'invoices': lambda invoice: (
+        invoice.id, invoice.contract.customer.user.first_name, invoice.contract.customer.user.last_name,
+        invoice.amount, invoice.due_date.date(), invoice.status,
+    ),
+    'receipts': lambda payment: (
+        payment.id, payment.customer.user.first_name, payment.customer.user.last_name,
+        payment.amount, payment.method.method, payment.payment_date.replace(second=0, microsecond=0),
+        payment.invoice_id,
+    ),
+}
+
+def _renderer(kind):
+    return {
+        'contracts': generate_contract_pdf,
+        'invoices': generate_invoice_pdf,
+        'receipts': generate_receipt_pdf,
+    }[kind]
+
+def document_etag(kind, obj):
+    """
+    Digest of the values a document is rendered from. It changes exactly when
+    the rendered document would, so it serves as both ETag and cache key.
+    """
+    payload = repr((TEMPLATE_VERSION, kind, DOCUMENT_FIELDS[kind](obj)))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def _cache_path(kind, obj, etag=None):
+    etag = etag or document_etag(kind, obj)
+    return os.path.join(settings.PDF_CACHE_DIR, kind, f'{obj.id}-{etag}.pdf')
+
+def _read_cached(path):
+    try:
+        with open(path, 'rb') as cached:
+            return cached.read()
+    except FileNotFoundError:
+        return None
+
+def _store_cached(path, content):
+    """
+    Writes a rendered document atomically and drops older versions of it.
+    """
+    directory, name = os.path.split(path)
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as tmp:
+        tmp.write(content)
+    os.replace(tmp_path, path)
+
+    object_id = name.split('-', 1)[0]
+    for stale in glob.glob(os.path.join(directory, f'{object_id}-*.pdf')):
+        if stale != path:
+            try:
+                os.remove(stale)
+            except FileNotFoundError:
+                pass
+
+def get_pdf_file(kind, obj, etag=None):
+    """
+    Path of the cached 'contracts', 'invoices' or 'receipts' document of obj.
+    It is rendered on first use and again only after its source values change.
+    """
+    path = _cache_path(kind, obj, etag)
+    if not os.path.exists(path):
+        _store_cached(path, _renderer(kind)(obj).getvalue())
+    return path
+
+def get_contract_pdf(contract):
+    with open(get_pdf_file('contracts', contract), 'rb') as cached:
+        return io.BytesIO(cached.read())
+
+def get_invoice_pdf(invoice):
+    with open(get_pdf_file('invoices', invoice), 'rb') as cached:
+        return io.BytesIO(cached.read())
+
+def _render_invoice(invoice):
+    # Runs in the pool workers; relations are preloaded, so no queries are made
+    return generate_invoice_pdf(invoice).getvalue()
+
+def render_invoices(invoices, workers=None):
+    """
+    Returns {invoice id: PDF bytes} for the invoices, taking cached documents
+    from disk and rendering the others in a process pool (rendering is CPU
+    bound). Falls back to rendering in this process inside daemonic processes
+    such as Celery prefork workers, which cannot start children.
+    """
+    invoices = list(invoices)
+    documents = {}
+    missing = []
+    for invoice in invoices:
+        content = _read_cached(_cache_path('invoices', invoice))
+        if content is None:
+            missing.append(invoice)
+        else:
+            documents[invoice.id] = content
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(missing) < 2 * workers or multiprocessing.current_process().daemon:
+        rendered = [_render_invoice(invoice) for invoice in missing]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            rendered = list(pool.map(_render_invoice, missing, chunksize=max(1, len(missing) // (workers * 4))))
+
+    for invoice, content in zip(missing, rendered):
+        _store_cached(_cache_path('invoices', invoice), content)
+        documents[invoice.id] = content
+    return {invoice.id: documents[invoice.id] for invoice in invoices}
+
+def generate_invoices_zip(invoices, workers=None):
+    """
+    Zip archive with one invoice_<id>.pdf per invoice (see render_invoices).
+    """
     buffer = io.BytesIO()
-    # ...
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for invoice_id, content in render_invoices(invoices, workers).items():
+            archive.writestr(f'invoice_{invoice_id}.pdf', content)
     buffer.seek(0)
     return buffer
+
+def generate_invoices_document(invoices):
+    """
+    Single PDF with one page per invoice. Rendered in this process, as one
+    document cannot be split between workers.
+    """
+    elements = []
+    for invoice in invoices:
+        if elements:
+            elements.append(PageBreak())
+        elements.extend(_invoice_elements(invoice))
+    return _build(elements or [Spacer(1, 0)])
@@ -1,86 +1,136 @@
+from bisect import bisect_left, bisect_right
+from decimal import Decimal
 from django.utils import timezone
 from datetime import timedelta
-from django.db.models import Avg, Sum
-from ..models import TariffRecommendation, Tariff, NetworkUsage, Contract
+from ..models import TariffRecommendation, Tariff, Contract
+from .usage_store import daily_usage_averages
 
-def generate_tariff_recommendation(customer):
+class TariffCatalogue:
     """
-    Analyzes last 3 months of usage and recommends a better tariff.
+    In-memory index of active tariffs sorted by price.
+    Built once per recommendation run so tariff lookups cost no queries.
     """
-    # a) Get active contract
-    active_contract = Contract.objects.filter(
-        customer=customer, 
-        status__in=['active', 'Active']
-    ).select_related('tariff').first()
-    
-    if not active_contract or not active_contract.tariff:
-        return None
-        
-    current_tariff = active_contract.tariff
-    
-    # b) Get NetworkUsage for last 3 months
-    three_months_ago = timezone.now() - timedelta(days=90)
-    usage_records = NetworkUsage.objects.filter(
-        contract=active_contract,
-        date__gte=three_months_ago
-    )
-    
-    if usage_records.count() < 7:
+
+    def __init__(self, tariffs):
+        self.tariffs = sorted(tariffs, key=lambda t: (t.price, t.id))
+        self.prices = [t.price for t in self.tariffs]
+
+    @classmethod
+    def load(cls):
+        return cls(Tariff.objects.filter(is_active=True))
+
+    def cheapest_downgrade(self, current_tariff):
+        """Cheapest tariff where price < current and speed >= current * 0.5"""
+        min_speed = current_tariff.speed_mbps * 0.5
+        for tariff in self.tariffs[:bisect_left(self.prices, current_tariff.price)]:
+            if tariff.speed_mbps >= min_speed:
+                return tariff
         return None
-        
-    # c) Calculate avg usage (download + upload) as percentage of tariff limit
-    # Note: download_gb and upload_gb are in GB. traffic_limit_gb is in GB.
-    # Calculate sum per day then avg.
-    # Wait, aggregate(Avg(Sum...)) is not valid in standard Django like this.
-    # Need to calculate sum per day then avg.
-    daily_usages = [r.download_gb + r.upload_gb for r in usage_records]
-    avg_total_gb = sum(daily_usages) / len(daily_usages)
-    
-    if current_tariff.traffic_limit_gb == 0: # Unlimited?
-        avg_usage_percent = 0
-    else:
-        avg_usage_percent = (avg_total_gb / current_tariff.traffic_limit_gb) * 100
-        
-    # d) Determine recommendation
-    recommended_tariff = None
-    reason = None
-    
-    if avg_usage_percent < 40:
-        reason = TariffRecommendation.UNDERUSING
-        # Cheapest tariff where price < current and speed >= current * 0.5
-        recommended_tariff = Tariff.objects.filter(
-            is_active=True,
-            price__lt=current_tariff.price,
-            speed_mbps__gte=current_tariff.speed_mbps * 0.5
-        ).order_by('price').first()
-        
-    elif avg_usage_percent > 90:
-        reason = TariffRecommendation.OVERUSING
-        # Cheapest tariff where limit > current and price <= current * 1.5
-        recommended_tariff = Tariff.objects.filter(
-            is_active=True,
-            traffic_limit_gb__gt=current_tariff.traffic_limit_gb,
-            price__lte=current_tariff.price * 1.5
-        ).order_by('price').first()
-        
-    if not recommended_tariff or recommended_tariff == current_tariff:
+
+    def cheapest_upgrade(self, current_tariff):
+        """Cheapest tariff where limit > current and price <= current * 1.5"""
+        max_price = current_tariff.price * Decimal('1.5')
+        for tariff in self.tariffs[:bisect_right(self.prices, max_price)]:
+            if tariff.traffic_limit_gb > current_tariff.traffic_limit_gb:
+                return tariff
         return None
-        
+
+def generate_tariff_recommendations(customers, catalogue=None):
+    """
+    Analyzes last 3 months of usage for a batch of customers and recommends
+    better tariffs. Usage is averaged per contract with one array reduction
+    over the usage store (or one grouped query when the store does not cover
+    the period) and duplicates are filtered with one query for the whole batch.
+    Returns unsaved TariffRecommendation objects.
+    """
+    customers = list(customers)
+    customer_ids = [customer.id for customer in customers]
+    catalogue = catalogue or TariffCatalogue.load()
+    now = timezone.now()
+
+    # a) Get active contract (the first one per customer)
+    active_contracts = {
+        contract.customer_id: contract
+        for contract in Contract.objects.filter(
+            customer_id__in=customer_ids,
+            status__in=['active', 'Active']
+        ).select_related('tariff').order_by('customer_id', 'id').distinct('customer_id')
+    }
+
+    # b) Get NetworkUsage for last 3 months, averaged per day
+    today = now.date()
+    contract_ids, days, averages = daily_usage_averages(
+        today - timedelta(days=90), today, [contract.id for contract in active_contracts.values()]
+    )
+    usage = {
+        contract_id: {'days': count, 'avg_total_gb': Decimal(str(round(average, 4)))}
+        for contract_id, count, average in zip(contract_ids.tolist(), days.tolist(), averages.tolist())
+    }
+
     # f) Duplicate prevention
-    existing = TariffRecommendation.objects.filter(
-        customer=customer,
-        recommended_tariff=recommended_tariff,
-        created_at__month=timezone.now().month,
-        created_at__year=timezone.now().year
-    ).exists()
-    
-    if existing:
-        return None
-        
-    return TariffRecommendation(
-        customer=customer,
-        current_tariff=current_tariff,
-        recommended_tariff=recommended_tariff,
-        reason=reason,
-        avg_usage_percent=avg_usage_percent
+    existing = set(
+        TariffRecommendation.objects.filter(
+            customer_id__in=customer_ids,
+            created_at__month=now.month,
+            created_at__year=now.year
+        ).values_list('customer_id', 'recommended_tariff_id')
     )
+
+    recommendations = []
+    for customer in customers:
+        active_contract = active_contracts.get(customer.id)
+        if not active_contract or not active_contract.tariff:
+            continue
+        current_tariff = active_contract.tariff
+
+        contract_usage = usage.get(active_contract.id)
+        if not contract_usage or contract_usage['days'] < 7:
+            continue
+
+        # c) Calculate avg usage (download + upload) as percentage of tariff limit
+        if current_tariff.traffic_limit_gb == 0: # Unlimited?
+            avg_usage_percent = 0
+        else:
+            avg_usage_percent = (contract_usage['avg_total_gb'] / current_tariff.traffic_limit_gb) * 100
+
+        # d) Determine recommendation
+        recommended_tariff = None
+        reason = None
+
+        if avg_usage_percent < 40:
+            reason = TariffRecommendation.UNDERUSING
+            recommended_tariff = catalogue.cheapest_downgrade(current_tariff)
+        elif avg_usage_percent > 90:
+            reason = TariffRecommendation.OVERUSING
+            recommended_tariff = catalogue.cheapest_upgrade(current_tariff)
+
+        if not recommended_tariff or recommended_tariff.id == current_tariff.id:
+            continue
+        if (customer.id, recommended_tariff.id) in existing:
+            continue
+
+        recommendations.append(TariffRecommendation(
+            customer=customer,
+            current_tariff=current_tariff,
+            recommended_tariff=recommended_tariff,
+            reason=reason,
+            # avg_usage_percent holds at most 999.99
+            avg_usage_percent=min(avg_usage_percent, Decimal('999.99'))
+        ))
+
+    return recommendations
+
+def save_tariff_recommendations(customers, catalogue=None):
+    """
+    Generates and bulk inserts tariff recommendations for a batch of customers.
+    """
+    return TariffRecommendation.objects.bulk_create(
+        generate_tariff_recommendations(customers, catalogue)
+    )
+
+def generate_tariff_recommendation(customer):
+    """
+    Analyzes last 3 months of usage and recommends a better tariff.
+    """
+    recommendations = generate_tariff_recommendations([customer])
+    return recommendations[0] if recommendations else None
@@ -1,70 +1,101 @@
 from django.utils import timezone
 from datetime import timedelta
+from django.db.models import Count, Min
 from ..models import ClientScore, Contract, Invoice, SupportTicket
 
-def calculate_customer_score(customer):
+def _contract_points(age_days):
+    if age_days is None:
+        return 0
+    if age_days > 365:
+        return 30
+    if age_days > 180:
+        return 20
+    return 10
+
+def _overdue_points(overdue_count):
+    if overdue_count == 0:
+        return 30
+    if overdue_count <= 2:
+        return 15
+    return 0
+
+def _ticket_points(ticket_count):
+    if ticket_count == 0:
+        return 20
+    if ticket_count <= 2:
+        return 10
+    return 0
+
+def calculate_customer_scores(customers):
     """
-    Calculates reliability score (0-100) based on history.
+    Calculates reliability scores (0-100) for a batch of customers.
+    Each signal is fetched for the whole batch with one grouped query and the
+    point rules are applied column by column.
     Rules:
-    - Contract Points (max 30): age based.
+    - Contract Points (max 30): age of the oldest active contract.
     - Overdue Points (max 30): based on invoices in last 12 months.
     - Ticket Points (max 20): based on support activity in last 30 days.
+    Returns unsaved ClientScore objects in the order of customers.
     """
+    customers = list(customers)
+    customer_ids = [customer.id for customer in customers]
     now = timezone.now()
-    
-    # 1. CONTRACT POINTS (max 30)
-    contract_points = 0
-    oldest_contract = Contract.objects.filter(
-        customer=customer, 
-        status__in=['active', 'Active']
-    ).order_by('start_date').first()
-    
-    if oldest_contract:
-        age_days = (now - oldest_contract.start_date).days
-        if age_days > 365:
-            contract_points = 30
-        elif age_days > 180:
-            contract_points = 20
-        else:
-            contract_points = 10
-            
-    # 2. OVERDUE POINTS (max 30)
-    overdue_points = 0
-    one_year_ago = now - timedelta(days=365)
-    overdue_count = Invoice.objects.filter(
-        contract__customer=customer,
-        status='overdue',
-        due_date__gte=one_year_ago
-    ).count()
-    
-    if overdue_count == 0:
-        overdue_points = 30
-    elif overdue_count <= 2:
-        overdue_points = 15
-    else:
-        overdue_points = 0
-        
-    # 3. TICKET POINTS (max 20)
-    ticket_points = 0
-    thirty_days_ago = now - timedelta(days=30)
-    ticket_count = SupportTicket.objects.filter(
-        customer=customer,
-        created_at__gte=thirty_days_ago
-    ).count()
-    
-    if ticket_count == 0:
-        ticket_points = 20
-    elif ticket_count <= 2:
-        ticket_points = 10
-    else:
-        ticket_points = 0
-        
-    total_score = contract_points + overdue_points + ticket_points
-    
-    return ClientScore(
-        customer=customer,
-        score=total_score,
-        contract_points=contract_points,
-        overdue_points=overdue_points,
-        ticket_points=ticket_points
+
+    oldest_contract_start = dict(
+        Contract.objects.filter(customer_id__in=customer_ids, status__in=['active', 'Active'])
+        .values('customer_id')
+        .annotate(oldest=Min('start_date'))
+        .values_list('customer_id', 'oldest')
+    )
+    overdue_counts = dict(
+        Invoice.objects.filter(
+            contract__customer_id__in=customer_ids,
+            status='overdue',
+            due_date__gte=now - timedelta(days=365)
+        )
+        .values('contract__customer_id')
+        .annotate(count=Count('id'))
+        .values_list('contract__customer_id', 'count')
     )
+    ticket_counts = dict(
+        SupportTicket.objects.filter(
+            customer_id__in=customer_ids,
+            created_at__gte=now - timedelta(days=30)
+        )
+        .values('customer_id')
+        .annotate(count=Count('id'))
+        .values_list('customer_id', 'count')
+    )
+
+    age_days = [
+        (now - oldest_contract_start[pk]).days if pk in oldest_contract_start else None
+        for pk in customer_ids
+    ]
+    contract_points = [_contract_points(days) for days in age_days]
+    overdue_points = [_overdue_points(overdue_counts.get(pk, 0)) for pk in customer_ids]
+    ticket_points = [_ticket_points(ticket_counts.get(pk, 0)) for pk in customer_ids]
+
+    return [
+        ClientScore(
+            customer=customer,
+            score=contract + overdue + ticket,
+            contract_points=contract,
+            overdue_points=overdue,
+            ticket_points=ticket
+        )
+        for customer, contract, overdue, ticket
+        in zip(customers, contract_points, overdue_points, ticket_points)
+    ]
+
+def save_customer_scores(customers):
+    """
+    Calculates and bulk inserts scores for a batch of customers.
+    """
+    return ClientScore.objects.bulk_create(calculate_customer_scores(customers))
+
+def calculate_customer_score(customer):
+    """
+    Calculates reliability score (0-100) for a single customer.
+    See calculate_customer_scores for the rules.
+    """
+    return calculate_customer_scores([customer])[0]
@@ -0,0 +1,69 @@
+from django.db import connection, transaction
+from django.utils import timezone
+from ..models import SupportTicket, Status, StatusContext, Notification
+from .dashboard import invalidate_dashboard_sections
+
+# Ticket statuses that still run against their SLA
+OPEN_TICKET_STATUSES = ('Open', 'In Progress', 'New')
+
+def _mark_breach_batch(now, batch_size, ticket_ids=None):
+    """
+    Flags up to batch_size overdue tickets (optionally only those in
+    ticket_ids) with one UPDATE ... RETURNING.
+    Rows locked by a concurrent run are skipped rather than waited for.
+    """
+    only_ids = 'AND t.id = ANY(%s)' if ticket_ids is not None else ''
+    params = [now, OPEN_TICKET_STATUSES] + ([list(ticket_ids)] if ticket_ids is not None else []) + [batch_size]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            UPDATE {SupportTicket._meta.db_table} SET is_sla_breached = TRUE
+            WHERE id IN (
+                SELECT t.id
+                FROM {SupportTicket._meta.db_table} t
+                JOIN {Status._meta.db_table} s ON s.id = t.status_id
+                JOIN {StatusContext._meta.db_table} c ON c.id = s.context_id
+                WHERE t.is_sla_breached = FALSE
+                  AND t.sla_deadline < %s
+                  AND c.context = 'SupportTicket'
+                  AND s.status IN %s
+                  {only_ids}
+                ORDER BY t.sla_deadline
+                LIMIT %s
+                FOR UPDATE OF t SKIP LOCKED
+            )
+            RETURNING id, customer_id, subject
+            """,
+            params
+        )
+        return cursor.fetchall()
+
+def mark_sla_breaches(now=None, batch_size=1000, ticket_ids=None):
+    """
+    Marks every open ticket whose sla_deadline has passed as breached and
+    bulk creates one SLA_BREACHED notification per ticket, batch by batch.
+    ticket_ids restricts the run to the given tickets.
+    Returns the number of tickets marked.
+    """
+    now = now or timezone.now()
+    marked = 0
+
+    while True:
+        with transaction.atomic():
+            breached = _mark_breach_batch(now, batch_size, ticket_ids)
+            Notification.objects.bulk_create([
+                Notification(
+                    customer_id=customer_id,
+                    notification_type=Notification.SLA_BREACHED,
+                    message=f"SLA breached for ticket #{ticket_id}: {subject}"
+                )
+                for ticket_id, customer_id, subject in breached
+            ])
+        marked += len(breached)
+        if len(breached) < batch_size:
+            break
+
+    if marked:
+        # Raw UPDATE sends no post_save signals
+        invalidate_dashboard_sections('tickets')
+    return marked
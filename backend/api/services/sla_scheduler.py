@@ -0,0 +1,152 @@
+import heapq
+import select
+import time
+from django.db import connection
+from django.utils import timezone
+from ..models import SupportTicket
+from .sla import OPEN_TICKET_STATUSES, mark_sla_breaches
+
+# PostgreSQL NOTIFY channel carrying the ids of saved tickets
+TICKET_CHANNEL = 'sla_ticket_changed'
+
+def notify_ticket_changed(ticket_id):
+    """
+    Tells a running SLA scheduler to reload one ticket. The notification is
+    delivered when the surrounding transaction commits, and dropped on rollback.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_notify(%s, %s)', [TICKET_CHANNEL, str(ticket_id)])
+
+def _pending_tickets():
+    # Served by the partial ticket_sla_pending_idx index
+    return SupportTicket.objects.filter(
+        is_sla_breached=False,
+        sla_deadline__isnull=False,
+        status__context__context='SupportTicket',
+        status__status__in=OPEN_TICKET_STATUSES
+    )
+
+
+class SLAScheduler:
+    """
+    Keeps the deadlines of open, not yet breached tickets in a min-heap and
+    marks tickets as breached as soon as their deadline passes.
+
+    Replaced deadlines are not removed from the heap; an entry is only acted
+    on while it still matches the ticket's current deadline in `deadlines`.
+    """
+
+    def __init__(self, batch_size=500, resync_interval=300, clock=timezone.now):
+        self.batch_size = batch_size
+        self.resync_interval = resync_interval
+        self.clock = clock
+        self.heap = []
+        self.deadlines = {}
+        self.last_resync = None
+
+    def __len__(self):
+        return len(self.deadlines)
+
+    def schedule(self, ticket_id, deadline):
+        if self.deadlines.get(ticket_id) == deadline:
+            return
+        self.deadlines[ticket_id] = deadline
+        heapq.heappush(self.heap, (deadline, ticket_id))
+
+    def cancel(self, ticket_id):
+        self.deadlines.pop(ticket_id, None)
+
+    def resync(self):
+        """
+        Reloads every pending deadline from the database, catching changes
+        that did not come through a notification (raw updates, missed events).
+        """
+        self.deadlines = dict(_pending_tickets().values_list('id', 'sla_deadline'))
+        self.heap = [(deadline, ticket_id) for ticket_id, deadline in self.deadlines.items()]
+        heapq.heapify(self.heap)
+        self.last_resync = time.monotonic()
+        return len(self.deadlines)
+
+    def refresh(self, ticket_ids):
+        """
+        Reloads the given tickets: pending ones are (re)scheduled, the rest dropped.
+        """
+        ticket_ids = set(ticket_ids)
+        pending = dict(_pending_tickets().filter(id__in=ticket_ids).values_list('id', 'sla_deadline'))
+        for ticket_id in ticket_ids:
+            if ticket_id in pending:
+                self.schedule(ticket_id, pending[ticket_id])
+            else:
+                self.cancel(ticket_id)
+
+    def pop_due(self, now):
+        """
+        Removes and returns the ids of tickets whose deadline is before now.
+        """
+        due = []
+        while self.heap and self.heap[0][0] < now:
+            deadline, ticket_id = heapq.heappop(self.heap)
+            if self.deadlines.get(ticket_id) == deadline:
+                del self.deadlines[ticket_id]
+                due.append(ticket_id)
+        return due
+
+    def seconds_until_next(self, now):
+        """
+        Seconds to sleep before the earliest deadline, or None when nothing is scheduled.
+        """
+        while self.heap and self.deadlines.get(self.heap[0][1]) != self.heap[0][0]:
+            heapq.heappop(self.heap)
+        if not self.heap:
+            return None
+        return max((self.heap[0][0] - now).total_seconds(), 0)
+
+    def fire_due(self):
+        """
+        Marks every ticket whose deadline has passed. Returns the number marked.
+        """
+        now = self.clock()
+        due = self.pop_due(now)
+        if not due:
+            return 0
+        return mark_sla_breaches(now=now, batch_size=self.batch_size, ticket_ids=due)
+
+    @staticmethod
+    def wait_for_changes(pg_connection, timeout):
+        """
+        Ids of tickets changed according to notifications on the LISTEN
+        connection, waiting up to timeout seconds when none are pending.
+        """
+        # Notifications received while the connection ran queries were already
+        # read off the socket into notifies, so select would not see them
+        pg_connection.poll()
+        if not pg_connection.notifies:
+            if select.select([pg_connection], [], [], max(timeout, 0)) == ([], [], []):
+                return set()
+            pg_connection.poll()
+        changed = set()
+        while pg_connection.notifies:
+            changed.add(int(pg_connection.notifies.pop(0).payload))
+        return changed
+
+    def run(self, max_sleep=60, stop=lambda: False):
+        """
+        Scheduler loop: sleeps until the next deadline, a ticket notification
+        or the next resync, whichever comes first.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(f'LISTEN {TICKET_CHANNEL}')
+        self.resync()
+
+        while not stop():
+            if time.monotonic() - self.last_resync >= self.resync_interval:
+                self.resync()
+            self.fire_due()
+
+            timeout = self.seconds_until_next(self.clock())
+            until_resync = self.resync_interval - (time.monotonic() - self.last_resync)
+            timeout = min(t for t in (timeout, until_resync, max_sleep) if t is not None)
+
+            changed = self.wait_for_changes(connection.connection, timeout)
+            if changed:
+                self.refresh(changed)
@@ -0,0 +1,311 @@
+import atexit
+import codecs
+import csv
+import gzip
+import io
+import json
+import logging
+import threading
+import zlib
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from django.conf import settings
+from django.db import connection, transaction, close_old_connections
+from ..models import NetworkUsage, Contract, DailyTariffUsage, DailyCustomerUsage, MonthlyUsage
+
+logger = logging.getLogger(__name__)
+
+# NetworkUsage stores GB with two decimals; smaller remainders stay buffered
+BYTES_PER_GB = 10 ** 9
+BYTES_PER_UNIT = BYTES_PER_GB // 100
+
+# Key of the transaction-level advisory lock that serializes flushes between processes
+FLUSH_LOCK_KEY = 4202
+
+SAMPLE_COLUMNS = ('contract_id', 'timestamp', 'download_bytes', 'upload_bytes')
+
+
+def _sample_date(timestamp):
+    if isinstance(timestamp, (int, float)):
+        return date.fromtimestamp(timestamp)
+    timestamp = str(timestamp)
+    if timestamp.replace('.', '', 1).isdigit():
+        return date.fromtimestamp(float(timestamp))
+    return datetime.fromisoformat(timestamp).date()
+
+def aggregate_samples(samples):
+    """
+    Sums (contract_id, timestamp, download_bytes, upload_bytes) samples per
+    (contract_id, date). Malformed samples are counted, not raised.
+    Returns ({(contract_id, date): [download_bytes, upload_bytes]}, accepted, errors).
+    """
+    totals = {}
+    accepted = 0
+    errors = []
+    for line, sample in samples:
+        if sample is None:
+            errors.append(f'Line {line}: malformed record')
+            continue
+        try:
+            contract_id, timestamp, download_bytes, upload_bytes = sample
+            key = (int(contract_id), _sample_date(timestamp))
+            download_bytes, upload_bytes = int(download_bytes or 0), int(upload_bytes or 0)
+            if download_bytes < 0 or upload_bytes < 0:
+                raise ValueError('negative counter')
+        except (TypeError, ValueError, OverflowError, OSError) as e:
+            errors.append(f'Line {line}: {e}')
+            continue
+        entry = totals.get(key)
+        if entry is None:
+            totals[key] = [download_bytes, upload_bytes]
+        else:
+            entry[0] += download_bytes
+            entry[1] += upload_bytes
+        accepted += 1
+    return totals, accepted, errors
+
+def _text_lines(stream, encoding):
+    if encoding == 'gzip':
+        stream = gzip.GzipFile(fileobj=stream)
+    elif encoding == 'deflate':
+        stream = io.BytesIO(zlib.decompress(stream.read()))
+    return codecs.getreader('utf-8')(stream)
+
+def read_samples(stream, content_type, encoding=''):
+    """
+    Yields (line number, sample) from a JSON-lines or CSV body, optionally
+    gzip- or deflate-compressed (Content-Encoding).
+    """
+    lines = _text_lines(stream, encoding)
+    if 'csv' in content_type:
+        reader = csv.reader(lines)
+        header = next(reader, None) or []
+        try:
+            positions = [header.index(column) for column in SAMPLE_COLUMNS]
+        except ValueError:
+            raise ValueError(f"CSV header must contain {', '.join(SAMPLE_COLUMNS)}")
+        for line, row in enumerate(reader, start=2):
+            try:
+                yield line, [row[position] for position in positions]
+            except IndexError:
+                yield line, None
+        return
+
+    for line, text in enumerate(lines, start=1):
+        if not text.strip():
+            continue
+        try:
+            record = json.loads(text)
+            yield line, [record.get(column) for column in SAMPLE_COLUMNS]
+        except (ValueError, AttributeError):
+            yield line, None
+
+
+class UsageCollector:
+    """
+    In-memory buffer of usage counters, pre-aggregated by (contract, date).
+
+    Batches are merged into the buffer under a lock; a background thread
+    flushes it every USAGE_COLLECTOR_FLUSH_INTERVAL seconds (or as soon as
+    it holds USAGE_COLLECTOR_MAX_KEYS keys) by adding the buffered usage to
+    NetworkUsage and the rollups with a few set-based statements.
+    Usage below 0.01 GB stays buffered until it adds up to a whole unit.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buffer = {}
+        self._wake = threading.Event()
+        self._thread = None
+
+    def add(self, totals):
+        """
+        Merges {(contract_id, date): [download_bytes, upload_bytes]} into the buffer.
+        """
+        with self._lock:
+            for key, (download_bytes, upload_bytes) in totals.items():
+                entry = self._buffer.get(key)
+                if entry is None:
+                    self._buffer[key] = [download_bytes, upload_bytes]
+                else:
+                    entry[0] += download_bytes
+                    entry[1] += upload_bytes
+            pending = len(self._buffer)
+
+        self._ensure_thread()
+        if pending >= settings.USAGE_COLLECTOR_MAX_KEYS:
+            self._wake.set()
+
+    @property
+    def pending(self):
+        return len(self._buffer)
+
+    def _take(self, final=False):
+        """
+        Removes the whole 0.01 GB units from the buffer and returns them as
+        {(contract_id, date): (download_units, upload_units)}. Remainders of
+        days before yesterday are dropped; final takes everything, rounded up.
+        """
+        oldest = date.today() - timedelta(days=1)
+        units = {}
+        with self._lock:
+            for key, entry in list(self._buffer.items()):
+                if final:
+                    download_units = -(-entry[0] // BYTES_PER_UNIT)
+                    upload_units = -(-entry[1] // BYTES_PER_UNIT)
+                    entry[0] = entry[1] = 0
+                else:
+                    download_units, entry[0] = divmod(entry[0], BYTES_PER_UNIT)
+                    upload_units, entry[1] = divmod(entry[1], BYTES_PER_UNIT)
+                if download_units or upload_units:
+                    units[key] = (download_units, upload_units)
+                if final or key[1] < oldest or not (entry[0] or entry[1]):
+                    del self._buffer[key]
+        return units
+
+    def _restore(self, units):
+        with self._lock:
+            for key, (download_units, upload_units) in units.items():
+                entry = self._buffer.setdefault(key, [0, 0])
+                entry[0] += download_units * BYTES_PER_UNIT
+                entry[1] += upload_units * BYTES_PER_UNIT
+
+    def flush(self, final=False):
+        """
+        Writes the buffered usage. Returns the number of (contract, date) rows written.
+        """
+        units = self._take(final)
+        if not units:
+            return 0
+        try:
+            return write_usage_deltas(units)
+        except Exception:
+            # Keep the usage for the next flush
+            self._restore(units)
+            raise
+
+    def _ensure_thread(self):
+        if self._thread is not None or settings.USAGE_COLLECTOR_FLUSH_INTERVAL <= 0:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='usage-collector', daemon=True)
+                self._thread.start()
+                atexit.register(self._flush_on_exit)
+
+    def _run(self):
+        while True:
+            self._wake.wait(settings.USAGE_COLLECTOR_FLUSH_INTERVAL)
+            self._wake.clear()
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Usage collector flush failed')
+
+    def _flush_on_exit(self):
+        try:
+            self.flush(final=True)
+        except Exception:
+            logger.exception('Usage collector final flush failed')
+
+
+collector = UsageCollector()
+
+
+def write_usage_deltas(units):
+    """
+    Adds {(contract_id, date): (download_units, upload_units)} of 0.01 GB to
+    NetworkUsage and to the daily and monthly rollups. Usage of unknown
+    contracts is dropped. Returns the number of NetworkUsage rows written.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for (contract_id, usage_date), (download_units, upload_units) in units.items():
+        writer.writerow((contract_id, usage_date, Decimal(download_units) / 100, Decimal(upload_units) / 100))
+    buffer.seek(0)
+
+    usage_table = NetworkUsage._meta.db_table
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute('SELECT pg_advisory_xact_lock(%s)', [FLUSH_LOCK_KEY])
+        cursor.execute(
+            """
+            CREATE TEMPORARY TABLE IF NOT EXISTS usage_deltas (
+                contract_id bigint NOT NULL,
+                date date NOT NULL,
+                download_gb numeric(10, 2) NOT NULL,
+                upload_gb numeric(10, 2) NOT NULL
+            ) ON COMMIT DROP
+            """
+        )
+        cursor.execute('TRUNCATE usage_deltas')
+        cursor.copy_expert('COPY usage_deltas FROM STDIN WITH (FORMAT csv)', buffer)
+        cursor.execute('DROP TABLE IF EXISTS contract_deltas, tariff_deltas')
+        cursor.execute(
+            f"""
+            CREATE TEMPORARY TABLE contract_deltas ON COMMIT DROP AS
+            SELECT d.contract_id, d.date, d.download_gb, d.upload_gb, c.customer_id, c.tariff_id
+            FROM usage_deltas d JOIN {Contract._meta.db_table} c ON c.id = d.contract_id
+            """
+        )
+        cursor.execute(
+            f"""
+            INSERT INTO {usage_table} (contract_id, date, download_gb, upload_gb)
+            SELECT contract_id, date, download_gb, upload_gb FROM contract_deltas
+            ON CONFLICT (contract_id, date) DO UPDATE
+            SET download_gb = {usage_table}.download_gb + EXCLUDED.download_gb,
+                upload_gb = {usage_table}.upload_gb + EXCLUDED.upload_gb
+            """
+        )
+        written = cursor.rowcount
+
+        customer_table = DailyCustomerUsage._meta.db_table
+        cursor.execute(
+            f"""
+            INSERT INTO {customer_table} (date, customer_id, download_gb, upload_gb)
+            SELECT date, customer_id, SUM(download_gb), SUM(upload_gb)
+            FROM contract_deltas GROUP BY date, customer_id
+            ON CONFLICT (date, customer_id) DO UPDATE
+            SET download_gb = {customer_table}.download_gb + EXCLUDED.download_gb,
+                upload_gb = {customer_table}.upload_gb + EXCLUDED.upload_gb
+            """
+        )
+        monthly_table = MonthlyUsage._meta.db_table
+        cursor.execute(
+            f"""
+            INSERT INTO {monthly_table} (month, download_gb, upload_gb)
+            SELECT date_trunc('month', date)::date, SUM(download_gb), SUM(upload_gb)
+            FROM contract_deltas GROUP BY 1
+            ON CONFLICT (month) DO UPDATE
+            SET download_gb = {monthly_table}.download_gb + EXCLUDED.download_gb,
+                upload_gb = {monthly_table}.upload_gb + EXCLUDED.upload_gb
+            """
+        )
+        # tariff_id is nullable, so ON CONFLICT cannot match the no-tariff rows; the lock makes update-then-insert safe
+        tariff_table = DailyTariffUsage._meta.db_table
+        cursor.execute(
+            """
+            CREATE TEMPORARY TABLE tariff_deltas ON COMMIT DROP AS
+            SELECT date, tariff_id, SUM(download_gb) AS download_gb, SUM(upload_gb) AS upload_gb
+            FROM contract_deltas GROUP BY date, tariff_id
+            """
+        )
+        cursor.execute(
+            f"""
+            UPDATE {tariff_table} t
+            SET download_gb = t.download_gb + d.download_gb, upload_gb = t.upload_gb + d.upload_gb
+            FROM tariff_deltas d
+            WHERE t.date = d.date AND t.tariff_id IS NOT DISTINCT FROM d.tariff_id
+            """
+        )
+        cursor.execute(
+            f"""
+            INSERT INTO {tariff_table} (date, tariff_id, download_gb, upload_gb)
+            SELECT d.date, d.tariff_id, d.download_gb, d.upload_gb FROM tariff_deltas d
+            WHERE NOT EXISTS (
+                SELECT 1 FROM {tariff_table} t
+                WHERE t.date = d.date AND t.tariff_id IS NOT DISTINCT FROM d.tariff_id
+            )
+            """
+        )
+    return written
@@ -0,0 +1,164 @@
+import csv
+import io
+import itertools
+import json
+import random
+import time
+from datetime import date, timedelta
+from decimal import Decimal, InvalidOperation
+from django.db import connection, transaction
+from django.utils.timezone import now
+from ..models import NetworkUsage, Contract
+from .usage_rollups import rebuild_usage_rollups
+
+# Rows sent per COPY statement (bounds the memory used by the CSV buffer)
+COPY_CHUNK_SIZE = 50000
+
+USAGE_COLUMNS = ('contract_id', 'date', 'download_gb', 'upload_gb')
+
+def generate_usage_rows(usage_date, min_gb=0.0, max_gb=10.0):
+    """
+    Random usage of every active contract for one day.
+    """
+    contract_ids = Contract.objects.filter(end_date__gt=now()).values_list('id', flat=True).iterator()
+    for contract_id in contract_ids:
+        yield (
+            contract_id,
+            usage_date,
+            Decimal(str(round(random.uniform(min_gb, max_gb), 2))),
+            Decimal(str(round(random.uniform(min_gb, max_gb), 2))),
+        )
+
+def _parse_usage(values, line):
+    try:
+        contract_id, usage_date, download_gb, upload_gb = values
+        return (
+            int(contract_id),
+            date.fromisoformat(str(usage_date)),
+            Decimal(str(download_gb or 0)),
+            Decimal(str(upload_gb or 0)),
+        )
+    except (TypeError, ValueError, InvalidOperation) as e:
+        raise ValueError(f'Line {line}: invalid usage record ({e})')
+
+def read_usage_csv(file):
+    """
+    Usage rows of a CSV file with a contract_id,date,download_gb,upload_gb header.
+    """
+    for line, row in enumerate(csv.DictReader(file), start=2):
+        yield _parse_usage([row.get(column) for column in USAGE_COLUMNS], line)
+
+def read_usage_jsonl(file):
+    """
+    Usage rows of a JSON-lines file of {"contract_id", "date", "download_gb", "upload_gb"} objects.
+    """
+    for line, text in enumerate(file, start=1):
+        if not text.strip():
+            continue
+        try:
+            record = json.loads(text)
+        except ValueError as e:
+            raise ValueError(f'Line {line}: invalid JSON ({e})')
+        yield _parse_usage([record.get(column) for column in USAGE_COLUMNS], line)
+
+def _copy_to_staging(cursor, rows):
+    """
+    Streams rows into the staging table with COPY, COPY_CHUNK_SIZE rows at a time.
+    Returns the number of rows copied.
+    """
+    total = 0
+    rows = iter(rows)
+    while True:
+        chunk = list(itertools.islice(rows, COPY_CHUNK_SIZE))
+        if not chunk:
+            return total
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        # seq keeps file order, so the last record of a (contract, date) pair wins
+        writer.writerows((total + i, *row) for i, row in enumerate(chunk))
+        buffer.seek(0)
+        cursor.copy_expert(
+            'COPY usage_staging (seq, contract_id, date, download_gb, upload_gb) FROM STDIN WITH (FORMAT csv)',
+            buffer
+        )
+        total += len(chunk)
+
+def _date_ranges(dates):
+    """
+    Collapses dates into (first, last) runs of consecutive days.
+    """
+    ranges = []
+    for day in sorted(dates):
+        if ranges and day == ranges[-1][1] + timedelta(days=1):
+            ranges[-1][1] = day
+        else:
+            ranges.append([day, day])
+    return [tuple(run) for run in ranges]
+
+def ingest_usage(rows):
+    """
+    Loads (contract_id, date, download_gb, upload_gb) rows into NetworkUsage:
+    the rows are copied into a temporary staging table and merged with one
+    INSERT ... ON CONFLICT (contract_id, date) DO UPDATE, after which the
+    rollups of the touched days are rebuilt. Runs in a single transaction.
+
+    Rows of unknown contracts are skipped. Returns a dict with the number of
+    rows received, inserted, updated and skipped, the elapsed seconds and
+    the throughput in rows per second.
+    """
+    usage_table = NetworkUsage._meta.db_table
+    started = time.monotonic()
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            """
+            CREATE TEMPORARY TABLE IF NOT EXISTS usage_staging (
+                seq bigint NOT NULL,
+                contract_id bigint NOT NULL,
+                date date NOT NULL,
+                download_gb numeric(10, 2) NOT NULL,
+                upload_gb numeric(10, 2) NOT NULL
+            ) ON COMMIT DROP
+            """
+        )
+        cursor.execute('TRUNCATE usage_staging')
+        received = _copy_to_staging(cursor, rows)
+
+        cursor.execute(
+            f"""
+            WITH latest AS (
+                SELECT DISTINCT ON (contract_id, date) l.contract_id, l.date, l.download_gb, l.upload_gb
+                FROM usage_staging l JOIN {Contract._meta.db_table} c ON c.id = l.contract_id
+                ORDER BY l.contract_id, l.date, l.seq DESC
+            ), existing AS (
+                -- Sees the table as it was before the merge below
+                SELECT COUNT(*) AS count
+                FROM latest l JOIN {usage_table} u ON u.contract_id = l.contract_id AND u.date = l.date
+            ), merged AS (
+                INSERT INTO {usage_table} (contract_id, date, download_gb, upload_gb)
+                SELECT contract_id, date, download_gb, upload_gb FROM latest
+                ON CONFLICT (contract_id, date) DO UPDATE
+                SET download_gb = EXCLUDED.download_gb, upload_gb = EXCLUDED.upload_gb
+                RETURNING date
+            )
+            SELECT (SELECT COUNT(*) FROM merged), (SELECT count FROM existing), (SELECT ARRAY_AGG(DISTINCT date) FROM merged)
+            """
+        )
+        merged, updated, dates = cursor.fetchone()
+        inserted = merged - updated
+        cursor.execute('SELECT COUNT(*) FROM (SELECT DISTINCT contract_id, date FROM usage_staging) pairs')
+        distinct_rows = cursor.fetchone()[0]
+
+        # The merge bypasses the NetworkUsage signals, so the rollups are rebuilt instead
+        for first, last in _date_ranges(dates or []):
+            rebuild_usage_rollups(first, last)
+
+    elapsed = time.monotonic() - started
+    return {
+        'rows': received,
+        'inserted': inserted,
+        'updated': updated,
+        'skipped': distinct_rows - inserted - updated,
+        'seconds': elapsed,
+        'rows_per_second': received / elapsed if elapsed else 0.0,
+    }
@@ -0,0 +1,92 @@
+from datetime import timedelta
+from django.db import connection, transaction, IntegrityError
+from django.db.models import F, Sum
+from django.db.models.functions import TruncMonth
+from ..models import NetworkUsage, Contract, DailyTariffUsage, DailyCustomerUsage, MonthlyUsage
+
+def _add_usage(model, lookup, download_gb, upload_gb, create=True):
+    """
+    Adds a usage delta to one rollup row, creating the row if it does not exist yet
+    (unless create is False).
+    """
+    delta = {
+        'download_gb': F('download_gb') + download_gb,
+        'upload_gb': F('upload_gb') + upload_gb,
+    }
+    if model.objects.filter(**lookup).update(**delta):
+        return
+    if not create:
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, download_gb=download_gb, upload_gb=upload_gb)
+    except IntegrityError:
+        # Created concurrently by another writer
+        model.objects.filter(**lookup).update(**delta)
+
+def apply_usage_delta(tariff_id, customer_id, date, download_gb, upload_gb, create=True):
+    """
+    Adds a change of one contract's daily usage to the daily x tariff,
+    daily x customer and monthly rollups.
+    """
+    if not download_gb and not upload_gb:
+        return
+    with transaction.atomic():
+        _add_usage(DailyTariffUsage, {'date': date, 'tariff_id': tariff_id}, download_gb, upload_gb, create)
+        _add_usage(DailyCustomerUsage, {'date': date, 'customer_id': customer_id}, download_gb, upload_gb, create)
+        _add_usage(MonthlyUsage, {'month': date.replace(day=1)}, download_gb, upload_gb, create)
+
+def _month_end(date):
+    return (date.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+
+def rebuild_usage_rollups(start_date, end_date):
+    """
+    Recomputes the daily rollups for [start_date, end_date] from raw NetworkUsage
+    with set-based INSERT ... SELECT, then the monthly rollup for every month
+    the range touches. Returns the number of daily x customer rows written.
+    """
+    usage_table = NetworkUsage._meta.db_table
+    contract_table = Contract._meta.db_table
+    first_month = start_date.replace(day=1)
+    last_month = end_date.replace(day=1)
+
+    with transaction.atomic():
+        DailyTariffUsage.objects.filter(date__range=[start_date, end_date]).delete()
+        DailyCustomerUsage.objects.filter(date__range=[start_date, end_date]).delete()
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {DailyTariffUsage._meta.db_table} (date, tariff_id, download_gb, upload_gb)
+                SELECT u.date, c.tariff_id, SUM(u.download_gb), SUM(u.upload_gb)
+                FROM {usage_table} u JOIN {contract_table} c ON c.id = u.contract_id
+                WHERE u.date BETWEEN %s AND %s
+                GROUP BY u.date, c.tariff_id
+                """,
+                [start_date, end_date]
+            )
+            cursor.execute(
+                f"""
+                INSERT INTO {DailyCustomerUsage._meta.db_table} (date, customer_id, download_gb, upload_gb)
+                SELECT u.date, c.customer_id, SUM(u.download_gb), SUM(u.upload_gb)
+                FROM {usage_table} u JOIN {contract_table} c ON c.id = u.contract_id
+                WHERE u.date BETWEEN %s AND %s
+                GROUP BY u.date, c.customer_id
+                """,
+                [start_date, end_date]
+            )
+            customer_rows = cursor.rowcount
+
+        # Monthly totals are re-derived from the (now current) daily x tariff rollup
+        MonthlyUsage.objects.filter(month__range=[first_month, last_month]).delete()
+        MonthlyUsage.objects.bulk_create(
+            MonthlyUsage(month=row['month'], download_gb=row['download'], upload_gb=row['upload'])
+            for row in DailyTariffUsage.objects.filter(
+                date__range=[first_month, _month_end(last_month)]
+            ).annotate(month=TruncMonth('date')).values('month').annotate(
+                download=Sum('download_gb'),
+                upload=Sum('upload_gb')
+            )
+        )
+
+    return customer_rows
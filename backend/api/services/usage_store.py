@@ -0,0 +1,270 @@
+import fcntl
+import itertools
+import json
+import os
+import shutil
+import time
+from datetime import date, timedelta
+import numpy as np
+from django.conf import settings
+from django.db.models import Avg, BigIntegerField, Count, F, FloatField
+from django.db.models.functions import Cast
+from django.utils import timezone
+from ..models import NetworkUsage
+
+# NetworkUsage rows read per chunk while loading the store
+LOAD_CHUNK_SIZE = 100000
+
+# Contracts reduced at a time, which bounds the temporary arrays of a reduction
+REDUCE_BLOCK_ROWS = 65536
+
+# File naming the build the readers open
+CURRENT_FILE = 'CURRENT'
+
+# File locked while a build switches CURRENT and removes old builds
+LOCK_FILE = 'build.lock'
+
+# Cents stored for the days without a usage record
+MISSING = np.iinfo(np.int32).min
+
+# Largest daily value the int32 cents hold, in cents (21,474,836.47 GB)
+MAX_CENTS = np.iinfo(np.int32).max
+
+# Age after which an unfinished build is assumed to belong to a dead process
+STALE_BUILD_SECONDS = 24 * 60 * 60
+
+
+def _positions(sorted_ids, ids):
+    """
+    Positions of ids in the sorted id array; -1 for ids it does not hold.
+    """
+    ids = np.asarray(ids, dtype=np.int64)
+    if not len(sorted_ids):
+        return np.full(len(ids), -1, dtype=np.int64)
+    positions = np.minimum(np.searchsorted(sorted_ids, ids), len(sorted_ids) - 1)
+    return np.where(sorted_ids[positions] == ids, positions, -1)
+
+
+class UsageStore:
+    """
+    Daily usage history as int32 contract x day matrices of download and
+    upload cents of a GB, memory-mapped read-only from USAGE_STORE_DIR.
+    Integer cents hold the numeric(10, 2) values of NetworkUsage exactly;
+    they are converted to GB only when reduced.
+
+    Rows follow the sorted ids of the contracts with usage in the period
+    and columns the days from start. Days without a usage record hold
+    MISSING, so averages cover the days that have one, like Avg() over
+    NetworkUsage does. Slicing a period or a single contract returns views
+    of the mapped files, not copies.
+    The store is a snapshot: it is rebuilt by build_usage_store.
+    """
+
+    def __init__(self, path):
+        with open(os.path.join(path, 'meta.json')) as meta_file:
+            meta = json.load(meta_file)
+        self.path = path
+        self.start = date.fromisoformat(meta['start'])
+        self.built_at = meta['built_at']
+        self.contract_ids = np.load(os.path.join(path, 'contracts.npy'), mmap_mode='r')
+        self.download = np.load(os.path.join(path, 'download.npy'), mmap_mode='r')
+        self.upload = np.load(os.path.join(path, 'upload.npy'), mmap_mode='r')
+
+    @classmethod
+    def open(cls, directory=None):
+        """
+        The current build, or None if the store was never built.
+        """
+        directory = directory or settings.USAGE_STORE_DIR
+        try:
+            with open(os.path.join(directory, CURRENT_FILE)) as current:
+                return cls(os.path.join(directory, current.read().strip()))
+        except FileNotFoundError:
+            return None
+
+    @property
+    def end(self):
+        return self.start + timedelta(days=self.download.shape[1] - 1)
+
+    def covers(self, start, end):
+        return self.start <= start and end <= self.end
+
+    def _columns(self, start, end):
+        first = max((start - self.start).days, 0) if start else 0
+        last = (end - self.start).days + 1 if end else self.download.shape[1]
+        return slice(first, max(last, first))
+
+    def rows(self, contract_ids):
+        """
+        Row positions of contracts; -1 for contracts the store does not hold.
+        """
+        return _positions(self.contract_ids, contract_ids)
+
+    def window(self, start=None, end=None):
+        """
+        (download, upload) cents views of every contract between start and end.
+        """
+        columns = self._columns(start, end)
+        return self.download[:, columns], self.upload[:, columns]
+
+    def series(self, contract_id, start=None, end=None):
+        """
+        (download, upload) cents views of the daily usage of one contract, or
+        None if it has no usage in the period of the store.
+        """
+        row = self.rows([contract_id])[0]
+        if row < 0:
+            return None
+        columns = self._columns(start, end)
+        return self.download[row, columns], self.upload[row, columns]
+
+    def daily_averages(self, start, end, contract_ids=None):
+        """
+        (contract ids, days with usage, average daily download + upload GB)
+        arrays of the contracts with usage between start and end, optionally
+        limited to contract_ids.
+        """
+        download, upload = self.window(start, end)
+        ids = self.contract_ids
+        if contract_ids is not None:
+            rows = self.rows(contract_ids)
+            rows = np.unique(rows[rows >= 0])
+            ids, download, upload = ids[rows], download[rows], upload[rows]
+
+        days = np.empty(len(ids), dtype=np.int64)
+        totals = np.empty(len(ids), dtype=np.int64)
+        for first in range(0, len(ids), REDUCE_BLOCK_ROWS):
+            block = slice(first, first + REDUCE_BLOCK_ROWS)
+            recorded = download[block] != MISSING
+            days[block] = np.count_nonzero(recorded, axis=1)
+            totals[block] = np.where(recorded, download[block].astype(np.int64) + upload[block], 0).sum(axis=1)
+
+        used = days > 0
+        return np.array(ids[used]), days[used], totals[used] / (days[used] * 100)
+
+
+def _switch_current(directory, name):
+    """
+    Points readers at the build, unless a newer one finished first.
+    """
+    current_path = os.path.join(directory, CURRENT_FILE)
+    try:
+        with open(current_path) as current:
+            if current.read().strip() > name:
+                return
+    except FileNotFoundError:
+        pass
+    current_tmp = os.path.join(directory, f'{CURRENT_FILE}.{name}.tmp')
+    with open(current_tmp, 'w') as current:
+        current.write(name)
+    os.replace(current_tmp, current_path)
+
+def _remove_old_builds(directory, name):
+    """
+    Removes the finished builds older than the given one, and unfinished
+    ones abandoned for STALE_BUILD_SECONDS. Builds still being written by
+    another process are left alone. Readers that opened a removed build
+    keep their mappings.
+    """
+    with open(os.path.join(directory, CURRENT_FILE)) as current:
+        current_name = current.read().strip()
+    for entry in os.listdir(directory):
+        path = os.path.join(directory, entry)
+        if entry in (name, current_name) or not os.path.isdir(path):
+            continue
+        if os.path.exists(os.path.join(path, 'meta.json')):
+            if entry < name:
+                shutil.rmtree(path, ignore_errors=True)
+        elif time.time() - os.path.getmtime(path) > STALE_BUILD_SECONDS:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def build_usage_store(days=None, end=None, directory=None):
+    """
+    Loads the last days days of NetworkUsage up to end (default: today) of
+    the contracts with usage in that period into a new build of the store,
+    switches readers to it and removes older finished builds. Concurrent
+    builds do not disturb each other. Raises ValueError for a daily value
+    the int32 cents cannot hold.
+    Returns the current UsageStore, which is a newer build when one finished first.
+    """
+    directory = directory or settings.USAGE_STORE_DIR
+    days = days or settings.USAGE_STORE_DAYS
+    end = end or date.today()
+    start = end - timedelta(days=days - 1)
+
+    usage = NetworkUsage.objects.filter(date__range=(start, end))
+    contract_ids = np.fromiter(
+        usage.order_by('contract_id').values_list('contract_id', flat=True).distinct().iterator(), dtype=np.int64
+    )
+    name = timezone.now().strftime('%Y%m%d%H%M%S%f')
+    path = os.path.join(directory, name)
+    os.makedirs(path)
+    np.save(os.path.join(path, 'contracts.npy'), contract_ids)
+    shape = (len(contract_ids), days)
+    download = np.lib.format.open_memmap(os.path.join(path, 'download.npy'), mode='w+', dtype=np.int32, shape=shape)
+    upload = np.lib.format.open_memmap(os.path.join(path, 'upload.npy'), mode='w+', dtype=np.int32, shape=shape)
+    download[:] = MISSING
+    upload[:] = MISSING
+
+    usage = usage.values_list(
+        'contract_id', 'date',
+        Cast(F('download_gb') * 100, BigIntegerField()), Cast(F('upload_gb') * 100, BigIntegerField())
+    ).iterator(chunk_size=LOAD_CHUNK_SIZE)
+    origin = np.datetime64(start, 'D')
+    while True:
+        chunk = list(itertools.islice(usage, LOAD_CHUNK_SIZE))
+        if not chunk:
+            break
+        chunk_ids, chunk_dates, chunk_download, chunk_upload = zip(*chunk)
+        chunk_download = np.array(chunk_download, dtype=np.int64)
+        chunk_upload = np.array(chunk_upload, dtype=np.int64)
+        if max(chunk_download.max(), chunk_upload.max()) > MAX_CENTS:
+            shutil.rmtree(path, ignore_errors=True)
+            raise ValueError(f'Daily usage above {MAX_CENTS / 100} GB does not fit the usage store')
+        # Contracts whose first usage was recorded after the id list was read have no row
+        rows = _positions(contract_ids, chunk_ids)
+        columns = (np.array(chunk_dates, dtype='datetime64[D]') - origin).astype(np.int64)
+        known = rows >= 0
+        download[rows[known], columns[known]] = chunk_download[known]
+        upload[rows[known], columns[known]] = chunk_upload[known]
+
+    download.flush()
+    upload.flush()
+    del download, upload
+    # meta.json marks the build as finished, so it appears in one step
+    with open(os.path.join(path, 'meta.json.tmp'), 'w') as meta_file:
+        json.dump({'start': start.isoformat(), 'built_at': timezone.now().isoformat()}, meta_file)
+    os.replace(os.path.join(path, 'meta.json.tmp'), os.path.join(path, 'meta.json'))
+
+    # Builds run concurrently; only the switch and the cleanup are serialized
+    with open(os.path.join(directory, LOCK_FILE), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        _switch_current(directory, name)
+        _remove_old_builds(directory, name)
+        return UsageStore.open(directory)
+
+
+def daily_usage_averages(start, end, contract_ids=None):
+    """
+    (contract ids, days with usage, average daily download + upload GB)
+    arrays of the contracts with usage between start and end. Read from the
+    store when it covers the period, otherwise aggregated from NetworkUsage.
+    """
+    store = UsageStore.open()
+    if store is not None and store.covers(start, end):
+        return store.daily_averages(start, end, contract_ids)
+
+    usage = NetworkUsage.objects.filter(date__range=(start, end))
+    if contract_ids is not None:
+        usage = usage.filter(contract_id__in=list(contract_ids))
+    rows = list(
+        usage.values('contract_id').annotate(
+            days=Count('id'),
+            avg_total_gb=Cast(Avg(F('download_gb') + F('upload_gb')), FloatField())
+        ).values_list('contract_id', 'days', 'avg_total_gb').order_by('contract_id')
+    )
+    if not rows:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+    ids, days, averages = zip(*rows)
+    return np.array(ids, dtype=np.int64), np.array(days, dtype=np.int64), np.array(averages, dtype=np.float64)
@@ -1,7 +1,23 @@
-from django.db.models.signals import post_save
+from decimal import Decimal
+from django.contrib.auth.models import Group
+from django.db.models.signals import post_save, pre_save, post_delete, pre_delete, post_migrate, m2m_changed
+from django.apps import apps
 from django.dispatch import receiver
-from .models import SupportTicket
+from .models import SupportTicket, Contract, NetworkUsage, Payment, Invoice, User, Customer, Employee, EmployeeRole
 from .services.assignment import auto_assign_technician
+from .services.usage_rollups import apply_usage_delta
+from .services.dashboard import invalidate_dashboard_sections
+from .services.sla_scheduler import notify_ticket_changed
+from .utils.reference_cache import REFERENCE_MODELS, invalidate_reference_cache
+from .services.partitioning import partition_tables
+from .utils.roles import invalidate_roles
+
+# Dashboard section recomputed when a model it is built from changes
+DASHBOARD_SECTION_MODELS = {
+    Payment: 'payments',
+    Invoice: 'invoices',
+    SupportTicket: 'tickets',
+}
 
 @receiver(post_save, sender=SupportTicket)
 def on_ticket_created(sender, instance, created, **kwargs):
@@ -10,3 +26,117 @@ def on_ticket_created(sender, instance, created, **kwargs):
     """
     if created and instance.ticket_type == 'technical':
         auto_assign_technician(instance)
+
+@receiver(post_save, sender=SupportTicket)
+def on_ticket_saved(sender, instance, **kwargs):
+    """
+    Lets the SLA scheduler pick up new deadlines and closed tickets.
+    """
+    notify_ticket_changed(instance.id)
+
+@receiver(pre_save, sender=NetworkUsage)
+def remember_previous_usage(sender, instance, **kwargs):
+    """
+    Keeps the stored contract, date and usage values so the rollups only
+    receive the difference, or are moved when the contract or date changes.
+    """
+    previous = None
+    if instance.pk:
+        previous = NetworkUsage.objects.filter(pk=instance.pk).values_list(
+            'contract_id', 'contract__tariff_id', 'contract__customer_id', 'date', 'download_gb', 'upload_gb'
+        ).first()
+    instance._previous_usage = previous
+
+@receiver(post_save, sender=NetworkUsage)
+def on_usage_saved(sender, instance, **kwargs):
+    """
+    Keeps the usage rollup tables in step with ingested usage.
+    """
+    download_gb = Decimal(str(instance.download_gb))
+    upload_gb = Decimal(str(instance.upload_gb))
+    previous = getattr(instance, '_previous_usage', None)
+    if previous is not None:
+        contract_id, tariff_id, customer_id, date, previous_download, previous_upload = previous
+        if (contract_id, date) == (instance.contract_id, instance.date):
+            apply_usage_delta(tariff_id, customer_id, date, download_gb - previous_download, upload_gb - previous_upload)
+            return
+        # Moved to another contract or day: take the old values off the old rollup rows
+        apply_usage_delta(tariff_id, customer_id, date, -previous_download, -previous_upload)
+
+    tariff_id, customer_id = Contract.objects.filter(pk=instance.contract_id).values_list('tariff_id', 'customer_id').get()
+    apply_usage_delta(tariff_id, customer_id, instance.date, download_gb, upload_gb)
+
+@receiver(post_delete, sender=NetworkUsage)
+def on_usage_deleted(sender, instance, **kwargs):
+    # Rows are not recreated here: a cascading delete may already have removed them
+    apply_usage_delta(
+        instance.contract.tariff_id,
+        instance.contract.customer_id,
+        instance.date,
+        -Decimal(str(instance.download_gb)),
+        -Decimal(str(instance.upload_gb)),
+        create=False
+    )
+
+def invalidate_dashboard(sender, **kwargs):
+    """
+    Drops the cached dashboard section built from the changed model.
+    """
+    invalidate_dashboard_sections(DASHBOARD_SECTION_MODELS[sender])
+
+for model in DASHBOARD_SECTION_MODELS:
+    post_save.connect(invalidate_dashboard, sender=model, dispatch_uid=f'dashboard-{model.__name__}-save')
+    post_delete.connect(invalidate_dashboard, sender=model, dispatch_uid=f'dashboard-{model.__name__}-delete')
+
+def invalidate_reference_data(sender, **kwargs):
+    """
+    Reloads the in-process reference tables in every process after a change.
+    """
+    invalidate_reference_cache()
+
+for model_name in REFERENCE_MODELS:
+    model = apps.get_model('api', model_name)
+    post_save.connect(invalidate_reference_data, sender=model, dispatch_uid=f'reference-{model_name}-save')
+    post_delete.connect(invalidate_reference_data, sender=model, dispatch_uid=f'reference-{model_name}-delete')
+
+@receiver(m2m_changed, sender=User.groups.through, dispatch_uid='roles-user-groups')
+def on_user_groups_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Retires the role claims of users added to or removed from a group.
+    """
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        invalidate_roles([instance.pk])
+    else:
+        invalidate_roles(pk_set or instance.user_set.values_list('pk', flat=True))
+
+@receiver(post_save, sender=Group, dispatch_uid='roles-group-save')
+@receiver(pre_delete, sender=Group, dispatch_uid='roles-group-delete')
+def on_group_changed(sender, instance, **kwargs):
+    invalidate_roles(instance.user_set.values_list('pk', flat=True))
+
+@receiver(post_save, sender=EmployeeRole, dispatch_uid='roles-employee-role-save')
+def on_employee_role_changed(sender, instance, created, **kwargs):
+    if not created:
+        invalidate_roles(Employee.objects.filter(role=instance).values_list('user_id', flat=True))
+
+@receiver(post_save, sender=Employee, dispatch_uid='roles-employee-save')
+@receiver(post_delete, sender=Employee, dispatch_uid='roles-employee-delete')
+def on_employee_changed(sender, instance, **kwargs):
+    invalidate_roles([instance.user_id])
+
+@receiver(post_save, sender=Customer, dispatch_uid='roles-customer-save')
+@receiver(post_delete, sender=Customer, dispatch_uid='roles-customer-delete')
+def on_customer_changed(sender, instance, created=True, **kwargs):
+    # Only the existence of the profile is part of the role claims
+    if created:
+        invalidate_roles([instance.user_id])
+
+@receiver(post_migrate, sender=apps.get_app_config('api'), dispatch_uid='api-partition-tables')
+def partition_large_tables(sender, using, **kwargs):
+    """
+    Converts NetworkUsage and BalanceTransaction to monthly partitioned tables
+    once their migrations have created them (the migrations are generated).
+    """
+    partition_tables(using)
@@ -3,3 +3,6 @@ from .billing import *
 from .tickets import *
 from .scoring import *
 from .recommendations import *
+from .dashboard import *
+from .data_jobs import *
+from .ledger import *
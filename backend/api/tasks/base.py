@@ -12,3 +12,11 @@ def generate_invoices_with_payment_task():
 @shared_task
 def get_network_usage_task():
     call_command('get_network_usage')
+
+@shared_task
+def create_partitions_task():
+    call_command('create_partitions')
+
+@shared_task
+def build_usage_store_task():
+    call_command('build_usage_store')
@@ -3,8 +3,9 @@ from django.utils import timezone
 from datetime import timedelta
 from django.db.models import Prefetch
 from ..models import Customer, Contract, Notification
-from ..services.billing import record_transaction
+from ..services.ledger import post_transactions
 from ..services.notifications import send_notification
+from .sharding import run_sharded
 
 @shared_task(bind=True, max_retries=3, default_retry_delay=300)
 def check_negative_balances(self):
@@ -21,7 +22,7 @@ def check_negative_balances(self):
             status__status__iexact='Active'
         ).select_related('status')
         
-        count = 0
+        suspended = []
         for customer in customers:
             # Suspend only contracts with overdue invoices
             from ..models import Invoice
@@ -37,38 +38,50 @@ def check_negative_balances(self):
             )
             
             if contracts.exists():
-                contracts.update(status='suspended')
-                
-                # Log as penalty transaction
-                record_transaction(
-                    customer=customer,
-                    amount=0,
-                    transaction_type='penalty',
-                    description='Account suspended due to negative balance > 3 days'
-                )
-                
-                # Task 3: Send suspension notification
-                send_notification(
-                    customer=customer,
-                    notification_type='account_suspended',
-                    message='Your internet service has been suspended due to prolonged negative balance. Please top up to restore access.'
-                )
-                
-                count += 1
+                contracts.update(status='suspended', updated_at=timezone.now())
+                suspended.append(customer)
+
+        # Log as penalty transactions, posted in one batch
+        post_transactions(
+            (customer.id, 0, 'penalty', 'Account suspended due to negative balance > 3 days')
+            for customer in suspended
+        )
+
+        for customer in suspended:
+            # Task 3: Send suspension notification
+            send_notification(
+                customer=customer,
+                notification_type='account_suspended',
+                message='Your internet service has been suspended due to prolonged negative balance. Please top up to restore access.'
+            )
+        count = len(suspended)
                 
         return f"Suspended contracts for {count} customers."
     except Exception as exc:
         self.retry(exc=exc)
 
+def get_low_balance_customers():
+    return Customer.objects.filter(status__status__iexact='Active')
+
 @shared_task(bind=True, max_retries=3, default_retry_delay=300)
 def check_low_balances(self):
     """
     Daily task to alert customers before their balance runs out.
     """
+    try:
+        return run_sharded(get_low_balance_customers(), check_low_balances_shard, summarize_low_balances)
+    except Exception as exc:
+        self.retry(exc=exc)
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=60)
+def check_low_balances_shard(self, first_id, last_id):
+    """
+    Sends low balance alerts to active customers with ids in [first_id, last_id].
+    """
     try:
         # Load customers with their active contracts and tariffs
-        active_customers = Customer.objects.filter(
-            status__status__iexact='Active'
+        active_customers = get_low_balance_customers().filter(
+            id__range=(first_id, last_id)
         ).prefetch_related(
             Prefetch('contracts', queryset=Contract.objects.filter(status__in=['active', 'Active']).select_related('tariff'))
         )
@@ -106,6 +119,10 @@ def check_low_balances(self):
                     )
                     notified_count += 1
                     
-        return f"Sent low balance notifications to {notified_count} customers."
+        return notified_count
     except Exception as exc:
         self.retry(exc=exc)
+
+@shared_task
+def summarize_low_balances(results):
+    return f"Sent low balance notifications to {sum(results)} customers."
@@ -0,0 +1,13 @@
+from celery import shared_task
+from ..services.dashboard import refresh_dashboard_snapshot
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=60)
+def refresh_dashboard_snapshot_task(self):
+    """
+    Recomputes the cached manager dashboard sections.
+    """
+    try:
+        count = refresh_dashboard_snapshot()
+        return f"Refreshed {count} dashboard sections."
+    except Exception as exc:
+        self.retry(exc=exc)
@@ -0,0 +1,37 @@
+from celery import shared_task
+from django.db import transaction
+from ..services.data_jobs import run_data_job, fail_data_job, stalled_data_jobs
+
+# acks_late: a job whose worker dies is redelivered and resumes from its checkpoint
+@shared_task(bind=True, acks_late=True, max_retries=3, default_retry_delay=60)
+def run_data_job_task(self, job_id):
+    """
+    Runs a CSV import or export job in checkpointed chunks.
+    """
+    try:
+        job = run_data_job(job_id)
+        return f"Data job #{job_id} {job.status}: {job.processed_rows} rows processed."
+    except Exception as exc:
+        if self.request.retries >= self.max_retries:
+            fail_data_job(job_id, exc)
+            raise
+        self.retry(exc=exc)
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=60)
+def resume_stalled_data_jobs(self):
+    """
+    Re-queues unfinished jobs that stopped making progress.
+    """
+    try:
+        job_ids = stalled_data_jobs()
+        for job_id in job_ids:
+            run_data_job_task.delay(job_id)
+        return f"Resumed {len(job_ids)} data jobs."
+    except Exception as exc:
+        self.retry(exc=exc)
+
+def queue_data_job(job):
+    """
+    Starts a job once the transaction that created it has committed.
+    """
+    transaction.on_commit(lambda: run_data_job_task.delay(job.id))
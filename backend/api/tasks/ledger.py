@@ -0,0 +1,32 @@
+from celery import shared_task
+import logging
+from ..models import Customer
+from ..services.ledger import take_balance_snapshots
+from .sharding import run_sharded
+
+logger = logging.getLogger(__name__)
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=300)
+def take_all_balance_snapshots(self):
+    """
+    Daily task to snapshot the ledger balance of every customer with new transactions.
+    """
+    try:
+        return run_sharded(Customer.objects.all(), take_balance_snapshots_shard, summarize_balance_snapshots)
+    except Exception as exc:
+        self.retry(exc=exc)
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=60)
+def take_balance_snapshots_shard(self, first_id, last_id):
+    """
+    Snapshots the ledger balances of customers with ids in [first_id, last_id].
+    """
+    try:
+        return take_balance_snapshots(first_id, last_id)
+    except Exception as exc:
+        logger.error(f"Failed to snapshot balances for customers {first_id}-{last_id}: {str(exc)}")
+        self.retry(exc=exc)
+
+@shared_task
+def summarize_balance_snapshots(results):
+    return f"Balance snapshots: Created {sum(results)}"
@@ -1,34 +1,51 @@
 from celery import shared_task
 import logging
 from ..models import Customer
-from ..services.recommendations import generate_tariff_recommendation
+from ..services.recommendations import TariffCatalogue, save_tariff_recommendations
+from ..services.usage_store import build_usage_store
+from .sharding import run_sharded
 
 logger = logging.getLogger(__name__)
 
+def get_recommendation_customers():
+    return Customer.objects.filter(contracts__status__iexact='Active').distinct()
+
 @shared_task(bind=True, max_retries=3, default_retry_delay=300)
 def generate_all_recommendations(self):
     """
     Monthly task to generate tariff recommendations.
+    The usage store is rebuilt first, so every shard averages up-to-date usage.
+    """
+    try:
+        build_usage_store()
+        return run_sharded(get_recommendation_customers(), generate_recommendations_shard, summarize_recommendations)
+    except Exception as exc:
+        self.retry(exc=exc)
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=60)
+def generate_recommendations_shard(self, first_id, last_id):
+    """
+    Generates tariff recommendations for customers with ids in [first_id, last_id].
     """
     try:
-        customers = Customer.objects.filter(contracts__status__iexact='Active').distinct()
+        customers = list(get_recommendation_customers().filter(id__range=(first_id, last_id)))
         
-        processed = 0
+        processed = len(customers)
         created = 0
-        skipped = 0
         
-        for customer in customers:
-            processed += 1
-            try:
-                rec = generate_tariff_recommendation(customer)
-                if rec:
-                    rec.save()
-                    created += 1
-                else:
-                    skipped += 1
-            except Exception as e:
-                logger.error(f"Failed to generate recommendation for customer {customer.id}: {str(e)}")
+        try:
+            created = len(save_tariff_recommendations(customers, TariffCatalogue.load()))
+        except Exception as e:
+            logger.error(f"Failed to generate recommendations for customers {first_id}-{last_id}: {str(e)}")
+        skipped = processed - created
                 
-        return f"Recommendations: Total {processed}, Created {created}, Skipped {skipped}"
+        return [processed, created, skipped]
     except Exception as exc:
         self.retry(exc=exc)
+
+@shared_task
+def summarize_recommendations(results):
+    processed = sum(result[0] for result in results)
+    created = sum(result[1] for result in results)
+    skipped = sum(result[2] for result in results)
+    return f"Recommendations: Total {processed}, Created {created}, Skipped {skipped}"
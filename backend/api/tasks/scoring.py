@@ -1,30 +1,47 @@
 from celery import shared_task
 import logging
 from ..models import Customer
-from ..services.scoring import calculate_customer_score
+from ..services.scoring import save_customer_scores
+from .sharding import run_sharded
 
 logger = logging.getLogger(__name__)
 
+def get_scoring_customers():
+    return Customer.objects.filter(status__status__iexact='Active')
+
 @shared_task(bind=True, max_retries=3, default_retry_delay=300)
 def calculate_all_scores(self):
     """
     Weekly task to recalculate reliability scores for all active customers.
     """
     try:
-        active_customers = Customer.objects.filter(status__status__iexact='Active').select_related('user')
+        return run_sharded(get_scoring_customers(), calculate_scores_shard, summarize_scores)
+    except Exception as exc:
+        self.retry(exc=exc)
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=60)
+def calculate_scores_shard(self, first_id, last_id):
+    """
+    Recalculates scores for active customers with ids in [first_id, last_id].
+    """
+    try:
+        active_customers = get_scoring_customers().filter(id__range=(first_id, last_id))
         
         success_count = 0
         failure_count = 0
         
-        for customer in active_customers:
-            try:
-                score_obj = calculate_customer_score(customer)
-                score_obj.save()
-                success_count += 1
-            except Exception as e:
-                logger.error(f"Failed to calculate score for customer {customer.id}: {str(e)}")
-                failure_count += 1
+        try:
+            success_count = len(save_customer_scores(active_customers))
+        except Exception as e:
+            failure_count = active_customers.count()
+            logger.error(f"Failed to calculate scores for customers {first_id}-{last_id}: {str(e)}")
                 
-        return f"Scoring complete. Success: {success_count}, Failures: {failure_count}"
+        return [success_count, failure_count]
     except Exception as exc:
         self.retry(exc=exc)
+
+@shared_task
+def summarize_scores(results):
+    success_count = sum(result[0] for result in results)
+    failure_count = sum(result[1] for result in results)
+    return f"Scoring complete. Success: {success_count}, Failures: {failure_count}"
@@ -0,0 +1,44 @@
+import math
+from celery import chord
+from django.conf import settings
+
+
+def get_id_shards(queryset, shard_size=None, concurrency=None):
+    """
+    Splits the rows of queryset into contiguous (first_id, last_id) ranges.
+    Shards hold at least shard_size rows and there are never more than
+    concurrency of them, so a large table gets proportionally bigger shards.
+    """
+    shard_size = shard_size or settings.SWEEP_SHARD_SIZE
+    concurrency = concurrency or settings.SWEEP_SHARD_CONCURRENCY
+
+    ids = queryset.order_by('id').values_list('id', flat=True)
+    total = ids.count()
+    if total == 0:
+        return []
+    shard_size = max(shard_size, math.ceil(total / concurrency))
+
+    shards = []
+    first_id = last_id = None
+    for position, pk in enumerate(ids.iterator(chunk_size=shard_size)):
+        if position % shard_size == 0:
+            if first_id is not None:
+                shards.append((first_id, last_id))
+            first_id = pk
+        last_id = pk
+    shards.append((first_id, last_id))
+    return shards
+
+
+def run_sharded(queryset, shard_task, summary_task):
+    """
+    Fans a customer sweep out as a chord of shard tasks whose results are
+    combined by summary_task. A sweep that fits into one shard runs inline
+    and returns the summary directly.
+    """
+    shards = get_id_shards(queryset)
+    if len(shards) <= 1:
+        return summary_task([shard_task(first_id, last_id) for first_id, last_id in shards])
+
+    chord(shard_task.s(first_id, last_id) for first_id, last_id in shards)(summary_task.s())
+    return f"Dispatched {len(shards)} shards."
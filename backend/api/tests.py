@@ -309,6 +309,42 @@ class ClientScoringTest(BaseTestCase):
         self.assertEqual(score.overdue_points, 0)
         self.assertEqual(score.ticket_points, 0)
 
+    def test_batch_scoring_matches_single_customer_scoring(self):
+        """Test that batch scoring gives the same points as scoring each customer alone."""
+        from api.services.scoring import calculate_customer_scores, save_customer_scores
+        new_customer = self._create_customer(email='batchnew@test.com')
+        established = self._create_customer(email='batchold@test.com')
+        self._create_contract(established, days_ago=400)
+        problematic = self._create_customer(email='batchproblem@test.com')
+        contract = self._create_contract(problematic, days_ago=200)
+        for i in range(2):
+            Invoice.objects.create(
+                contract=contract, amount=Decimal('100.00'),
+                due_date=now() - timedelta(days=30 + i),
+                description=f'Overdue {i}', status='overdue'
+            )
+        for i in range(3):
+            SupportTicket.objects.create(
+                customer=problematic, subject=f'Problem {i}',
+                description='Issue', status=self.ticket_new,
+                ticket_type='billing'
+            )
+
+        customers = [new_customer, established, problematic]
+        fields = ('score', 'contract_points', 'overdue_points', 'ticket_points')
+        batch = calculate_customer_scores(customers)
+        for customer, batch_score in zip(customers, batch):
+            single = calculate_customer_score(customer)
+            self.assertEqual(batch_score.customer, customer)
+            self.assertEqual(
+                [getattr(batch_score, f) for f in fields],
+                [getattr(single, f) for f in fields]
+            )
+        self.assertEqual([s.score for s in batch], [50, 80, 35])
+
+        save_customer_scores(customers)
+        self.assertEqual(ClientScore.objects.filter(customer__in=customers).count(), 3)
+
 
 # =============================================================================
 # TEST 5: SLA Breach Detection
@@ -344,6 +380,105 @@ class SLABreachTest(BaseTestCase):
         self.assertTrue(ticket.is_sla_breached)
         self.assertIn('1', result)  # "Marked 1 tickets as SLA breached"
 
+    def test_bulk_breach_marking_notifies_once(self):
+        """Test that the SLA engine marks overdue open tickets in batches and notifies each customer once."""
+        from api.services.sla import mark_sla_breaches
+        customer = self._create_customer(email='bulkbreach@test.com')
+        tickets = [
+            SupportTicket.objects.create(
+                customer=customer, subject=f'Overdue {i}', description='Overdue',
+                status=self.ticket_open, ticket_type='billing'
+            )
+            for i in range(5)
+        ]
+        resolved = SupportTicket.objects.create(
+            customer=customer, subject='Done', description='Done',
+            status=self.ticket_resolved, ticket_type='billing'
+        )
+        SupportTicket.objects.update(sla_deadline=now() - timedelta(minutes=5))
+
+        self.assertEqual(mark_sla_breaches(batch_size=2), 5)
+        self.assertEqual(mark_sla_breaches(), 0)
+
+        self.assertEqual(SupportTicket.objects.filter(id__in=[t.id for t in tickets], is_sla_breached=True).count(), 5)
+        resolved.refresh_from_db()
+        self.assertFalse(resolved.is_sla_breached)
+        self.assertEqual(
+            Notification.objects.filter(customer=customer, notification_type=Notification.SLA_BREACHED).count(), 5
+        )
+
+    def test_ticket_list_has_no_side_effects(self):
+        """Test that listing tickets no longer marks SLA breaches inline."""
+        customer = self._create_customer(email='readonly@test.com')
+        ticket = SupportTicket.objects.create(
+            customer=customer, subject='Late', description='Late',
+            status=self.ticket_open, ticket_type='technical'
+        )
+        SupportTicket.objects.filter(id=ticket.id).update(sla_deadline=now() - timedelta(hours=1))
+
+        client = APIClient()
+        client.force_authenticate(user=customer.user)
+        response = client.get('/api/support-tickets/')
+        self.assertEqual(response.status_code, 200)
+
+        ticket.refresh_from_db()
+        self.assertFalse(ticket.is_sla_breached)
+        self.assertFalse(Notification.objects.filter(customer=customer).exists())
+
+    def test_scheduler_fires_tickets_in_deadline_order(self):
+        """Test that the SLA scheduler only marks tickets whose deadline has passed and follows deadline changes."""
+        from api.services.sla_scheduler import SLAScheduler
+        customer = self._create_customer(email='scheduler@test.com')
+        current = now()
+        tickets = [
+            SupportTicket.objects.create(
+                customer=customer, subject=f'Ticket {i}', description='Pending',
+                status=self.ticket_open, ticket_type='technical'
+            )
+            for i in range(3)
+        ]
+        for offset, ticket in zip((-10, 30, 60), tickets):
+            SupportTicket.objects.filter(id=ticket.id).update(sla_deadline=current + timedelta(minutes=offset))
+
+        clock = [current]
+        scheduler = SLAScheduler(clock=lambda: clock[0])
+        self.assertEqual(scheduler.resync(), 3)
+        self.assertEqual(scheduler.seconds_until_next(current), 0)
+
+        self.assertEqual(scheduler.fire_due(), 1)
+        self.assertEqual(scheduler.seconds_until_next(current), 30 * 60)
+
+        # Deadline moved forward and the last ticket resolved
+        SupportTicket.objects.filter(id=tickets[1].id).update(sla_deadline=current + timedelta(minutes=90))
+        SupportTicket.objects.filter(id=tickets[2].id).update(status=self.ticket_resolved)
+        scheduler.refresh([tickets[1].id, tickets[2].id])
+        self.assertEqual(len(scheduler), 1)
+
+        clock[0] = current + timedelta(minutes=61)
+        self.assertEqual(scheduler.fire_due(), 0)
+        clock[0] = current + timedelta(minutes=91)
+        self.assertEqual(scheduler.fire_due(), 1)
+        self.assertIsNone(scheduler.seconds_until_next(clock[0]))
+
+        breached = set(SupportTicket.objects.filter(is_sla_breached=True).values_list('id', flat=True))
+        self.assertEqual(breached, {tickets[0].id, tickets[1].id})
+
+    def test_scheduler_reads_buffered_notifications_without_waiting(self):
+        """Test that notifications buffered by earlier queries are handled without sleeping in select."""
+        from types import SimpleNamespace
+        from api.services.sla_scheduler import SLAScheduler
+        pg_connection = SimpleNamespace(
+            notifies=[SimpleNamespace(payload='7'), SimpleNamespace(payload='9')],
+            poll=lambda: None
+        )
+        with patch('api.services.sla_scheduler.select.select') as select:
+            self.assertEqual(SLAScheduler.wait_for_changes(pg_connection, 60), {7, 9})
+        select.assert_not_called()
+
+        with patch('api.services.sla_scheduler.select.select', return_value=([], [], [])) as select:
+            self.assertEqual(SLAScheduler.wait_for_changes(pg_connection, 5), set())
+        select.assert_called_once_with([pg_connection], [], [], 5)
+
 
 # =============================================================================
 # TEST 6: Notification System
@@ -533,3 +668,1572 @@ class TariffRecommendationTest(BaseTestCase):
         if result:
             self.assertEqual(result.reason, 'underusing')
             self.assertLess(result.recommended_tariff.price, self.tariff_premium.price)
+
+    def _create_usage(self, contract, total_gb, days=30):
+        NetworkUsage.objects.bulk_create([
+            NetworkUsage(
+                contract=contract, date=now().date() - timedelta(days=i),
+                download_gb=Decimal(total_gb), upload_gb=Decimal('0')
+            )
+            for i in range(days)
+        ])
+
+    def test_tariff_catalogue_lookups(self):
+        """Test the in-memory cheapest downgrade/upgrade lookups."""
+        from api.services.recommendations import TariffCatalogue
+        lite = Tariff.objects.create(
+            name='Lite', price=Decimal('150.00'), description='Lite plan',
+            speed_mbps=150, traffic_limit_gb=300, is_active=True
+        )
+        catalogue = TariffCatalogue.load()
+        self.assertEqual(catalogue.cheapest_downgrade(self.tariff_premium), lite)
+        self.assertIsNone(catalogue.cheapest_downgrade(lite))
+        self.assertEqual(catalogue.cheapest_upgrade(lite), self.tariff_basic)
+        self.assertIsNone(catalogue.cheapest_upgrade(self.tariff_premium))
+
+    def test_batch_recommendations_skip_duplicates(self):
+        """Test the batch pipeline for under- and overusing customers and duplicate filtering."""
+        from api.services.recommendations import save_tariff_recommendations
+        lite = Tariff.objects.create(
+            name='Lite', price=Decimal('150.00'), description='Lite plan',
+            speed_mbps=150, traffic_limit_gb=300, is_active=True
+        )
+        underusing = self._create_customer(email='batchunder@test.com')
+        self._create_usage(self._create_contract(underusing, tariff=self.tariff_premium), '10.0')
+        overusing = self._create_customer(email='batchover@test.com')
+        self._create_usage(self._create_contract(overusing, tariff=lite), '290.0')
+        idle = self._create_customer(email='batchidle@test.com')
+        self._create_usage(self._create_contract(idle), '100.0', days=3)
+
+        created = save_tariff_recommendations([underusing, overusing, idle])
+        by_customer = {rec.customer_id: rec for rec in created}
+        self.assertEqual(set(by_customer), {underusing.id, overusing.id})
+        self.assertEqual(by_customer[underusing.id].reason, 'underusing')
+        self.assertEqual(by_customer[underusing.id].recommended_tariff, lite)
+        self.assertEqual(by_customer[overusing.id].reason, 'overusing')
+        self.assertEqual(by_customer[overusing.id].recommended_tariff, self.tariff_basic)
+
+        self.assertEqual(save_tariff_recommendations([underusing, overusing, idle]), [])
+
+
+# =============================================================================
+# TEST 11: Billing-Day Invoice Generation
+# =============================================================================
+class BillingDayInvoiceTest(BaseTestCase):
+    def _set_start_day(self, contract, day):
+        start = (now() - timedelta(days=60)).replace(day=day)
+        Contract.objects.filter(id=contract.id).update(start_date=start)
+
+    def test_invoices_created_once_for_billing_day(self):
+        """Test that contracts billed on the given day get exactly one invoice."""
+        from datetime import date
+        from api.services.billing import generate_billing_day_invoices
+        due = self._create_contract(self._create_customer(email='due@test.com'))
+        other = self._create_contract(self._create_customer(email='notdue@test.com'))
+        self._set_start_day(due, 15)
+        self._set_start_day(other, 16)
+
+        billing_date = date(2026, 3, 15)
+        self.assertEqual(generate_billing_day_invoices(billing_date, chunk_size=1), 1)
+        self.assertEqual(generate_billing_day_invoices(billing_date), 0)
+
+        invoice = Invoice.objects.get(contract=due)
+        self.assertEqual(invoice.amount, self.tariff_basic.price)
+        self.assertEqual(invoice.due_date.date(), billing_date)
+        self.assertFalse(Invoice.objects.filter(contract=other).exists())
+
+    def test_month_end_clamping(self):
+        """Test that a contract started on the 31st is billed on the last day of February."""
+        from datetime import date
+        from api.services.billing import generate_billing_day_invoices
+        contract = self._create_contract(self._create_customer(email='monthend@test.com'))
+        Contract.objects.filter(id=contract.id).update(start_date=now().replace(year=2025, month=1, day=31))
+
+        self.assertEqual(generate_billing_day_invoices(date(2026, 2, 27)), 0)
+        self.assertEqual(generate_billing_day_invoices(date(2026, 2, 28)), 1)
+
+
+# =============================================================================
+# TEST 12: Batch Invoice Settlement
+# =============================================================================
+class BatchSettlementTest(BaseTestCase):
+    def _create_invoice(self, contract, amount, days_ago):
+        return Invoice.objects.create(
+            contract=contract, amount=Decimal(amount),
+            due_date=now() - timedelta(days=days_ago),
+            description='Monthly fee'
+        )
+
+    def test_settles_in_due_date_order_until_balance_runs_out(self):
+        """Test that invoices are paid oldest first and settlement stops at the first unaffordable one."""
+        from api.services.billing import settle_pending_invoices
+        customer = self._create_customer(email='settle@test.com', balance=Decimal('350.00'))
+        contract = self._create_contract(customer)
+        oldest = self._create_invoice(contract, '200.00', 10)
+        middle = self._create_invoice(contract, '200.00', 5)
+        newest = self._create_invoice(contract, '100.00', 1)
+
+        settled = settle_pending_invoices([customer.id])
+        self.assertEqual([row[0] for row in settled], [oldest.id])
+
+        customer.refresh_from_db()
+        self.assertEqual(customer.balance, Decimal('150.00'))
+        self.assertEqual(Invoice.objects.get(id=oldest.id).status, 'paid')
+        self.assertEqual(Invoice.objects.get(id=middle.id).status, 'pending')
+        self.assertEqual(Invoice.objects.get(id=newest.id).status, 'pending')
+
+        tx = BalanceTransaction.objects.get(customer=customer)
+        self.assertEqual(tx.amount, Decimal('-200.00'))
+        self.assertEqual(tx.balance_after, Decimal('150.00'))
+
+    def test_dry_run_writes_nothing(self):
+        """Test that a dry run reports settlements without changing balances or invoices."""
+        from api.services.billing import settle_pending_invoices
+        customer = self._create_customer(email='dryrun@test.com', balance=Decimal('500.00'))
+        invoice = self._create_invoice(self._create_contract(customer), '200.00', 3)
+
+        settled = settle_pending_invoices([customer.id], dry_run=True)
+        self.assertEqual(len(settled), 1)
+
+        customer.refresh_from_db()
+        invoice.refresh_from_db()
+        self.assertEqual(customer.balance, Decimal('500.00'))
+        self.assertEqual(invoice.status, 'pending')
+        self.assertFalse(BalanceTransaction.objects.filter(customer=customer).exists())
+
+
+# =============================================================================
+# TEST 13: Sharded Customer Sweeps
+# =============================================================================
+class ShardedSweepTest(BaseTestCase):
+    def test_id_shards_cover_all_rows(self):
+        """Test that id shards are contiguous, ordered and respect the concurrency cap."""
+        from api.tasks.sharding import get_id_shards
+        customers = [self._create_customer(email=f'shard{i}@test.com') for i in range(5)]
+        ids = sorted(c.id for c in customers)
+
+        shards = get_id_shards(Customer.objects.filter(id__in=ids), shard_size=2, concurrency=10)
+        self.assertEqual(shards, [(ids[0], ids[1]), (ids[2], ids[3]), (ids[4], ids[4])])
+
+        shards = get_id_shards(Customer.objects.filter(id__in=ids), shard_size=1, concurrency=2)
+        self.assertEqual(shards, [(ids[0], ids[2]), (ids[3], ids[4])])
+
+        self.assertEqual(get_id_shards(Customer.objects.none(), shard_size=2, concurrency=2), [])
+
+    def test_single_shard_sweep_runs_inline(self):
+        """Test that a sweep fitting into one shard returns the aggregated summary."""
+        from api.tasks.scoring import calculate_all_scores
+        self._create_customer(email='sweep1@test.com')
+        self._create_customer(email='sweep2@test.com')
+
+        result = calculate_all_scores()
+        self.assertEqual(result, "Scoring complete. Success: 2, Failures: 0")
+        self.assertEqual(ClientScore.objects.count(), 2)
+
+
+# =============================================================================
+# TEST 14: Network Usage Rollups
+# =============================================================================
+class UsageRollupTest(BaseTestCase):
+    def test_rollups_follow_usage_changes(self):
+        """Test that creating, updating and deleting usage keeps the rollups in step."""
+        from api.models import DailyTariffUsage, DailyCustomerUsage, MonthlyUsage
+        customer = self._create_customer(email='rollup@test.com')
+        contract = self._create_contract(customer)
+        other = self._create_contract(customer, tariff=self.tariff_premium)
+        day = now().date()
+
+        usage = NetworkUsage.objects.create(
+            contract=contract, date=day, download_gb=Decimal('5.00'), upload_gb=Decimal('1.00')
+        )
+        NetworkUsage.objects.create(
+            contract=other, date=day, download_gb=Decimal('2.50'), upload_gb=Decimal('0.50')
+        )
+        usage.download_gb = Decimal('7.00')
+        usage.save()
+
+        self.assertEqual(DailyTariffUsage.objects.get(date=day, tariff=self.tariff_basic).download_gb, Decimal('7.00'))
+        daily = DailyCustomerUsage.objects.get(date=day, customer=customer)
+        self.assertEqual((daily.download_gb, daily.upload_gb), (Decimal('9.50'), Decimal('1.50')))
+        self.assertEqual(MonthlyUsage.objects.get(month=day.replace(day=1)).download_gb, Decimal('9.50'))
+
+        usage.delete()
+        self.assertEqual(DailyCustomerUsage.objects.get(date=day, customer=customer).download_gb, Decimal('2.50'))
+        self.assertEqual(MonthlyUsage.objects.get(month=day.replace(day=1)).upload_gb, Decimal('0.50'))
+
+    def test_rollups_follow_usage_moved_to_another_day(self):
+        """Test that changing a usage row's date or contract moves its amounts between rollup rows."""
+        from api.models import DailyTariffUsage, DailyCustomerUsage
+        customer = self._create_customer(email='moved@test.com')
+        contract = self._create_contract(customer)
+        other = self._create_contract(self._create_customer(email='moved-other@test.com'), tariff=self.tariff_premium)
+        day = now().date()
+        next_day = day + timedelta(days=1)
+
+        usage = NetworkUsage.objects.create(
+            contract=contract, date=day, download_gb=Decimal('5.00'), upload_gb=Decimal('1.00')
+        )
+        usage.date = next_day
+        usage.download_gb = Decimal('6.00')
+        usage.save()
+
+        old = DailyCustomerUsage.objects.get(date=day, customer=customer)
+        self.assertEqual((old.download_gb, old.upload_gb), (Decimal('0.00'), Decimal('0.00')))
+        new = DailyCustomerUsage.objects.get(date=next_day, customer=customer)
+        self.assertEqual((new.download_gb, new.upload_gb), (Decimal('6.00'), Decimal('1.00')))
+        self.assertEqual(DailyTariffUsage.objects.get(date=next_day, tariff=self.tariff_basic).download_gb, Decimal('6.00'))
+
+        usage.contract = other
+        usage.save()
+        self.assertEqual(DailyCustomerUsage.objects.get(date=next_day, customer=customer).download_gb, Decimal('0.00'))
+        self.assertEqual(DailyCustomerUsage.objects.get(date=next_day, customer=other.customer).download_gb, Decimal('6.00'))
+        self.assertEqual(DailyTariffUsage.objects.get(date=next_day, tariff=self.tariff_basic).download_gb, Decimal('0.00'))
+        self.assertEqual(DailyTariffUsage.objects.get(date=next_day, tariff=self.tariff_premium).download_gb, Decimal('6.00'))
+
+    def test_rebuild_matches_raw_usage(self):
+        """Test that rebuilding the rollups reproduces the stats computed from raw usage."""
+        from api.models import DailyTariffUsage, DailyCustomerUsage, MonthlyUsage
+        from api.services.analytics import get_network_usage_stats
+        from api.services.usage_rollups import rebuild_usage_rollups
+        heavy = self._create_customer(email='heavy@test.com')
+        light = self._create_customer(email='light@test.com')
+        heavy_contract = self._create_contract(heavy, tariff=self.tariff_premium)
+        light_contract = self._create_contract(light)
+        today = now().date()
+        for i in range(3):
+            NetworkUsage.objects.create(
+                contract=heavy_contract, date=today - timedelta(days=i),
+                download_gb=Decimal('10.00'), upload_gb=Decimal('2.00')
+            )
+            NetworkUsage.objects.create(
+                contract=light_contract, date=today - timedelta(days=i),
+                download_gb=Decimal('1.00'), upload_gb=Decimal('0.50')
+            )
+        expected = get_network_usage_stats()
+
+        DailyTariffUsage.objects.all().delete()
+        DailyCustomerUsage.objects.all().delete()
+        MonthlyUsage.objects.all().delete()
+        rebuild_usage_rollups(today - timedelta(days=2), today)
+
+        stats = get_network_usage_stats()
+        self.assertEqual(stats, expected)
+        self.assertEqual(stats['summary']['total_usage_gb'], 40.5)
+        self.assertEqual(stats['summary']['unique_customers'], 2)
+        self.assertEqual(len(stats['daily_usage']), 3)
+        self.assertEqual(stats['tariff_usage'][0], {'tariff_name': 'Premium', 'total_gb': 36.0})
+        self.assertEqual(stats['customer_usage'][0]['customer_id'], heavy.id)
+
+
+# =============================================================================
+# TEST 15: Manager Dashboard Snapshot
+# =============================================================================
+class DashboardSnapshotTest(BaseTestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        from django.contrib.auth.models import Group
+        cache.clear()
+        self.manager, _ = self._create_manager()
+        self.manager.groups.add(Group.objects.get(name='Manager'))
+        self.client = APIClient()
+
+    def _get_dashboard(self, user, query=''):
+        self.client.force_authenticate(user=user)
+        response = self.client.get(f'/api/dashboard/manager/{query}')
+        self.assertEqual(response.status_code, 200)
+        return response.data['data']
+
+    def test_snapshot_is_reused_until_invalidated(self):
+        """Test that the dashboard is served from cache and a ticket change rebuilds it."""
+        customer = self._create_customer(email='dash@test.com')
+        first = self._get_dashboard(self.manager)
+        second = self._get_dashboard(self.manager)
+        self.assertEqual(second['snapshot_version'], first['snapshot_version'])
+        self.assertEqual(second['generated_at'], first['generated_at'])
+
+        SupportTicket.objects.create(
+            customer=customer, subject='Slow', description='Slow internet',
+            status=self.ticket_open, ticket_type='general'
+        )
+        third = self._get_dashboard(self.manager)
+        self.assertEqual(third['open_tickets'], first['open_tickets'] + 1)
+        self.assertGreater(third['snapshot_version'], first['snapshot_version'])
+        # Sections built from unchanged models are kept
+        self.assertEqual(third['generated_at'], first['generated_at'])
+
+    def test_fresh_bypass_is_admin_only(self):
+        """Test that ?fresh=1 rebuilds the snapshot for admins and is ignored for managers."""
+        admin = User.objects.create_superuser(
+            email='admin@test.com', password='TestPass123!',
+            first_name='Site', last_name='Admin'
+        )
+        first = self._get_dashboard(self.manager)
+        self.assertEqual(
+            self._get_dashboard(self.manager, '?fresh=1')['snapshot_version'],
+            first['snapshot_version']
+        )
+        self.assertGreater(
+            self._get_dashboard(admin, '?fresh=1')['snapshot_version'],
+            first['snapshot_version']
+        )
+
+
+# =============================================================================
+# TEST 16: Dashboard Query Budget
+# =============================================================================
+class DashboardQueryCountTest(BaseTestCase):
+    # One conditional aggregate per table plus the grouped and "latest" lists
+    DASHBOARD_QUERIES = 20
+
+    def _collect_stats(self):
+        from api.services.analytics import get_dashboard_stats
+        stats = get_dashboard_stats()
+        # Force the lazily evaluated "latest" querysets
+        for key in ('latest_tickets', 'recent_requests', 'top_problem_clients',
+                    'pending_recommendations', 'overdue_tickets'):
+            list(stats[key])
+        return stats
+
+    def test_query_count_does_not_grow_with_data(self):
+        """Test that the dashboard runs a fixed number of queries regardless of row counts."""
+        category = EquipmentCategory.objects.create(name='Routers')
+        for i in range(3):
+            customer = self._create_customer(email=f'budget{i}@test.com')
+            contract = self._create_contract(customer, tariff=self.tariff_premium if i % 2 else None)
+            Invoice.objects.create(contract=contract, amount=Decimal('200.00'), due_date=now(), status='pending')
+            Equipment.objects.create(name=f'Router {i}', price=Decimal(100 + i), stock_quantity=i, category=category)
+            Service.objects.create(name=f'Extra {i}', description='Extra service')
+
+        with self.assertNumQueries(self.DASHBOARD_QUERIES):
+            stats = self._collect_stats()
+
+        self.assertEqual(stats['total_customers'], 3)
+        self.assertEqual(stats['pending_invoices'], 3)
+        self.assertEqual(stats['pending_amount'], 600.0)
+        self.assertEqual(stats['total_services'], 4)
+        self.assertEqual(stats['total_tariffs'], 2)
+        self.assertEqual(stats['total_equipment'], 3)
+        self.assertEqual(stats['low_stock_items'], 3)
+        self.assertEqual(stats['most_expensive']['name'], 'Router 2')
+
+        Invoice.objects.create(contract=contract, amount=Decimal('50.00'), due_date=now(), status='paid')
+        with self.assertNumQueries(self.DASHBOARD_QUERIES):
+            self._collect_stats()
+
+
+# =============================================================================
+# TEST 17: Customer Serializer Query Counts
+# =============================================================================
+class CustomerQueryCountTest(BaseTestCase):
+    def setUp(self):
+        self.manager, _ = self._create_manager()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.manager)
+        self.customers = []
+
+    def _add_customers(self, count):
+        category, _ = EquipmentCategory.objects.get_or_create(name='Modems')
+        equipment, _ = Equipment.objects.get_or_create(
+            name='Modem', category=category, defaults={'price': Decimal('50.00'), 'stock_quantity': 100}
+        )
+        for _ in range(count):
+            customer = self._create_customer(email=f'query{len(self.customers)}@test.com')
+            contract = self._create_contract(customer)
+            for amount in ('100.00', '150.00'):
+                Invoice.objects.create(contract=contract, amount=Decimal(amount), due_date=now())
+            Payment.objects.create(customer=customer, amount=Decimal('100.00'), method=self.payment_method)
+            SupportTicket.objects.create(
+                customer=customer, subject='Help', description='Help', status=self.ticket_open, ticket_type='general'
+            )
+            ContractEquipment.objects.create(contract=contract, equipment=equipment)
+            ClientScore.objects.create(customer=customer, score=70, contract_points=30, overdue_points=20, ticket_points=20)
+            self.customers.append(customer)
+
+    def _count_queries(self, url):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        self.client.get(url)  # warm up the per-user lookups cached on the request user
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response
+
+    def test_customer_list_queries_are_constant(self):
+        """Test that listing customers costs the same number of queries for 2 and 6 customers."""
+        self._add_customers(2)
+        small, _ = self._count_queries('/api/customers/')
+        self._add_customers(4)
+        large, response = self._count_queries('/api/customers/')
+
+        self.assertEqual(small, large)
+        self.assertLessEqual(large, 10)
+        row = response.data['data']['results'][0]
+        self.assertEqual(len(row['all_invoices']), 2)
+        self.assertEqual(row['current_score'], 70)
+        self.assertEqual(len(row['payments']), 1)
+
+    def test_customer_detail_queries_are_constant(self):
+        """Test that the detail view does not fan out per contract, invoice or ticket."""
+        self._add_customers(1)
+        customer = self.customers[0]
+        small, _ = self._count_queries(f'/api/customers/{customer.id}/')
+
+        contract = self._create_contract(customer)
+        Invoice.objects.create(contract=contract, amount=Decimal('75.00'), due_date=now())
+        SupportTicket.objects.create(
+            customer=customer, subject='More', description='More', status=self.ticket_open, ticket_type='general'
+        )
+        large, response = self._count_queries(f'/api/customers/{customer.id}/')
+
+        self.assertEqual(small, large)
+        data = response.data.get('data', response.data)
+        self.assertEqual(len(data['contracts']), 2)
+        self.assertEqual(len(data['all_invoices']), 3)
+        self.assertEqual(len(data['support_tickets']), 2)
+
+    def test_external_customer_list_queries_are_constant(self):
+        """Test that the external API customer list is prefetched as well."""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from rest_framework.test import APIRequestFactory, force_authenticate
+        from api.external import ExternalCustomerView, ADMIN_API_KEY
+        view = ExternalCustomerView.as_view()
+        factory = APIRequestFactory()
+
+        counts = []
+        for batch in (2, 3):
+            self._add_customers(batch)
+            request = factory.get('/external/customers/', HTTP_X_API_KEY=ADMIN_API_KEY)
+            force_authenticate(request, user=self.manager)
+            with CaptureQueriesContext(connection) as queries:
+                response = view(request)
+            self.assertEqual(response.status_code, 200)
+            counts.append(len(queries))
+        self.assertEqual(len(response.data), 5)
+        self.assertEqual(counts[0], counts[1])
+
+
+# =============================================================================
+# TEST 18: Keyset Pagination
+# =============================================================================
+class KeysetPaginationTest(BaseTestCase):
+    def setUp(self):
+        self.manager, _ = self._create_manager()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.manager)
+
+    def _walk(self, url):
+        ids, pages = [], 0
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            page = response.data['data']
+            ids.extend(row['id'] for row in page['results'])
+            url, pages = page['next'], pages + 1
+        return ids, pages
+
+    def test_cursor_pages_cover_every_row_once(self):
+        """Test that cursor pages follow (created_at, id) order without gaps or duplicates."""
+        from django.contrib.auth.models import Group
+        self.manager.groups.add(Group.objects.get(name='Manager'))
+        customer = self._create_customer(email='keyset@test.com')
+        for i in range(23):
+            record_transaction(customer, Decimal('1.00'), 'topup', f'Top up {i}')
+        # Force timestamp ties so the id tie-breaker is exercised
+        BalanceTransaction.objects.filter(customer=customer, id__in=list(
+            BalanceTransaction.objects.filter(customer=customer).values_list('id', flat=True)[:10]
+        )).update(created_at=now() - timedelta(days=1))
+        expected = list(
+            BalanceTransaction.objects.filter(customer=customer)
+            .order_by('-created_at', '-id').values_list('id', flat=True)
+        )
+
+        ids, pages = self._walk(f'/api/customers/{customer.id}/transactions/?cursor=&page_size=5')
+        self.assertEqual(ids, expected)
+        self.assertEqual(pages, 5)
+
+    def test_count_is_optional(self):
+        """Test that cursor mode skips COUNT(*) unless an exact or estimated count is requested."""
+        customer = self._create_customer(email='counted@test.com')
+        contract = self._create_contract(customer)
+        for days in range(12):
+            Invoice.objects.create(contract=contract, amount=Decimal('10.00'), due_date=now() - timedelta(days=days))
+
+        page = self.client.get('/api/invoices/?cursor=').data['data']
+        self.assertIsNone(page['count'])
+        self.assertEqual(len(page['results']), 10)
+        self.assertEqual(self.client.get('/api/invoices/?cursor=&count=exact').data['data']['count'], 12)
+        self.assertIsInstance(self.client.get('/api/invoices/?cursor=&count=estimate').data['data']['count'], int)
+
+        ids, _ = self._walk('/api/invoices/?cursor=&status=pending&page_size=5')
+        self.assertEqual(ids, list(Invoice.objects.order_by('-due_date', '-id').values_list('id', flat=True)))
+
+        # Page-number pagination is unchanged when no cursor is given
+        self.assertEqual(self.client.get('/api/invoices/').data['data']['count'], 12)
+
+    def test_invalid_cursor_is_rejected(self):
+        """Test that a malformed cursor returns 404 like DRF's cursor pagination."""
+        response = self.client.get('/api/invoices/?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, 404)
+
+
+# =============================================================================
+# TEST 19: Batch Assignment
+# =============================================================================
+class BatchAssignmentTest(BaseTestCase):
+    def setUp(self):
+        from django.contrib.auth.models import Group
+        self.manager, _ = self._create_manager()
+        self.manager.groups.add(Group.objects.get(name='Manager'))
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.manager)
+        self.customer = self._create_customer(email='assign@test.com')
+
+    def _create_employee(self, email, role):
+        user = User.objects.create_user(
+            email=email, password='TestPass123!', first_name='Staff', last_name='Member'
+        )
+        return Employee.objects.create(user=user, role=role)
+
+    def _create_tickets(self, count, **kwargs):
+        return [
+            SupportTicket.objects.create(
+                customer=self.customer, subject=f'Billing {i}', description='Question',
+                status=self.ticket_new, ticket_type='billing', **kwargs
+            )
+            for i in range(count)
+        ]
+
+    def test_tickets_go_to_least_loaded_staff(self):
+        """Test that bulk assignment balances the backlog against existing workloads and notifies in one batch."""
+        busy = self._create_employee('busy@test.com', self.support_role)
+        idle = self._create_employee('idle@test.com', self.support_role)
+        self._create_tickets(2, assigned_to=busy)
+        self._create_tickets(6)
+
+        response = self.client.post('/api/support-tickets/auto_assign_all/')
+        self.assertEqual(response.status_code, 200)
+
+        self.assertFalse(SupportTicket.objects.filter(assigned_to__isnull=True).exists())
+        self.assertEqual(SupportTicket.objects.filter(assigned_to=busy).count(), 4)
+        self.assertEqual(SupportTicket.objects.filter(assigned_to=idle).count(), 4)
+        self.assertEqual(
+            Notification.objects.filter(customer=self.customer, notification_type='ticket_assigned').count(), 6
+        )
+
+    def test_ticket_assignment_query_count_is_flat(self):
+        """Test that assigning a larger backlog does not issue more queries."""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        self._create_employee('staff@test.com', self.support_role)
+
+        counts = []
+        for size in (2, 12):
+            self._create_tickets(size)
+            with CaptureQueriesContext(connection) as ctx:
+                self.client.post('/api/support-tickets/auto_assign_all/')
+            counts.append(len(ctx))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_connection_requests_assigned_in_bulk(self):
+        """Test that unassigned connection requests are spread over technicians and moved to In Progress."""
+        technician_role, _ = EmployeeRole.objects.get_or_create(name='Technician')
+        in_progress, _ = Status.objects.get_or_create(status='In Progress', context=self.conn_ctx)
+        first = self._create_employee('tech1@test.com', technician_role)
+        second = self._create_employee('tech2@test.com', technician_role)
+        requests = [
+            ConnectionRequest.objects.create(customer=self.customer, status=self.conn_new, tariff=self.tariff_basic)
+            for _ in range(4)
+        ]
+
+        response = self.client.post('/api/connection-requests/auto_assign_all/')
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(first.connectionrequestassignment_set.count(), 2)
+        self.assertEqual(second.connectionrequestassignment_set.count(), 2)
+        self.assertEqual(
+            ConnectionRequest.objects.filter(id__in=[r.id for r in requests], status=in_progress).count(), 4
+        )
+        self.assertEqual(
+            Notification.objects.filter(customer=self.customer, notification_type='request_assigned').count(), 4
+        )
+
+
+# =============================================================================
+# TEST 20: Role Resolution
+# =============================================================================
+class RoleResolutionTest(BaseTestCase):
+    def _login(self, email):
+        response = self.client.post('/api/auth/token/', {'email': email, 'password': 'TestPass123!'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response.data['data']['access']
+
+    def _token_request(self, access):
+        from rest_framework.request import Request
+        from rest_framework.test import APIRequestFactory
+        from rest_framework_simplejwt.authentication import JWTAuthentication
+        request = Request(
+            APIRequestFactory().get('/api/customers/', HTTP_AUTHORIZATION=f'Bearer {access}'),
+            authenticators=[JWTAuthentication()]
+        )
+        request.user  # authenticate
+        return request
+
+    def test_login_embeds_role_claims(self):
+        """Test that login tokens carry the user's groups, employee role and customer id."""
+        from rest_framework_simplejwt.tokens import AccessToken
+        _, employee = self._create_manager()
+        customer = self._create_customer(email='claims@test.com')
+
+        manager_token = AccessToken(self._login('manager@test.com'))
+        self.assertEqual(manager_token['groups'], ['Manager'])
+        self.assertEqual(manager_token['employee_id'], employee.id)
+        self.assertEqual(manager_token['employee_role'], 'Manager')
+        self.assertIsNone(manager_token['customer_id'])
+
+        customer_token = AccessToken(self._login('claims@test.com'))
+        self.assertEqual(customer_token['customer_id'], customer.id)
+        self.assertIsNone(customer_token['employee_id'])
+
+    def test_role_checks_cost_no_queries_with_token(self):
+        """Test that permission checks read roles from the token claims without querying."""
+        from api.utils.permissions import IsManager, IsManagerOrAdmin, IsSupport
+        self._create_manager()
+        request = self._token_request(self._login('manager@test.com'))
+
+        with self.assertNumQueries(0):
+            self.assertTrue(IsManager().has_permission(request, None))
+            self.assertTrue(IsManagerOrAdmin().has_permission(request, None))
+            self.assertFalse(IsSupport().has_permission(request, None))
+
+    def test_roles_loaded_once_without_claims(self):
+        """Test that roles of a session or force-authenticated user are loaded with one query per request."""
+        from rest_framework.request import Request
+        from rest_framework.test import APIRequestFactory, force_authenticate
+        from api.utils.roles import get_roles
+        customer = self._create_customer(email='noclaims@test.com')
+        django_request = APIRequestFactory().get('/api/customers/')
+        force_authenticate(django_request, user=customer.user)
+        request = Request(django_request)
+        request.user
+
+        with self.assertNumQueries(1):
+            roles = get_roles(request)
+            get_roles(request)
+        self.assertEqual(roles.customer_id, customer.id)
+        self.assertEqual(roles.groups, {'Customer'})
+        self.assertFalse(roles.is_manager_or_admin)
+
+    def test_role_change_retires_token_claims(self):
+        """Test that claims of a token issued before a role change are no longer trusted."""
+        from api.utils.permissions import IsManager
+        from api.utils.roles import get_roles
+        user, employee = self._create_manager()
+        access = self._login('manager@test.com')
+        self.assertTrue(IsManager().has_permission(self._token_request(access), None))
+
+        employee.role = self.support_role
+        employee.save()
+        self.assertEqual(get_roles(self._token_request(access)).role, 'support')
+
+        user.groups.clear()
+        self.assertFalse(IsManager().has_permission(self._token_request(access), None))
+
+    def test_refresh_issues_current_role_claims(self):
+        """Test that a refreshed access token carries the roles of refresh time, not of login."""
+        from django.contrib.auth.models import Group
+        from rest_framework_simplejwt.tokens import AccessToken
+        customer = self._create_customer(email='refresh@test.com')
+        response = self.client.post('/api/auth/token/', {'email': 'refresh@test.com', 'password': 'TestPass123!'}, format='json')
+        refresh = response.data['data']['refresh']
+
+        customer.user.groups.add(Group.objects.get_or_create(name='Admin')[0])
+        response = self.client.post('/api/auth/token/refresh/', {'refresh': refresh}, format='json')
+        self.assertEqual(response.status_code, 200)
+        access = response.data['access']
+        self.assertEqual(sorted(AccessToken(access)['groups']), ['Admin', 'Customer'])
+
+        from api.utils.roles import get_roles
+        request = self._token_request(access)
+        with self.assertNumQueries(0):
+            self.assertTrue(get_roles(request).is_manager_or_admin)
+
+
+# =============================================================================
+# TEST 21: Reference Data Cache
+# =============================================================================
+class ReferenceCacheTest(BaseTestCase):
+    def test_lookups_hit_memory_after_first_load(self):
+        """Test that status and named reference lookups need no queries once loaded."""
+        from api.utils.reference_cache import get_status_id, get_status_context, get_reference_id
+        get_status_id('SupportTicket', 'Open')
+
+        with self.assertNumQueries(0):
+            self.assertEqual(get_status_id('SupportTicket', 'Open'), self.ticket_open.id)
+            self.assertEqual(get_status_context(self.conn_new.id), 'ConnectionRequest')
+            self.assertEqual(get_reference_id('Region', 'Kyiv'), self.region.id)
+            self.assertEqual(get_reference_id('PaymentMethod', 'Bank Transfer'), self.payment_method.id)
+
+    def test_saves_invalidate_the_local_copy(self):
+        """Test that a status saved in this process is visible to the next lookup."""
+        from api.utils.reference_cache import get_status_id
+        self.assertIsNone(get_status_id('SupportTicket', 'Escalated'))
+        escalated = Status.objects.create(status='Escalated', context=self.ticket_ctx)
+        self.assertEqual(get_status_id('SupportTicket', 'Escalated'), escalated.id)
+
+    def test_version_bump_reloads_other_processes(self):
+        """Test that a process notices a bumped shared version and reloads its tables."""
+        from django.core.cache import cache
+        from django.test import override_settings
+        from api.utils.reference_cache import VERSION_KEY, get_reference_id
+        get_reference_id('Region', 'Kyiv')
+
+        # A change made elsewhere: no signal reaches this process
+        Region.objects.filter(id=self.region.id).update(name='Lviv')
+        self.assertEqual(get_reference_id('Region', 'Kyiv'), self.region.id)
+
+        cache.incr(VERSION_KEY)
+        with override_settings(REFERENCE_CACHE_CHECK_INTERVAL=0):
+            self.assertIsNone(get_reference_id('Region', 'Kyiv'))
+            self.assertEqual(get_reference_id('Region', 'Lviv'), self.region.id)
+
+    def test_write_lookups_check_the_version_every_time(self):
+        """Test that status and reference lookups see a change made elsewhere without waiting for the interval."""
+        from django.core.cache import cache
+        from django.test import override_settings
+        from api.utils.reference_cache import VERSION_KEY, get_status, get_reference_id
+        with override_settings(REFERENCE_CACHE_CHECK_INTERVAL=3600):
+            get_status('SupportTicket', 'Open')
+
+            Status.objects.filter(id=self.ticket_open.id).update(status='Reopened')
+            Region.objects.filter(id=self.region.id).delete()
+            cache.incr(VERSION_KEY)
+
+            self.assertIsNone(get_status('SupportTicket', 'Open'))
+            self.assertEqual(get_status('SupportTicket', 'Reopened').id, self.ticket_open.id)
+            self.assertIsNone(get_reference_id('Region', 'Kyiv'))
+
+    def test_status_context_validation_uses_cache(self):
+        """Test that serializer status validation rejects statuses of another context without querying."""
+        from rest_framework.exceptions import ValidationError
+        from api.serializers import CustomerCreateSerializer
+        serializer = CustomerCreateSerializer()
+        serializer.validate_status(self.active_status)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(serializer.validate_status(self.active_status), self.active_status)
+            with self.assertRaises(ValidationError):
+                serializer.validate_status(self.ticket_open)
+
+
+# =============================================================================
+# TEST 22: Streaming CSV Export
+# =============================================================================
+class CSVExportTest(BaseTestCase):
+    def setUp(self):
+        from django.contrib.auth.models import Group
+        self.manager, _ = self._create_manager()
+        self.manager.groups.add(Group.objects.get(name='Manager'))
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.manager)
+
+    def _export(self, url):
+        import csv
+        import io
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+            self.assertTrue(response.streaming)
+            content = b''.join(response.streaming_content).decode('utf-8')
+        return list(csv.reader(io.StringIO(content.lstrip('\ufeff')))), len(ctx)
+
+    def test_customer_export_streams_joined_rows(self):
+        """Test that the customer export streams one row per customer with a fixed number of queries."""
+        self._create_customer(email='first@test.com')
+        rows, small_queries = self._export('/api/customers/export_csv/')
+        for i in range(10):
+            self._create_customer(email=f'export{i}@test.com')
+        rows, queries = self._export('/api/customers/export_csv/')
+
+        self.assertEqual(rows[0], ['id', 'first_name', 'last_name', 'email', 'phone_number', 'status', 'balance'])
+        self.assertEqual(len(rows), 12)
+        self.assertIn('export0@test.com', [row[3] for row in rows])
+        self.assertEqual(rows[1][5], 'Active')
+        self.assertEqual(queries, small_queries)
+
+    def test_tariff_export_aggregates_services(self):
+        """Test that the tariff export lists each tariff's services from one aggregated query."""
+        extra = Service.objects.create(name='TV', description='Television')
+        TariffService.objects.create(tariff=self.tariff_premium, service=extra)
+        rows, _ = self._export('/api/tariffs/export_csv/')
+
+        services = {row[1]: row[7] for row in rows[1:]}
+        self.assertEqual(services['Basic'], 'Internet')
+        self.assertEqual(services['Premium'], 'Internet, TV')
+
+
+# =============================================================================
+# TEST 23: Bulk Customer Import
+# =============================================================================
+class BulkCustomerImportTest(BaseTestCase):
+    CSV_HEADER = 'email,first_name,last_name,phone_number,balance,password,street,building,city,region\n'
+
+    def _upload(self, body):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        return SimpleUploadedFile('customers.csv', (self.CSV_HEADER + body).encode('utf-8'), content_type='text/csv')
+
+    def test_bulk_import_reports_row_errors(self):
+        """Test that bulk mode imports valid rows in bulk and reports every invalid row like the row-by-row import."""
+        from api.services.csv_service import CSVService
+        self._create_customer(email='taken@test.com')
+        body = (
+            'bulk1@test.com,Ann,One,+380501111111,10.50,Secret123!,Main St,1,Kyiv,Kyiv\n'
+            'bulk2@test.com,Bob,Two,+380502222222,,,,,,\n'
+            'bad-email,Cid,Three,+380503333333,0,,,,,\n'
+            'bulk3@test.com,Dan,Four,+380502222222,0,,,,,\n'
+            'taken@test.com,Eve,Five,+380505555555,0,,,,,\n'
+            'bulk4@test.com,Fay,Six,+380506666666,0,,Main St,,Kyiv,Kyiv\n'
+            'bulk5@test.com,Gus,Seven,+380507777777,0,,Main St,2,Kyiv,Atlantis\n'
+        )
+
+        created, errors = CSVService.import_customers_bulk(self._upload(body), hash_workers=1)
+
+        self.assertEqual(created, 2)
+        self.assertEqual([error.split(':')[0] for error in errors], ['Row 4', 'Row 5', 'Row 6', 'Row 7', 'Row 8'])
+        self.assertIn('Duplicate phone number', errors[1])
+        self.assertIn('already exists', errors[2])
+
+        customer = Customer.objects.select_related('user').get(user__email='bulk1@test.com')
+        self.assertEqual(customer.balance, Decimal('10.50'))
+        self.assertEqual(customer.status, self.active_status)
+        self.assertTrue(customer.user.check_password('Secret123!'))
+        self.assertEqual(list(customer.user.groups.values_list('name', flat=True)), ['Customer'])
+        self.assertEqual(customer.addresses.get().region, self.region)
+        self.assertFalse(Customer.objects.get(user__email='bulk2@test.com').addresses.exists())
+
+    def test_bulk_import_rejects_out_of_range_values(self):
+        """Test that balances the column cannot hold and database errors become row errors."""
+        from api.services.csv_service import import_customer_rows
+        rows = [
+            {'email': f'range{i}@test.com', 'first_name': 'Range', 'last_name': f'Row{i}',
+             'phone_number': f'+38050123000{i}', 'balance': balance}
+            for i, balance in enumerate(['NaN', 'Infinity', '123456789012', '1.234', '5.00', '6.00'])
+        ]
+        rows[5]['first_name'] = 'X' * 300
+
+        created, errors = import_customer_rows(rows, chunk_size=1, hash_workers=1)
+
+        self.assertEqual(created, 1)
+        self.assertEqual([error.split(':')[0] for error in errors], ['Row 2', 'Row 3', 'Row 4', 'Row 5', 'Row 7'])
+        self.assertIn('Invalid balance NaN', errors[0])
+        self.assertTrue(Customer.objects.filter(user__email='range4@test.com').exists())
+
+    def test_passwords_hashed_in_process_pool(self):
+        """Test that the process pool produces valid, individually salted password hashes."""
+        from django.contrib.auth.hashers import check_password
+        from api.services.csv_service import hash_passwords
+        passwords = [f'Password{i}!' for i in range(6)] + ['Same1!', 'Same1!']
+        hashes = hash_passwords(passwords, workers=2)
+
+        self.assertEqual(len(hashes), len(passwords))
+        self.assertTrue(all(check_password(password, hashed) for password, hashed in zip(passwords, hashes)))
+        self.assertNotEqual(hashes[-1], hashes[-2])
+
+    def test_import_endpoint_bulk_mode(self):
+        """Test that import_csv uses the bulk importer when mode=bulk is passed."""
+        from django.contrib.auth.models import Group
+        manager, _ = self._create_manager()
+        manager.groups.add(Group.objects.get(name='Manager'))
+        client = APIClient()
+        client.force_authenticate(user=manager)
+
+        response = client.post('/api/customers/import_csv/', {
+            'mode': 'bulk',
+            'csv_file': self._upload('endpoint@test.com,Ida,Eight,+380508888888,0,,,,,\n'),
+        }, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['data']['created'], 1)
+
+
+# =============================================================================
+# TEST 24: Background Data Jobs
+# =============================================================================
+class DataJobTest(BaseTestCase):
+    CSV_HEADER = 'email,first_name,last_name,phone_number,balance,password,street,building,city,region\n'
+
+    def setUp(self):
+        import shutil
+        import tempfile
+        from django.test import override_settings
+        self.job_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.job_dir, ignore_errors=True)
+        job_settings = override_settings(DATA_JOB_DIR=self.job_dir, DATA_JOB_CHUNK_SIZE=2)
+        job_settings.enable()
+        self.addCleanup(job_settings.disable)
+
+    def _upload(self, count, start=0):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        body = ''.join(
+            f'job{i}@test.com,Job,Row{i},+38050900{i:04d},0,,,,,\n' for i in range(start, start + count)
+        )
+        return SimpleUploadedFile('customers.csv', (self.CSV_HEADER + body).encode('utf-8'), content_type='text/csv')
+
+    def test_import_job_resumes_from_checkpoint(self):
+        """Test that an import job continues after its last committed chunk without repeating rows."""
+        from api.models import DataJob
+        from api.services.csv_service import import_customer_rows
+        from api.services.data_jobs import create_import_job, run_data_job
+        job = create_import_job('customers', self._upload(5))
+
+        # Simulate a worker that died after committing the first chunk
+        import_customer_rows(
+            [{'email': f'job{i}@test.com', 'first_name': 'Job', 'last_name': f'Row{i}',
+              'phone_number': f'+38050900{i:04d}', 'balance': '0'} for i in range(2)]
+        )
+        DataJob.objects.filter(id=job.id).update(
+            status=DataJob.RUNNING, total_rows=5, processed_rows=2, created_count=2
+        )
+
+        job = run_data_job(job.id)
+
+        self.assertEqual(job.status, DataJob.COMPLETED)
+        self.assertEqual((job.processed_rows, job.created_count, job.errors), (5, 5, []))
+        self.assertEqual(Customer.objects.filter(user__email__startswith='job').count(), 5)
+
+    def test_export_job_discards_uncheckpointed_output(self):
+        """Test that a resumed export drops rows written after the checkpoint and writes each row once."""
+        import csv
+        import os
+        from api.models import DataJob
+        from api.services.data_jobs import create_export_job, run_data_job
+        for i in range(5):
+            self._create_customer(email=f'export{i}@test.com')
+        job = create_export_job('customers')
+        run_data_job(job.id)
+        complete = open(DataJob.objects.get(id=job.id).result_file, encoding='utf-8').read()
+
+        # Rewind the job to its second checkpoint and leave a torn row behind it
+        job = create_export_job('customers')
+        first = run_data_job(job.id)
+        lines = open(first.result_file, encoding='utf-8').read().splitlines(keepends=True)
+        kept = ''.join(lines[:5])
+        part_path = first.result_file + '.part'
+        os.replace(first.result_file, part_path)
+        with open(part_path, 'w', encoding='utf-8') as part:
+            part.write(kept + 'export4@test.com,Tor')
+        last_id = Customer.objects.order_by('pk').values_list('pk', flat=True)[3]
+        DataJob.objects.filter(id=job.id).update(
+            status=DataJob.RUNNING, processed_rows=4, result_file='',
+            checkpoint={'last_id': last_id, 'offset': len(kept.encode('utf-8'))}
+        )
+
+        job = run_data_job(job.id)
+
+        resumed = open(job.result_file, encoding='utf-8').read()
+        self.assertEqual(resumed, complete)
+        rows = list(csv.reader(resumed.lstrip('\ufeff').splitlines()))
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(job.processed_rows, 5)
+
+    def test_async_import_and_download_endpoints(self):
+        """Test that async imports and exports return 202 with a job that can be polled and downloaded."""
+        from django.contrib.auth.models import Group
+        manager, _ = self._create_manager()
+        manager.groups.add(Group.objects.get(name='Manager'))
+        client = APIClient()
+        client.force_authenticate(user=manager)
+
+        with patch('api.tasks.data_jobs.run_data_job_task.delay') as delay, \
+                self.captureOnCommitCallbacks(execute=True):
+            response = client.post('/api/customers/import_csv/', {
+                'async': '1', 'csv_file': self._upload(3),
+            }, format='multipart')
+        self.assertEqual(response.status_code, 202)
+        job_id = response.data['data']['id']
+        delay.assert_called_once_with(job_id)
+
+        from api.services.data_jobs import run_data_job
+        run_data_job(job_id)
+        response = client.get(f'/api/data-jobs/{job_id}/')
+        self.assertEqual(response.data['data']['status'], 'completed')
+        self.assertEqual(response.data['data']['created_count'], 3)
+        self.assertFalse(response.data['data']['has_result'])
+        self.assertEqual(client.get(f'/api/data-jobs/{job_id}/download/').status_code, 404)
+
+        with patch('api.tasks.data_jobs.run_data_job_task.delay'), self.captureOnCommitCallbacks(execute=True):
+            response = client.get('/api/customers/export_csv/', {'async': '1'})
+        self.assertEqual(response.status_code, 202)
+        export_id = response.data['data']['id']
+        run_data_job(export_id)
+        response = client.get(f'/api/data-jobs/{export_id}/download/')
+        self.assertEqual(response.status_code, 200)
+        body = b''.join(response.streaming_content).decode('utf-8')
+        self.assertIn('job2@test.com', body)
+
+        # The same filters as the synchronous export apply to the job
+        with patch('api.tasks.data_jobs.run_data_job_task.delay'), self.captureOnCommitCallbacks(execute=True):
+            response = client.get('/api/customers/export_csv/', {'async': '1', 'search': 'job2@'})
+        filtered_id = response.data['data']['id']
+        self.assertEqual(response.data['data']['parameters'], {'search': ['job2@']})
+        run_data_job(filtered_id)
+        body = b''.join(client.get(f'/api/data-jobs/{filtered_id}/download/').streaming_content).decode('utf-8')
+        sync_body = b''.join(client.get('/api/customers/export_csv/', {'search': 'job2@'}).streaming_content).decode('utf-8')
+        self.assertEqual(body, sync_body)
+        self.assertIn('job2@test.com', body)
+        self.assertNotIn('job1@test.com', body)
+
+
+# =============================================================================
+# TEST 25: PDF Rendering
+# =============================================================================
+class PDFRenderingTest(BaseTestCase):
+    def setUp(self):
+        import shutil
+        import tempfile
+        from django.test import override_settings
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir, ignore_errors=True)
+        cache_settings = override_settings(PDF_CACHE_DIR=self.cache_dir, DATA_JOB_DIR=f'{self.cache_dir}/jobs')
+        cache_settings.enable()
+        self.addCleanup(cache_settings.disable)
+
+        self.contract = self._create_contract(self._create_customer())
+        self.invoices = [
+            Invoice.objects.create(
+                contract=self.contract, amount=Decimal('100.00') + i,
+                due_date=now() + timedelta(days=10), description='Monthly fee'
+            )
+            for i in range(5)
+        ]
+
+    def test_fonts_and_styles_set_up_once(self):
+        """Test that fonts are registered and styles built once per process, not per document."""
+        from api.services import pdf_service
+        pdf_service.setup_fonts.cache_clear()
+        pdf_service.get_styles.cache_clear()
+        self.addCleanup(pdf_service.get_styles.cache_clear)
+        self.addCleanup(pdf_service.setup_fonts.cache_clear)
+
+        with patch('api.services.pdf_service.TTFont', side_effect=OSError('no font')) as ttfont:
+            for invoice in self.invoices[:3]:
+                pdf_service.generate_invoice_pdf(invoice)
+            pdf_service.generate_contract_pdf(self.contract)
+        self.assertEqual(ttfont.call_count, 1)
+        self.assertIs(pdf_service.get_styles(), pdf_service.get_styles())
+
+    def test_rendered_pdf_cached_until_object_changes(self):
+        """Test that repeat downloads come from disk and an update renders a new version."""
+        import os
+        from api.services import pdf_service
+        invoice = self.invoices[0]
+        with patch('api.services.pdf_service.generate_invoice_pdf', wraps=pdf_service.generate_invoice_pdf) as render:
+            first = pdf_service.get_invoice_pdf(invoice).getvalue()
+            second = pdf_service.get_invoice_pdf(invoice).getvalue()
+            self.assertEqual(render.call_count, 1)
+            self.assertEqual(first, second)
+
+            invoice.status = 'paid'
+            invoice.save()
+            pdf_service.get_invoice_pdf(invoice)
+            self.assertEqual(render.call_count, 2)
+        self.assertEqual(len(os.listdir(os.path.join(self.cache_dir, 'invoices'))), 1)
+
+    def test_batch_render_zip_and_combined_document(self):
+        """Test that a batch renders every invoice in the pool into a zip, or into one page per invoice."""
+        import re
+        import zipfile
+        from api.services.pdf_service import generate_invoices_zip, generate_invoices_document
+        invoices = list(Invoice.objects.select_related('contract__customer__user').order_by('id'))
+
+        with zipfile.ZipFile(generate_invoices_zip(invoices, workers=2)) as archive:
+            names = archive.namelist()
+            self.assertEqual(names, [f'invoice_{invoice.id}.pdf' for invoice in invoices])
+            self.assertTrue(all(archive.read(name).startswith(b'%PDF') for name in names))
+
+        document = generate_invoices_document(invoices).getvalue()
+        self.assertEqual(len(re.findall(rb'/Type /Page\b(?!s)', document)), len(invoices))
+
+    def test_pdf_bundle_endpoint(self):
+        """Test that managers get the invoices of a month as a zip or one PDF from a background job."""
+        import zipfile
+        import io
+        from django.contrib.auth.models import Group
+        from api.services.data_jobs import run_data_job
+        manager, _ = self._create_manager()
+        manager.groups.add(Group.objects.get(name='Manager'))
+        client = APIClient()
+        client.force_authenticate(user=manager)
+        month = now().strftime('%Y-%m')
+
+        with patch('api.tasks.data_jobs.run_data_job_task.delay') as delay, \
+                self.captureOnCommitCallbacks(execute=True):
+            response = client.get('/api/invoices/pdf_bundle/')
+        self.assertEqual(response.status_code, 202)
+        job = response.data['data']
+        delay.assert_called_once_with(job['id'])
+        self.assertEqual(job['parameters'], {'month': [month]})
+
+        run_data_job(job['id'])
+        self.assertEqual(client.get(f'/api/data-jobs/{job["id"]}/').data['data']['processed_rows'], 5)
+        response = client.get(job['download_url'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        with zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content))) as archive:
+            self.assertEqual(len(archive.namelist()), 5)
+
+        with patch('api.tasks.data_jobs.run_data_job_task.delay'), self.captureOnCommitCallbacks(execute=True):
+            response = client.get('/api/invoices/pdf_bundle/', {'month': month, 'combine': '1'})
+        run_data_job(response.data['data']['id'])
+        response = client.get(response.data['data']['download_url'])
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+        self.assertEqual(client.get('/api/invoices/pdf_bundle/', {'month': 'May'}).status_code, 400)
+
+
+# =============================================================================
+# TEST 26: Conditional PDF Downloads
+# =============================================================================
+class ConditionalPDFDownloadTest(BaseTestCase):
+    def setUp(self):
+        import shutil
+        import tempfile
+        from django.test import override_settings
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir, ignore_errors=True)
+        cache_settings = override_settings(PDF_CACHE_DIR=self.cache_dir)
+        cache_settings.enable()
+        self.addCleanup(cache_settings.disable)
+
+        self.customer = self._create_customer()
+        self.contract = self._create_contract(self.customer)
+        self.invoice = Invoice.objects.create(
+            contract=self.contract, amount=Decimal('200.00'),
+            due_date=now() + timedelta(days=10), description='Monthly fee'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.customer.user)
+
+    def test_if_none_match_returns_304_without_rendering(self):
+        """Test that a matching ETag is answered with 304 and a changed invoice gets a new document."""
+        from api.services import pdf_service
+        url = f'/api/invoices/{self.invoice.id}/pdf/'
+        with patch('api.services.pdf_service.generate_invoice_pdf', wraps=pdf_service.generate_invoice_pdf) as render:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+            etag = response['ETag']
+
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response['ETag'], etag)
+            self.assertEqual(self.client.get(url).status_code, 200)
+            self.assertEqual(render.call_count, 1)
+
+            self.invoice.amount = Decimal('250.00')
+            self.invoice.save()
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response['ETag'], etag)
+            self.assertEqual(render.call_count, 2)
+
+    def test_etag_follows_related_data(self):
+        """Test that contract and receipt ETags change with the customer data printed on them."""
+        payment = Payment.objects.create(
+            customer=self.customer, invoice=self.invoice, amount=Decimal('200.00'), method=self.payment_method
+        )
+        contract_etag = self.client.get(f'/api/contracts/{self.contract.id}/pdf/')['ETag']
+        response = self.client.get(f'/api/payments/{payment.id}/receipt/')
+        self.assertEqual(response.status_code, 200)
+        receipt_etag = response['ETag']
+
+        self.customer.user.last_name = 'Renamed'
+        self.customer.user.save()
+        self.assertNotEqual(self.client.get(f'/api/contracts/{self.contract.id}/pdf/')['ETag'], contract_etag)
+        self.assertNotEqual(self.client.get(f'/api/payments/{payment.id}/receipt/')['ETag'], receipt_etag)
+
+    def test_contract_pdf_prints_only_cached_values(self):
+        """Test that the contract's printed date is part of its ETag instead of the date of the first render."""
+        from api.services.pdf_service import document_etag
+        url = f'/api/contracts/{self.contract.id}/pdf/'
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url)['ETag'], etag)
+
+        Contract.objects.filter(id=self.contract.id).update(updated_at=now() - timedelta(days=3))
+        self.contract.refresh_from_db()
+        response = self.client.get(url)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response['ETag'].strip('"'), document_etag('contracts', self.contract))
+
+
+# =============================================================================
+# TEST 27: Bulk Usage Ingestion
+# =============================================================================
+class UsageIngestTest(BaseTestCase):
+    def setUp(self):
+        self.customer = self._create_customer()
+        self.contract = self._create_contract(self.customer)
+        self.other = self._create_contract(self._create_customer(email='other@test.com'))
+        self.day = now().date() - timedelta(days=1)
+
+    def test_copy_merge_upserts_and_updates_rollups(self):
+        """Test that staged rows are inserted or updated in place, last record winning, with rollups rebuilt."""
+        from api.models import DailyCustomerUsage, MonthlyUsage
+        from api.services.usage_ingest import ingest_usage
+        NetworkUsage.objects.create(contract=self.contract, date=self.day, download_gb=1, upload_gb=1)
+
+        result = ingest_usage([
+            (self.contract.id, self.day, Decimal('3.00'), Decimal('0.50')),
+            (self.other.id, self.day, Decimal('2.00'), Decimal('1.00')),
+            (self.other.id, self.day, Decimal('4.00'), Decimal('1.50')),
+            (999999, self.day, Decimal('1.00'), Decimal('1.00')),
+        ])
+
+        self.assertEqual((result['rows'], result['inserted'], result['updated'], result['skipped']), (4, 1, 1, 1))
+        self.assertGreater(result['rows_per_second'], 0)
+        self.assertEqual(NetworkUsage.objects.get(contract=self.contract, date=self.day).download_gb, Decimal('3.00'))
+        self.assertEqual(NetworkUsage.objects.get(contract=self.other, date=self.day).download_gb, Decimal('4.00'))
+        self.assertEqual(DailyCustomerUsage.objects.get(date=self.day, customer=self.customer).download_gb, Decimal('3.00'))
+        self.assertEqual(MonthlyUsage.objects.get(month=self.day.replace(day=1)).download_gb, Decimal('7.00'))
+
+    def test_command_loads_csv_and_jsonl_files(self):
+        """Test that get_network_usage loads CSV and JSON-lines files and reports throughput."""
+        import io
+        import json
+        import os
+        import shutil
+        import tempfile
+        from django.core.management import call_command
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+
+        csv_path = os.path.join(directory, 'usage.csv')
+        with open(csv_path, 'w') as usage_file:
+            usage_file.write(f'contract_id,date,download_gb,upload_gb\n{self.contract.id},{self.day},5.25,1.75\n')
+        jsonl_path = os.path.join(directory, 'usage.jsonl')
+        with open(jsonl_path, 'w') as usage_file:
+            usage_file.write(json.dumps({'contract_id': self.other.id, 'date': str(self.day), 'download_gb': 2, 'upload_gb': 1}) + '\n')
+
+        out = io.StringIO()
+        call_command('get_network_usage', file=csv_path, stdout=out)
+        call_command('get_network_usage', file=jsonl_path, stdout=out)
+        self.assertIn('rows/s', out.getvalue())
+        self.assertEqual(NetworkUsage.objects.get(contract=self.contract, date=self.day).upload_gb, Decimal('1.75'))
+        self.assertEqual(NetworkUsage.objects.get(contract=self.other, date=self.day).download_gb, Decimal('2.00'))
+
+        call_command('get_network_usage', date=str(self.day), stdout=out)
+        self.assertEqual(NetworkUsage.objects.filter(date=self.day).count(), 2)
+
+
+# =============================================================================
+# TEST 28: Usage Collector
+# =============================================================================
+class UsageCollectorTest(BaseTestCase):
+    def setUp(self):
+        from django.test import override_settings
+        from api.services.usage_collector import collector
+        collector_settings = override_settings(USAGE_COLLECTOR_KEY='nas-key', USAGE_COLLECTOR_FLUSH_INTERVAL=0)
+        collector_settings.enable()
+        self.addCleanup(collector_settings.disable)
+        self.collector = collector
+        self.addCleanup(collector._take, final=True)
+
+        self.customer = self._create_customer()
+        self.contract = self._create_contract(self.customer)
+        self.client = APIClient()
+
+    def _post(self, body, content_type='application/x-ndjson', **headers):
+        return self.client.generic('POST', '/api/usage/collect/', body, content_type=content_type, **headers)
+
+    def test_gzipped_json_lines_are_aggregated_and_flushed(self):
+        """Test that compressed samples are summed per contract-day and added to usage and rollups on flush."""
+        import gzip
+        import json
+        from api.models import DailyCustomerUsage, MonthlyUsage
+        day = now().date()
+        NetworkUsage.objects.create(contract=self.contract, date=day, download_gb=Decimal('1.00'), upload_gb=0)
+        timestamp = now().replace(hour=12).isoformat()
+        samples = [
+            {'contract_id': self.contract.id, 'timestamp': timestamp, 'download_bytes': 1_004_000_000, 'upload_bytes': 6_000_000}
+            for _ in range(3)
+        ]
+        body = gzip.compress(('\n'.join(json.dumps(sample) for sample in samples) + '\n{broken\n').encode())
+
+        response = self._post(body, HTTP_CONTENT_ENCODING='gzip', HTTP_X_API_KEY='nas-key')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual((response.data['data']['accepted'], response.data['data']['rejected']), (3, 1))
+        self.assertFalse(NetworkUsage.objects.filter(date=day, download_gb__gt=1).exists())
+
+        self.assertEqual(self.collector.flush(), 1)
+        usage = NetworkUsage.objects.get(contract=self.contract, date=day)
+        # 3.012 GB down and 0.018 GB up: whole hundredths are written, the rest stays buffered
+        self.assertEqual((usage.download_gb, usage.upload_gb), (Decimal('4.01'), Decimal('0.01')))
+        self.assertEqual(self.collector.pending, 1)
+        self.assertEqual(DailyCustomerUsage.objects.get(date=day, customer=self.customer).download_gb, Decimal('4.01'))
+        self.assertEqual(MonthlyUsage.objects.get(month=day.replace(day=1)).upload_gb, Decimal('0.01'))
+
+        self.collector.flush(final=True)
+        self.assertEqual(NetworkUsage.objects.get(contract=self.contract, date=day).download_gb, Decimal('4.02'))
+        self.assertEqual(self.collector.pending, 0)
+
+    def test_csv_batches_and_authentication(self):
+        """Test that CSV batches need the collector key and unknown contracts are dropped on flush."""
+        timestamp = int(now().timestamp())
+        body = (
+            'contract_id,timestamp,download_bytes,upload_bytes\n'
+            f'{self.contract.id},{timestamp},250000000,50000000\n'
+            f'999999,{timestamp},10000000,0\n'
+            f'{self.contract.id},{timestamp},-5,0\n'
+        )
+        self.assertIn(self._post(body, content_type='text/csv').status_code, (401, 403))
+        self.assertIn(self._post(body, content_type='text/csv', HTTP_X_API_KEY='wrong').status_code, (401, 403))
+
+        response = self._post(body, content_type='text/csv', HTTP_X_API_KEY='nas-key')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['data']['accepted'], 2)
+        self.assertIn('Line 4', response.data['data']['errors'][0])
+
+        self.assertEqual(self.collector.flush(), 1)
+        usage = NetworkUsage.objects.get(contract=self.contract)
+        self.assertEqual((usage.download_gb, usage.upload_gb), (Decimal('0.25'), Decimal('0.05')))
+
+
+# =============================================================================
+# TEST 29: Monthly Partitioning
+# =============================================================================
+class PartitioningTest(BaseTestCase):
+    def setUp(self):
+        from api.services.partitioning import add_months
+        self.customer = self._create_customer()
+        self.contract = self._create_contract(self.customer)
+        self.this_month = now().date().replace(day=1)
+        self.next_month = add_months(self.this_month, 1)
+
+    def _partition_of(self, model, pk):
+        from django.db import connection
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT tableoid::regclass::text FROM {model._meta.db_table} WHERE id = %s', [pk])
+            return cursor.fetchone()[0]
+
+    def test_tables_are_partitioned_by_month(self):
+        """Test that migrations leave both tables partitioned and rows are routed to their month."""
+        usage = NetworkUsage.objects.create(contract=self.contract, date=self.this_month, download_gb=1, upload_gb=1)
+        self.assertEqual(self._partition_of(NetworkUsage, usage.id), f'api_networkusage_p{self.this_month:%Y_%m}')
+        transaction = record_transaction(self.customer, Decimal('10.00'), 'topup', 'Top-up')
+        self.assertEqual(self._partition_of(BalanceTransaction, transaction.id), f'api_balancetransaction_p{self.this_month:%Y_%m}')
+
+        plan = NetworkUsage.objects.filter(date__gte=self.this_month, date__lt=self.next_month).explain()
+        self.assertIn(f'p{self.this_month:%Y_%m}', plan)
+        self.assertNotIn(f'p{self.next_month:%Y_%m}', plan)
+        self.assertNotIn('default', plan)
+
+    def test_create_partitions_moves_rows_out_of_default(self):
+        """Test that creating a partition takes over the rows the default partition held for its month."""
+        from api.services.partitioning import add_months, create_partitions
+        far_month = add_months(self.this_month, 6)
+        usage = NetworkUsage.objects.create(contract=self.contract, date=far_month, download_gb=2, upload_gb=0)
+        self.assertEqual(self._partition_of(NetworkUsage, usage.id), 'api_networkusage_default')
+
+        created = create_partitions('NetworkUsage', months_ahead=6)
+        self.assertIn(f'api_networkusage_p{far_month:%Y_%m}', created)
+        self.assertEqual(self._partition_of(NetworkUsage, usage.id), f'api_networkusage_p{far_month:%Y_%m}')
+        self.assertEqual(create_partitions('NetworkUsage', months_ahead=6), [])
+
+    def test_detach_partitions_archives_old_months(self):
+        """Test that detached partitions are archived to CSV and their rows leave the table."""
+        import csv
+        import gzip
+        import os
+        import shutil
+        import tempfile
+        from api.services.partitioning import detach_partitions
+        archive_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, archive_dir, ignore_errors=True)
+        NetworkUsage.objects.create(contract=self.contract, date=self.this_month, download_gb=3, upload_gb=1)
+
+        detached = detach_partitions('NetworkUsage', self.next_month, archive_dir=archive_dir)
+
+        name = f'api_networkusage_p{self.this_month:%Y_%m}'
+        self.assertEqual(detached, [name])
+        self.assertFalse(NetworkUsage.objects.filter(date=self.this_month).exists())
+        with gzip.open(os.path.join(archive_dir, f'{name}.csv.gz'), 'rt') as archive:
+            rows = list(csv.DictReader(archive))
+        self.assertEqual([(row['contract_id'], row['download_gb']) for row in rows], [(str(self.contract.id), '3.00')])
+
+    def test_transaction_history_date_bounds(self):
+        """Test that the transaction history can be limited to a date range."""
+        record_transaction(self.customer, Decimal('10.00'), 'topup', 'Top-up')
+        client = APIClient()
+        client.force_authenticate(user=self.customer.user)
+        url = f'/api/customers/{self.customer.id}/transactions/'
+        today = now().date()
+
+        response = client.get(url, {'start_date': str(today), 'end_date': str(today)})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['data']['results']), 1)
+        response = client.get(url, {'end_date': str(today - timedelta(days=1))})
+        self.assertEqual(len(response.data['data']['results']), 0)
+        self.assertEqual(client.get(url, {'start_date': '2026-13-01'}).status_code, 400)
+
+
+# =============================================================================
+# TEST 30: Columnar Usage Store
+# =============================================================================
+class UsageStoreTest(BaseTestCase):
+    def setUp(self):
+        import shutil
+        import tempfile
+        from django.test import override_settings
+        self.store_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.store_dir, ignore_errors=True)
+        store_settings = override_settings(USAGE_STORE_DIR=self.store_dir, USAGE_STORE_DAYS=120)
+        store_settings.enable()
+        self.addCleanup(store_settings.disable)
+
+        self.today = now().date()
+        self.customer = self._create_customer()
+        self.contract = self._create_contract(self.customer, tariff=self.tariff_premium)
+        self.idle_contract = self._create_contract(self._create_customer(email='idle@test.com'))
+        NetworkUsage.objects.bulk_create([
+            NetworkUsage(
+                contract=self.contract, date=self.today - timedelta(days=i),
+                download_gb=Decimal('4.25'), upload_gb=Decimal(i % 3)
+            )
+            for i in range(0, 100, 2)
+        ])
+
+    def test_build_and_zero_copy_slices(self):
+        """Test that the loader stores exact cents of the contracts with usage and slices are views of the mapped files."""
+        import numpy as np
+        from api.services.usage_store import MISSING, UsageStore, build_usage_store
+        build_usage_store()
+        store = UsageStore.open()
+        self.assertEqual((store.start, store.end), (self.today - timedelta(days=119), self.today))
+        self.assertEqual(store.contract_ids.tolist(), [self.contract.id])
+        self.assertEqual(store.download.dtype, np.int32)
+
+        download, upload = store.series(self.contract.id, self.today - timedelta(days=4), self.today)
+        self.assertFalse(download.flags.owndata)
+        self.assertTrue(np.shares_memory(download, store.download))
+        self.assertEqual(download.tolist(), [425, MISSING, 425, MISSING, 425])
+        self.assertEqual(upload.tolist(), [100, MISSING, 200, MISSING, 0])
+        self.assertIsNone(store.series(self.idle_contract.id))
+        self.assertIsNone(store.series(10 ** 9))
+
+    def test_build_leaves_concurrent_builds_alone(self):
+        """Test that a build removes older finished builds but not one another process is still writing."""
+        import os
+        from api.services.usage_store import build_usage_store
+        first = build_usage_store()
+        writing = os.path.join(self.store_dir, '00000000000000000001')
+        os.makedirs(writing)
+
+        second = build_usage_store()
+        self.assertNotEqual(second.path, first.path)
+        self.assertFalse(os.path.exists(first.path))
+        self.assertTrue(os.path.exists(writing))
+
+    def test_averages_match_network_usage(self):
+        """Test that store averages match the NetworkUsage aggregation they replace."""
+        import numpy as np
+        from api.services.usage_store import build_usage_store, daily_usage_averages
+        start = self.today - timedelta(days=90)
+        NetworkUsage.objects.bulk_create([
+            NetworkUsage(
+                contract=self.idle_contract, date=self.today - timedelta(days=i),
+                download_gb=Decimal('12.34'), upload_gb=Decimal('0.07')
+            )
+            for i in range(3)
+        ])
+        expected = daily_usage_averages(start, self.today)
+
+        build_usage_store()
+        ids, days, averages = daily_usage_averages(start, self.today)
+        self.assertEqual(ids.tolist(), sorted([self.contract.id, self.idle_contract.id]))
+        self.assertEqual(days.tolist(), expected[1].tolist())
+        np.testing.assert_array_equal(averages, expected[2])
+        self.assertEqual(daily_usage_averages(start, self.today, [self.idle_contract.id])[2].tolist(), [12.41])
+        self.assertEqual(len(daily_usage_averages(start, self.today - timedelta(days=3), [self.idle_contract.id])[0]), 0)
+
+    def test_recommendations_and_analytics_read_the_store(self):
+        """Test that recommendation and analytics runs average the store snapshot."""
+        from api.services.analytics import get_network_usage_stats
+        from api.services.recommendations import generate_tariff_recommendations
+        from api.services.usage_store import build_usage_store
+        lite = Tariff.objects.create(
+            name='Lite', price=Decimal('150.00'), description='Lite plan',
+            speed_mbps=150, traffic_limit_gb=300, is_active=True
+        )
+        build_usage_store()
+        NetworkUsage.objects.all().delete()
+
+        recommendation = generate_tariff_recommendations([self.customer])[0]
+        self.assertEqual(recommendation.reason, 'underusing')
+        self.assertEqual(recommendation.recommended_tariff, lite)
+        averages = get_network_usage_stats()['contract_averages']
+        self.assertEqual(averages['contracts'], 1)
+        self.assertAlmostEqual(averages['mean_daily_gb'], 5.25, places=4)
+
+
+# =============================================================================
+# TEST 31: Balance Ledger
+# =============================================================================
+class BalanceLedgerTest(BaseTestCase):
+    def setUp(self):
+        self.first = self._create_customer(email='first@test.com', balance=Decimal('0'))
+        self.second = self._create_customer(email='second@test.com', balance=Decimal('0'))
+
+    def test_batched_posting_keeps_running_balances(self):
+        """Test that a batch applies its entries in order and locks each customer once."""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from api.services.ledger import post_transactions
+        entries = [
+            (self.first.id, Decimal('100.00'), 'topup', 'Top-up'),
+            (self.second.id, Decimal('-20.00'), 'charge', 'Fee'),
+            (self.first.id, Decimal('-30.00'), 'charge', 'Fee'),
+            (self.second.id, Decimal('50.00'), 'topup', 'Top-up'),
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            records = post_transactions(entries)
+
+        self.assertEqual(len([q for q in queries if 'FOR UPDATE' in q['sql']]), 1)
+        self.assertEqual([r.balance_after for r in records], [Decimal('100.00'), Decimal('-20.00'), Decimal('70.00'), Decimal('30.00')])
+        self.first.refresh_from_db()
+        self.second.refresh_from_db()
+        self.assertEqual((self.first.balance, self.second.balance), (Decimal('70.00'), Decimal('30.00')))
+        self.assertIsNone(self.second.balance_negative_since)
+        self.assertEqual(BalanceTransaction.objects.filter(customer=self.first).count(), 2)
+
+    def test_balance_rebuilt_from_snapshot_and_tail(self):
+        """Test that a snapshot stands in for the ledger before it."""
+        from api.services.ledger import ledger_balance, take_balance_snapshots
+        record_transaction(self.first, Decimal('80.00'), 'topup', 'Top-up')
+        record_transaction(self.first, Decimal('-15.50'), 'charge', 'Fee')
+        as_of = now()
+        self.assertEqual(take_balance_snapshots(self.first.id, self.second.id, as_of=as_of), 1)
+        self.assertEqual(take_balance_snapshots(self.first.id, self.second.id, as_of=as_of), 0)
+        BalanceTransaction.objects.filter(customer=self.first).update(created_at=as_of - timedelta(days=1))
+        record_transaction(self.first, Decimal('10.00'), 'topup', 'Top-up')
+
+        self.assertEqual(ledger_balance(self.first), Decimal('74.50'))
+        # Transactions behind the snapshot are no longer read
+        BalanceTransaction.objects.filter(customer=self.first, created_at__lt=as_of).delete()
+        self.assertEqual(ledger_balance(self.first), Decimal('74.50'))
+        self.assertEqual(ledger_balance(self.first, as_of=as_of), Decimal('64.50'))
+
+    def test_reconcile_command_reports_mismatches(self):
+        """Test that reconciliation passes for ledger balances and reports drifted ones."""
+        from io import StringIO
+        from django.core.management import call_command
+        from django.core.management.base import CommandError
+        record_transaction(self.first, Decimal('25.00'), 'topup', 'Top-up')
+        out = StringIO()
+        call_command('reconcile_balances', stdout=out)
+        self.assertIn('Checked 2 customers', out.getvalue())
+
+        Customer.objects.filter(id=self.second.id).update(balance=Decimal('5.00'))
+        err = StringIO()
+        with self.assertRaisesMessage(CommandError, '1 balances do not match'):
+            call_command('reconcile_balances', stderr=err)
+        self.assertIn(f'Customer #{self.second.id}: balance 5.00₴, ledger 0₴', err.getvalue())
@@ -1,8 +1,8 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from rest_framework_simplejwt.views import TokenObtainPairView
 
-from .views import auth, customer, employee, billing, support, infrastructure, contract, recommendations, notifications, dashboard
+from .views import auth, customer, employee, billing, support, infrastructure, contract, recommendations, notifications, dashboard, jobs
 
 # Create a router and register our viewsets
 router = DefaultRouter()
@@ -42,19 +42,23 @@ router.register(r'contracts', contract.ContractViewSet)
 # Automation
 router.register(r'recommendations', recommendations.TariffRecommendationViewSet)
 router.register(r'notifications', notifications.NotificationViewSet)
+router.register(r'data-jobs', jobs.DataJobViewSet)
 
 urlpatterns = [
     # Authentication views
     path('auth/register/', auth.UserRegistrationView.as_view(), name='user-registration'),
     path('auth/user/', auth.CurrentUserView.as_view(), name='current-user'),
     path('auth/token/', auth.UserLoginView.as_view(), name='token_obtain_pair'),
-    path('auth/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('auth/token/refresh/', auth.RoleTokenRefreshView.as_view(), name='token_refresh'),
     
     # Include the router URLs
     path('', include(router.urls)),
     
     # Dashboard
     path('dashboard/manager/', dashboard.ManagerDashboardView.as_view(), name='manager-dashboard'),
+
+    # Usage counters pushed by the NAS exporters
+    path('usage/collect/', infrastructure.UsageCollectorView.as_view(), name='usage-collect'),
     
     # Include login URLs for the browsable API
     path('auth/', include('rest_framework.urls', namespace='rest_framework')),
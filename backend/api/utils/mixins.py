@@ -20,3 +20,32 @@ class StandardResponseMixin:
             'data' in data and 
             'error' in data
         )
+
+
+class PDFDownloadMixin:
+    """
+    Mixin for ViewSets serving documents from the PDF cache (see
+    services.pdf_service) with an ETag, answering a matching
+    If-None-Match with 304 Not Modified.
+    """
+    def pdf_response(self, request, kind, obj, filename):
+        from django.http import FileResponse, HttpResponseNotModified
+        from django.utils.http import parse_etags, quote_etag
+        from ..services.pdf_service import document_etag, get_pdf_file
+
+        etag = document_etag(kind, obj)
+        quoted = quote_etag(etag)
+        client_etags = parse_etags(request.headers.get('If-None-Match', ''))
+        if '*' in client_etags or quoted in [tag.removeprefix('W/') for tag in client_etags]:
+            response = HttpResponseNotModified()
+        else:
+            response = FileResponse(
+                open(get_pdf_file(kind, obj, etag), 'rb'),
+                as_attachment=True,
+                filename=filename,
+                content_type='application/pdf'
+            )
+        response['ETag'] = quoted
+        # Documents are per customer; clients revalidate on every download
+        response['Cache-Control'] = 'private, no-cache'
+        return response
@@ -1,6 +1,150 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import json
+from django.core.exceptions import FieldDoesNotExist
+from django.db import connections
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def estimate_count(queryset):
+    """
+    Row count estimated by the PostgreSQL planner, without scanning the rows.
+    """
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class KeysetPagination(BasePagination):
+    """
+    Forward-only cursor pagination on (ordering field, pk).
+    Each page is a range scan that starts after the last row of the previous
+    page, so deep pages cost the same as the first one and no COUNT(*) runs
+    unless the client asks for ?count=exact or ?count=estimate.
+
+    The ordering field is the view's `keyset_ordering` or the first ordering
+    of the queryset; it must be a field of the model itself.
+    """
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        field, descending = self.get_ordering(queryset, view)
+        direction = '-' if descending else ''
+        queryset = queryset.order_by(f'{direction}{field.name}', f'{direction}pk')
+
+        self.count = self.get_count(queryset, request)
+
+        position = self.decode_cursor(request, field)
+        if position is not None:
+            value, pk = position
+            lookup = 'lt' if descending else 'gt'
+            queryset = queryset.filter(
+                Q(**{f'{field.name}__{lookup}': value}) |
+                Q(**{field.name: value, f'pk__{lookup}': pk})
+            )
+
+        rows = list(queryset[:self.page_size + 1])
+        self.next_position = None
+        if len(rows) > self.page_size:
+            rows = rows[:self.page_size]
+            last = rows[-1]
+            self.next_position = (field.value_to_string(last), last.pk)
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response({
+            'count': self.count,
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_page_size(self, request):
+        try:
+            return _positive_int(
+                request.query_params[self.page_size_query_param],
+                strict=True,
+                cutoff=self.max_page_size
+            )
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def get_ordering(self, queryset, view):
+        ordering = getattr(view, 'keyset_ordering', None) or next(
+            iter(queryset.query.order_by or queryset.model._meta.ordering or ['-pk'])
+        )
+        if not isinstance(ordering, str):
+            # Expression orderings (F(...).desc() etc.) are not resumable either
+            ordering = '-pk'
+        descending = ordering.startswith('-')
+        name = ordering.lstrip('-')
+        opts = queryset.model._meta
+        try:
+            field = opts.pk if name == 'pk' else opts.get_field(name)
+        except FieldDoesNotExist:
+            field = None
+        if field is None or not field.concrete or '__' in name:
+            # Orderings across relations cannot be resumed from a row, fall back to the primary key
+            field = opts.pk
+        return field, descending
+
+    def get_count(self, queryset, request):
+        mode = request.query_params.get(self.count_query_param)
+        if mode == 'exact':
+            return queryset.count()
+        if mode == 'estimate':
+            return estimate_count(queryset)
+        return None
+
+    def decode_cursor(self, request, field):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            value, pk = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            return field.to_python(value), int(pk)
+        except Exception:
+            raise NotFound('Invalid cursor')
+
+    def encode_cursor(self, position):
+        return base64.urlsafe_b64encode(json.dumps(position).encode('utf-8')).decode('ascii')
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_position))
+
 
 class StandardResultsSetPagination(PageNumberPagination):
+    """
+    Page-number pagination. Passing ?cursor= (empty for the first page)
+    switches the request to KeysetPagination.
+    """
     page_size = 10
     page_size_query_param = 'page_size'
     max_page_size = 100
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if KeysetPagination.cursor_query_param in request.query_params:
+            self.keyset = KeysetPagination()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -1,12 +1,15 @@
+import hmac
+from django.conf import settings
 from rest_framework import permissions
+from .roles import get_roles
 
 class IsManager(permissions.BasePermission):
     def has_permission(self, request, view):
-        return request.user.is_authenticated and request.user.groups.filter(name='Manager').exists()
+        return get_roles(request).in_group('Manager')
 
 class IsSupport(permissions.BasePermission):
     def has_permission(self, request, view):
-        return request.user.is_authenticated and request.user.groups.filter(name='Support').exists()
+        return get_roles(request).in_group('Support')
 
 class IsAdmin(permissions.BasePermission):
     def has_permission(self, request, view):
@@ -14,7 +17,7 @@ class IsAdmin(permissions.BasePermission):
 
 class IsTechnician(permissions.BasePermission):
     def has_permission(self, request, view):
-        return request.user.is_authenticated and request.user.groups.filter(name='Technician').exists()
+        return get_roles(request).in_group('Technician')
 
 class IsCustomer(permissions.BasePermission):
     def has_permission(self, request, view):
@@ -35,10 +38,7 @@ class IsManagerOrAdmin(permissions.BasePermission):
     def has_permission(self, request, view):
         if not (request.user and request.user.is_authenticated):
             return False
-        return (
-            request.user.is_superuser or 
-            request.user.groups.filter(name__in=['Manager', 'Admin']).exists()
-        )
+        return get_roles(request).is_manager_or_admin
 
 class IsStaff(permissions.BasePermission):
     """
@@ -52,3 +52,13 @@ class IsCustomerOrStaff(permissions.BasePermission):
         if not (request.user and request.user.is_authenticated):
             return False
         return not request.user.is_staff or request.user.is_staff
+
+class IsUsageCollector(permissions.BasePermission):
+    """
+    NAS exporters presenting USAGE_COLLECTOR_KEY in the X-API-Key header, or admins.
+    """
+    def has_permission(self, request, view):
+        key = request.headers.get('X-API-Key', '')
+        if settings.USAGE_COLLECTOR_KEY and hmac.compare_digest(key.encode(), settings.USAGE_COLLECTOR_KEY.encode()):
+            return True
+        return request.user.is_authenticated and request.user.is_superuser
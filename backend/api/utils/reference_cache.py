@@ -0,0 +1,138 @@
+import threading
+import time
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+VERSION_KEY = 'reference:version'
+
+# Lookup tables keyed by name, with the name field of each model
+NAMED_MODELS = {
+    'PaymentMethod': 'method',
+    'Region': 'name',
+    'EmployeeRole': 'name',
+    'EquipmentCategory': 'name',
+}
+
+# Models whose changes invalidate the cache (see signals)
+REFERENCE_MODELS = ('Status', 'StatusContext') + tuple(NAMED_MODELS)
+
+
+class ReferenceCache:
+    """
+    Process-local copy of the small reference tables: statuses by
+    (context, status) and payment methods, regions, employee roles and
+    equipment categories by name.
+
+    Every process keeps its own copy and compares it against a version
+    number in the shared cache on every lookup that feeds a write
+    (get_status, get_status_id, get_reference_id) and on every miss;
+    other lookups check at most once per REFERENCE_CACHE_CHECK_INTERVAL
+    seconds. Saving or deleting a reference row bumps the version.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tables = None
+        self._version = None
+        self._checked_at = 0.0
+
+    def _shared_version(self):
+        cache.add(VERSION_KEY, 1, None)
+        return cache.get(VERSION_KEY)
+
+    def _load(self):
+        Status = apps.get_model('api', 'Status')
+        statuses = {}
+        status_contexts = {}
+        for status_id, name, context_id, context in Status.objects.values_list(
+            'id', 'status', 'context_id', 'context__context'
+        ):
+            statuses[(context, name)] = (status_id, context_id)
+            status_contexts[status_id] = context
+
+        tables = {'status': statuses, 'status_context': status_contexts}
+        for model_name, field in NAMED_MODELS.items():
+            model = apps.get_model('api', model_name)
+            tables[model_name] = dict(model.objects.values_list(field, 'id'))
+        return tables
+
+    def tables(self, check=False):
+        """
+        The cached tables, reloaded if another process changed the reference data.
+        check forces the version comparison regardless of the interval.
+        """
+        now = time.monotonic()
+        if self._tables is not None and not check and now - self._checked_at < settings.REFERENCE_CACHE_CHECK_INTERVAL:
+            return self._tables
+
+        version = self._shared_version()
+        with self._lock:
+            if self._tables is None or version != self._version:
+                self._tables = self._load()
+                self._version = version
+            self._checked_at = now
+            return self._tables
+
+    def lookup(self, table, key, check=False):
+        """
+        check compares the version first (one shared cache read), so a row
+        deleted or renamed in another process is never returned.
+        """
+        value = self.tables(check=check)[table].get(key)
+        if value is None and not check:
+            # The row may have been added by another process since the last check
+            value = self.tables(check=True)[table].get(key)
+        return value
+
+    def invalidate(self):
+        """
+        Drops this process's copy at once and tells the other processes to
+        reload theirs when the current transaction commits, so they cannot
+        reload before the change is visible to them.
+        """
+        with self._lock:
+            self._tables = None
+        transaction.on_commit(self._bump_version)
+
+    def _bump_version(self):
+        cache.add(VERSION_KEY, 1, None)
+        cache.incr(VERSION_KEY)
+
+
+reference_cache = ReferenceCache()
+
+
+def get_status_id(context, status):
+    """
+    Id of the status with the given name in the given context, or None.
+    """
+    entry = reference_cache.lookup('status', (context, status), check=True)
+    return entry[0] if entry else None
+
+def get_status(context, status):
+    """
+    Status with the given name in the given context, or None.
+    Built from the cache, so assigning it to a foreign key needs no query.
+    """
+    entry = reference_cache.lookup('status', (context, status), check=True)
+    if entry is None:
+        return None
+    Status = apps.get_model('api', 'Status')
+    return Status(id=entry[0], status=status, context_id=entry[1])
+
+def get_status_context(status_id):
+    """
+    Context name of a status id, or None for unknown ids.
+    """
+    return reference_cache.lookup('status_context', status_id)
+
+def get_reference_id(model_name, name):
+    """
+    Id of a PaymentMethod, Region, EmployeeRole or EquipmentCategory by name, or None.
+    """
+    return reference_cache.lookup(model_name, name, check=True)
+
+def invalidate_reference_cache():
+    reference_cache.invalidate()
@@ -0,0 +1,136 @@
+import uuid
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from rest_framework_simplejwt.tokens import Token
+
+# JWT claims written at login and refresh (see RoleTokenObtainPairSerializer)
+ROLE_CLAIMS = ('groups', 'employee_id', 'employee_role', 'customer_id')
+
+# Claim holding the roles version the role claims were read at
+ROLES_VERSION_CLAIM = 'roles_version'
+
+# Shared cache key of a user's current roles version
+ROLES_VERSION_KEY = 'user-roles-version:{}'
+
+
+class UserRoles:
+    """
+    Groups, employee role and customer profile id of the requesting user.
+    """
+
+    def __init__(self, user, groups=(), employee_id=None, employee_role=None, customer_id=None):
+        self.is_authenticated = bool(user and user.is_authenticated)
+        self.is_superuser = self.is_authenticated and user.is_superuser
+        self.is_staff = self.is_authenticated and user.is_staff
+        self.groups = frozenset(groups)
+        self.employee_id = employee_id
+        self.employee_role = employee_role
+        self.customer_id = customer_id
+
+    @property
+    def role(self):
+        """Lower-cased employee role name, or None for non-employees."""
+        return self.employee_role.lower() if self.employee_role else None
+
+    @property
+    def is_employee(self):
+        return self.employee_id is not None
+
+    @property
+    def is_customer(self):
+        return self.customer_id is not None
+
+    def in_group(self, *names):
+        return self.is_authenticated and not self.groups.isdisjoint(names)
+
+    @property
+    def is_manager_or_admin(self):
+        return self.is_superuser or self.in_group('Manager', 'Admin')
+
+    def claims(self):
+        return {
+            'groups': sorted(self.groups),
+            'employee_id': self.employee_id,
+            'employee_role': self.employee_role,
+            'customer_id': self.customer_id,
+        }
+
+
+def load_roles(user):
+    """
+    Reads the roles of a user from the database with a single query.
+    """
+    if not (user and user.is_authenticated):
+        return UserRoles(user)
+    rows = (
+        type(user).objects
+        .filter(pk=user.pk)
+        .values('employee_profile__id', 'employee_profile__role__name', 'customer_profile__id')
+        .annotate(group_names=ArrayAgg('groups__name', distinct=True, filter=Q(groups__isnull=False)))
+    )
+    row = next(iter(rows), {})
+    return UserRoles(
+        user,
+        groups=row.get('group_names') or (),
+        employee_id=row.get('employee_profile__id'),
+        employee_role=row.get('employee_profile__role__name'),
+        customer_id=row.get('customer_profile__id'),
+    )
+
+
+def roles_version(user_id):
+    """
+    Current roles version of a user, created on first use.
+    """
+    key = ROLES_VERSION_KEY.format(user_id)
+    cache.add(key, uuid.uuid4().hex, None)
+    return cache.get(key)
+
+def invalidate_roles(user_ids):
+    """
+    Retires the roles versions of users whose groups, employee role or
+    customer profile changed, so tokens issued before the change fall back
+    to the database. Dropped again on commit, as a token issued before the
+    commit may have read the old roles under a new version.
+    """
+    keys = [ROLES_VERSION_KEY.format(user_id) for user_id in user_ids]
+    if not keys:
+        return
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+def role_claims(user):
+    """
+    Role claims of a user for a new token, tagged with the roles version.
+    """
+    # The version is read first: a change after it retires the version, whatever roles are read
+    version = roles_version(user.pk)
+    return {**load_roles(user).claims(), ROLES_VERSION_CLAIM: version}
+
+def get_roles(request):
+    """
+    Roles of the requesting user, resolved once per request.
+
+    Taken from the access token claims when the request was authenticated
+    with a token issued by the login or refresh view and the user's roles
+    did not change since (a cache lookup, no queries), otherwise loaded
+    from the database.
+    """
+    roles = getattr(request, '_user_roles', None)
+    if roles is not None:
+        return roles
+
+    token = getattr(request, 'auth', None)
+    if (
+        isinstance(token, Token)
+        and all(claim in token for claim in ROLE_CLAIMS + (ROLES_VERSION_CLAIM,))
+        and token[ROLES_VERSION_CLAIM] == cache.get(ROLES_VERSION_KEY.format(request.user.pk))
+    ):
+        roles = UserRoles(request.user, **{claim: token[claim] for claim in ROLE_CLAIMS})
+    else:
+        roles = load_roles(request.user)
+
+    request._user_roles = roles
+    return roles
@@ -3,11 +3,12 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.decorators import action
-from rest_framework_simplejwt.views import TokenObtainPairView
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from django_ratelimit.decorators import ratelimit
-from ..serializers import UserRegisterSerializer, UserSerializer
+from ..serializers import UserRegisterSerializer, UserSerializer, RoleTokenObtainPairSerializer, RoleTokenRefreshSerializer
 from ..models import User
 from ..utils.permissions import IsManager
+from ..utils.roles import get_roles
 from ..utils.mixins import StandardResponseMixin
 
 class UserRegistrationView(StandardResponseMixin, APIView):
@@ -32,10 +33,14 @@ class LoginRateThrottle(AnonRateThrottle):
 
 class UserLoginView(StandardResponseMixin, TokenObtainPairView):
     throttle_classes = [LoginRateThrottle]
+    serializer_class = RoleTokenObtainPairSerializer
     
     def post(self, request, *args, **kwargs):
         return super().post(request, *args, **kwargs)
 
+class RoleTokenRefreshView(TokenRefreshView):
+    serializer_class = RoleTokenRefreshSerializer
+
 class CurrentUserView(StandardResponseMixin, APIView):
     permission_classes = [IsAuthenticated]
     
@@ -80,9 +85,8 @@ class UserViewSet(StandardResponseMixin, viewsets.ModelViewSet):
         queryset = super().get_queryset()
         user = self.request.user
         
-        if hasattr(user, 'employee_profile'):
-            if user.employee_profile.role.name.lower() == 'manager':
-                return queryset
+        if get_roles(self.request).role == 'manager':
+            return queryset
         
         return queryset.filter(id=user.id)
     
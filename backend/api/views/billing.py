@@ -2,7 +2,8 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework import viewsets, status, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.http import HttpResponse
+from django.utils.timezone import now
+from datetime import datetime
 
 from ..models import Tariff, Service, Payment, Invoice, PaymentMethod, TariffService
 from ..serializers import (
@@ -10,8 +11,9 @@ from ..serializers import (
     PaymentMethodSerializer, TariffDetailSerializer
 )
 from ..utils.permissions import IsManager, IsAdmin, IsCustomer, ReadOnlyOrAdmin, IsManagerOrAdmin, IsStaff
-from ..services.pdf_service import generate_invoice_pdf, generate_receipt_pdf
-from ..utils.mixins import StandardResponseMixin
+from ..utils.roles import get_roles
+from ..utils.mixins import StandardResponseMixin, PDFDownloadMixin
+from .jobs import wants_background_job, start_import_job, start_export_job
 
 class TariffViewSet(StandardResponseMixin, viewsets.ModelViewSet):
     permission_classes = [ReadOnlyOrAdmin]
@@ -57,12 +59,15 @@ class TariffViewSet(StandardResponseMixin, viewsets.ModelViewSet):
     @action(detail=False, methods=['GET'], url_path='export_csv', permission_classes=[IsManagerOrAdmin])
     def export_csv(self, request):
         from ..services.csv_service import CSVService
-        from django.http import HttpResponse
+        from django.http import StreamingHttpResponse
+        
+        if wants_background_job(request):
+            return start_export_job(request, 'tariffs')
         
         queryset = self.filter_queryset(self.get_queryset())
-        csv_data = CSVService.export_tariffs(queryset)
         
-        response = HttpResponse(csv_data, content_type='text/csv')
+        # Rows are read from a server-side cursor while the response is sent
+        response = StreamingHttpResponse(CSVService.export_tariffs(queryset), content_type='text/csv')
         response['Content-Disposition'] = 'attachment; filename="tariffs.csv"'
         return response
 
@@ -72,6 +77,8 @@ class TariffViewSet(StandardResponseMixin, viewsets.ModelViewSet):
         csv_file = request.FILES.get('csv_file')
         if not csv_file:
             return Response({'error': 'No file uploaded'}, status=status.HTTP_400_BAD_REQUEST)
+        if wants_background_job(request):
+            return start_import_job(request, 'tariffs', csv_file)
         
         count, errors = CSVService.import_tariffs(csv_file)
         return Response({
@@ -100,41 +107,58 @@ class ServiceViewSet(StandardResponseMixin, viewsets.ModelViewSet):
                 status=status.HTTP_200_OK
             )
 
-class PaymentViewSet(StandardResponseMixin, viewsets.ModelViewSet):
-    queryset = Payment.objects.select_related("customer", "method").order_by("-payment_date")
+class PaymentViewSet(StandardResponseMixin, PDFDownloadMixin, viewsets.ModelViewSet):
+    queryset = Payment.objects.select_related("customer", "customer__user", "method").order_by("-payment_date")
     serializer_class = PaymentSerializer
     
     def get_queryset(self):
-        user = self.request.user
-        if hasattr(user, 'customer_profile'):
-            return self.queryset.filter(customer=user.customer_profile)
+        roles = get_roles(self.request)
+        if roles.is_customer:
+            return self.queryset.filter(customer_id=roles.customer_id)
         return self.queryset
 
     @action(detail=True, methods=['get'], permission_classes=[IsAuthenticated])
     def receipt(self, request, pk=None):
         payment = self.get_object()
-        buffer = generate_receipt_pdf(payment)
-        response = HttpResponse(buffer, content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="receipt_{payment.id}.pdf"'
-        return response
+        return self.pdf_response(request, 'receipts', payment, f'receipt_{payment.id}.pdf')
 
-class InvoiceViewSet(StandardResponseMixin, viewsets.ModelViewSet):
-    queryset = Invoice.objects.select_related("contract", "contract__customer", "contract__service").order_by("-issue_date")
+class InvoiceViewSet(StandardResponseMixin, PDFDownloadMixin, viewsets.ModelViewSet):
+    queryset = Invoice.objects.select_related(
+        "contract", "contract__customer", "contract__customer__user", "contract__service"
+    ).order_by("-issue_date")
     serializer_class = InvoiceSerializer
+    # Cursor pages (?cursor=) walk invoices by due date, served by the (status, due_date) index
+    keyset_ordering = '-due_date'
     
     def get_queryset(self):
-        user = self.request.user
-        if hasattr(user, 'customer_profile'):
-            return self.queryset.filter(contract__customer=user.customer_profile)
-        return self.queryset
+        roles = get_roles(self.request)
+        queryset = self.queryset
+        status_filter = self.request.query_params.get('status')
+        if status_filter:
+            queryset = queryset.filter(status=status_filter)
+        if roles.is_customer:
+            return queryset.filter(contract__customer_id=roles.customer_id)
+        return queryset
 
     @action(detail=True, methods=['get'], permission_classes=[IsAuthenticated])
     def pdf(self, request, pk=None):
         invoice = self.get_object()
-        buffer = generate_invoice_pdf(invoice)
-        response = HttpResponse(buffer, content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="invoice_{invoice.id}.pdf"'
-        return response
+        return self.pdf_response(request, 'invoices', invoice, f'invoice_{invoice.id}.pdf')
+
+    @action(detail=False, methods=['get'], permission_classes=[IsManager])
+    def pdf_bundle(self, request):
+        """
+        Starts a background job rendering all invoices issued in a month
+        (?month=YYYY-MM, default: current month) into a zip of PDFs, or into
+        one multi-page PDF with ?combine=1. Answers 202 with the job, whose
+        download_url serves the file once it has completed.
+        """
+        month = request.query_params.get('month') or now().strftime('%Y-%m')
+        try:
+            datetime.strptime(month, '%Y-%m')
+        except ValueError:
+            return Response({'error': 'month must be YYYY-MM'}, status=status.HTTP_400_BAD_REQUEST)
+        return start_export_job(request, 'invoice_pdfs', month=month)
 
 class PaymentMethodViewSet(StandardResponseMixin, viewsets.ModelViewSet):
     queryset = PaymentMethod.objects.all()
@@ -3,6 +3,8 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from django.db import transaction
+from django.utils.dateparse import parse_date
+from datetime import timedelta
 
 from ..models import (
     Customer, Address, Region, Status, Contract, Invoice, Payment, 
@@ -15,11 +17,14 @@ from ..serializers import (
     BalanceTransactionSerializer, ClientScoreSerializer, NotificationSerializer
 )
 from ..utils.permissions import IsCustomer, IsManager, IsSupport, IsAdmin, IsManagerOrAdmin
+from ..utils.roles import get_roles
+from ..utils.reference_cache import get_status
 from ..utils.pagination import StandardResultsSetPagination
 from ..utils.mixins import StandardResponseMixin
+from .jobs import wants_background_job, start_import_job, start_export_job
 
 class CustomerViewSet(StandardResponseMixin, viewsets.ModelViewSet):
-    queryset = Customer.objects.select_related("user", "status").prefetch_related("addresses")
+    queryset = Customer.objects.select_related("user", "status")
     serializer_class = CustomerSerializer
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['user__first_name', 'user__last_name', 'user__email', 'phone_number']
@@ -41,10 +46,14 @@ class CustomerViewSet(StandardResponseMixin, viewsets.ModelViewSet):
 
     def get_queryset(self):
         queryset = super().get_queryset()
-        user = self.request.user
+        roles = get_roles(self.request)
         
-        if hasattr(user, 'customer_profile'):
-            return queryset.filter(id=user.customer_profile.id)
+        if self.action in ['list', 'retrieve', 'customer_details']:
+            # Prefetch what the serializer's fields read, so a page costs a fixed number of queries
+            queryset = self.get_serializer_class().setup_eager_loading(queryset)
+        
+        if roles.is_customer:
+            return queryset.filter(id=roles.customer_id)
         
         # Admin/Manager filters
         status_filter = self.request.query_params.get('status')
@@ -58,20 +67,18 @@ class CustomerViewSet(StandardResponseMixin, viewsets.ModelViewSet):
         return queryset
 
     def perform_create(self, serializer):
-        try:
-            default_status = Status.objects.get(status='New', context__context='Customer')
+        default_status = get_status('Customer', 'New')
+        if default_status:
             serializer.save(status=default_status)
-        except Status.DoesNotExist:
+        else:
             serializer.save()
-        except Status.MultipleObjectsReturned:
-            default_status = Status.objects.filter(status='New', context__context='Customer').first()
-            serializer.save(status=default_status)
     
     @action(detail=True, methods=['get'], permission_classes=[IsAuthenticated])
     def dashboard(self, request, pk=None):      
         customer = self.get_object()
         
-        if hasattr(request.user, 'customer_profile') and request.user.customer_profile.id != customer.id:
+        roles = get_roles(request)
+        if roles.is_customer and roles.customer_id != customer.id:
             return Response({'error': 'Not authorized'}, status=status.HTTP_403_FORBIDDEN)
         
         total_monthly_payment = customer.get_total_monthly_payment()
@@ -173,9 +180,9 @@ class CustomerViewSet(StandardResponseMixin, viewsets.ModelViewSet):
         customer = self.get_object()
         
         # Permission check
-        user = request.user
-        is_manager = user.groups.filter(name__in=['Manager', 'Admin']).exists() or user.is_superuser
-        is_owner = hasattr(user, 'customer_profile') and user.customer_profile.id == customer.id
+        roles = get_roles(request)
+        is_manager = roles.is_manager_or_admin
+        is_owner = roles.customer_id == customer.id
         
         if not (is_manager or is_owner):
             return Response({'error': 'Not authorized'}, status=status.HTTP_403_FORBIDDEN)
@@ -183,7 +190,18 @@ class CustomerViewSet(StandardResponseMixin, viewsets.ModelViewSet):
         from ..models import BalanceTransaction
         from ..serializers import BalanceTransactionSerializer
         
-        transactions = BalanceTransaction.objects.filter(customer=customer).order_by('-created_at')
+        transactions = BalanceTransaction.objects.filter(customer=customer)
+        # Bounds on created_at itself let PostgreSQL skip the monthly partitions outside the range
+        try:
+            start_date = parse_date(request.query_params.get('start_date', ''))
+            end_date = parse_date(request.query_params.get('end_date', ''))
+        except ValueError:
+            return Response({'error': 'Dates must be YYYY-MM-DD'}, status=status.HTTP_400_BAD_REQUEST)
+        if start_date:
+            transactions = transactions.filter(created_at__gte=start_date)
+        if end_date:
+            transactions = transactions.filter(created_at__lt=end_date + timedelta(days=1))
+        transactions = transactions.order_by('-created_at')
         
         page = self.paginate_queryset(transactions)
         if page is not None:
@@ -198,9 +216,9 @@ class CustomerViewSet(StandardResponseMixin, viewsets.ModelViewSet):
         customer = self.get_object()
         
         # Permission check
-        user = request.user
-        is_manager = user.groups.filter(name__in=['Manager', 'Admin']).exists() or user.is_superuser
-        is_owner = hasattr(user, 'customer_profile') and user.customer_profile.id == customer.id
+        roles = get_roles(request)
+        is_manager = roles.is_manager_or_admin
+        is_owner = roles.customer_id == customer.id
         
         if not (is_manager or is_owner):
             return Response({'error': 'Not authorized'}, status=status.HTTP_403_FORBIDDEN)
@@ -214,7 +232,7 @@ class CustomerViewSet(StandardResponseMixin, viewsets.ModelViewSet):
         customer = self.get_object()
         
         # Permission check: owner only
-        if not (hasattr(request.user, 'customer_profile') and request.user.customer_profile.id == customer.id):
+        if get_roles(request).customer_id != customer.id:
             return Response({'error': 'Not authorized'}, status=status.HTTP_403_FORBIDDEN)
             
         unread_notifications = Notification.objects.filter(customer=customer, is_read=False).order_by('-created_at')
@@ -233,12 +251,15 @@ class CustomerViewSet(StandardResponseMixin, viewsets.ModelViewSet):
     @action(detail=False, methods=['GET'], url_path='export_csv', permission_classes=[IsManagerOrAdmin])
     def export_csv(self, request):
         from ..services.csv_service import CSVService
-        from django.http import HttpResponse
+        from django.http import StreamingHttpResponse
+        
+        if wants_background_job(request):
+            return start_export_job(request, 'customers')
         
         queryset = self.filter_queryset(self.get_queryset())
-        csv_data = CSVService.export_customers(queryset)
         
-        response = HttpResponse(csv_data, content_type='text/csv')
+        # Rows are read from a server-side cursor while the response is sent
+        response = StreamingHttpResponse(CSVService.export_customers(queryset), content_type='text/csv')
         response['Content-Disposition'] = 'attachment; filename="customers.csv"'
         return response
 
@@ -248,8 +269,13 @@ class CustomerViewSet(StandardResponseMixin, viewsets.ModelViewSet):
         csv_file = request.FILES.get('csv_file')
         if not csv_file:
             return Response({'error': 'No file provided'}, status=status.HTTP_400_BAD_REQUEST)
+        if wants_background_job(request):
+            return start_import_job(request, 'customers', csv_file)
             
-        created_count, errors = CSVService.import_customers(csv_file)
+        if request.data.get('mode', request.query_params.get('mode')) == 'bulk':
+            created_count, errors = CSVService.import_customers_bulk(csv_file)
+        else:
+            created_count, errors = CSVService.import_customers(csv_file)
         if errors:
             return Response({'created': created_count, 'errors': errors}, status=status.HTTP_207_MULTI_STATUS)
         return Response({'created': created_count}, status=status.HTTP_201_CREATED)
@@ -269,12 +295,10 @@ class CustomerViewSet(StandardResponseMixin, viewsets.ModelViewSet):
             instance.user.is_active = False
             instance.user.save()
             
-            try:
-                inactive_status = Status.objects.get(status='Inactive', context__context='Customer')
+            inactive_status = get_status('Customer', 'Inactive')
+            if inactive_status:
                 instance.status = inactive_status
                 instance.save()
-            except Status.DoesNotExist:
-                pass
                 
             return Response(
                 {"message": "Customer has active records (contracts, invoices, etc.) and cannot be deleted. They have been deactivated instead."},
@@ -287,14 +311,15 @@ class AddressViewSet(StandardResponseMixin, viewsets.ModelViewSet):
     serializer_class = AddressSerializer
     
     def get_queryset(self):
-        user = self.request.user
-        if hasattr(user, 'customer_profile'):
-            return self.queryset.filter(customer=user.customer_profile)
+        roles = get_roles(self.request)
+        if roles.is_customer:
+            return self.queryset.filter(customer_id=roles.customer_id)
         return self.queryset
     
     def perform_create(self, serializer):
-        if hasattr(self.request.user, 'customer_profile'):
-            serializer.save(customer=self.request.user.customer_profile)
+        roles = get_roles(self.request)
+        if roles.is_customer:
+            serializer.save(customer_id=roles.customer_id)
         else:
             serializer.save()
 
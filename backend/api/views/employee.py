@@ -9,8 +9,10 @@ from django.db.models import Sum
 from ..models import Employee, EmployeeRole, Customer, ConnectionRequest, SupportTicket, Invoice, Payment
 from ..serializers import EmployeeSerializer, EmployeeRoleSerializer, PaymentSerializer, SupportTicketSerializer
 from ..utils.permissions import IsManager, IsAdmin, IsManagerOrAdmin
+from ..utils.roles import get_roles
 from ..utils.pagination import StandardResultsSetPagination
 from ..utils.mixins import StandardResponseMixin
+from .jobs import wants_background_job, start_import_job, start_export_job
 
 class EmployeeViewSet(StandardResponseMixin, viewsets.ModelViewSet):
     queryset = Employee.objects.all()
@@ -29,17 +31,16 @@ class EmployeeViewSet(StandardResponseMixin, viewsets.ModelViewSet):
     
     def get_queryset(self):
         queryset = super().get_queryset()
-        user = self.request.user
+        roles = get_roles(self.request)
         
         # Allow superusers and managers/admins to see all employees
-        if user.is_superuser:
+        if roles.is_superuser:
             return queryset
             
-        if hasattr(user, 'employee_profile'):
-            role_name = user.employee_profile.role.name.lower()
-            if role_name in ['manager', 'admin']:
+        if roles.is_employee:
+            if roles.role in ['manager', 'admin']:
                 return queryset
-            return queryset.filter(id=user.employee_profile.id)
+            return queryset.filter(id=roles.employee_id)
         
         return queryset
 
@@ -74,12 +75,15 @@ class EmployeeViewSet(StandardResponseMixin, viewsets.ModelViewSet):
     @action(detail=False, methods=['GET'], url_path='export_csv', permission_classes=[IsManagerOrAdmin])
     def export_csv(self, request):
         from ..services.csv_service import CSVService
-        from django.http import HttpResponse
+        from django.http import StreamingHttpResponse
+        
+        if wants_background_job(request):
+            return start_export_job(request, 'employees')
         
         queryset = self.filter_queryset(self.get_queryset())
-        csv_data = CSVService.export_employees(queryset)
         
-        response = HttpResponse(csv_data, content_type='text/csv')
+        # Rows are read from a server-side cursor while the response is sent
+        response = StreamingHttpResponse(CSVService.export_employees(queryset), content_type='text/csv')
         response['Content-Disposition'] = 'attachment; filename="employees.csv"'
         return response
 
@@ -89,6 +93,8 @@ class EmployeeViewSet(StandardResponseMixin, viewsets.ModelViewSet):
         csv_file = request.FILES.get('csv_file')
         if not csv_file:
             return Response({'error': 'No file uploaded'}, status=status.HTTP_400_BAD_REQUEST)
+        if wants_background_job(request):
+            return start_import_job(request, 'employees', csv_file)
         
         count, errors = CSVService.import_employees(csv_file)
         return Response({
@@ -1,15 +1,19 @@
+import io
+import zlib
 from rest_framework.permissions import IsAuthenticated
-from rest_framework import viewsets, filters
+from rest_framework import viewsets, filters, status
+from rest_framework.views import APIView
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django.utils.timezone import now
 from datetime import timedelta
 from django.db.models import Sum, Count
 
-from ..models import Equipment, EquipmentCategory, NetworkUsage, Status
+from ..models import Equipment, EquipmentCategory, NetworkUsage, DailyTariffUsage, Status
 from ..serializers import EquipmentSerializer, EquipmentCategorySerializer, NetworkUsageSerializer, StatusSerializer
-from ..utils.permissions import IsManager, IsAdmin, IsCustomer
+from ..utils.permissions import IsManager, IsAdmin, IsCustomer, IsUsageCollector
 from ..utils.mixins import StandardResponseMixin
+from ..services.usage_collector import collector, read_samples, aggregate_samples
 
 class EquipmentViewSet(StandardResponseMixin, viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
@@ -32,9 +36,10 @@ class NetworkUsageViewSet(StandardResponseMixin, viewsets.ModelViewSet):
     @action(detail=False, methods=['get'], permission_classes=[IsManager])
     def summary(self, request):
         days = int(request.query_params.get('days', 30))
-        start_date = now() - timedelta(days=days)
+        start_date = (now() - timedelta(days=days)).date()
         
-        daily_usage = NetworkUsage.objects.filter(
+        # Served from the daily x tariff rollup instead of raw usage rows
+        daily_usage = DailyTariffUsage.objects.filter(
             date__gte=start_date
         ).values('date').annotate(
             total_download=Sum('download_gb'),
@@ -54,3 +59,35 @@ class StatusViewSet(StandardResponseMixin, viewsets.ModelViewSet):
         if context_name:
             queryset = queryset.filter(context__context=context_name)
         return queryset
+
+class UsageCollectorView(StandardResponseMixin, APIView):
+    """
+    Receives batches of per-contract byte counters from the NAS exporters.
+
+    The body is JSON lines, or CSV with Content-Type text/csv, of
+    contract_id, timestamp (ISO 8601 or Unix time), download_bytes and
+    upload_bytes, where the counters are the bytes transferred since the
+    previous sample. Content-Encoding gzip and deflate are accepted.
+    Samples are summed per contract and day and handed to the usage
+    collector, which writes them to NetworkUsage in periodic flushes.
+    """
+    permission_classes = [IsUsageCollector]
+    MAX_REPORTED_ERRORS = 20
+
+    def post(self, request):
+        encoding = request.headers.get('Content-Encoding', '').lower()
+        if encoding not in ('', 'identity', 'gzip', 'deflate'):
+            return Response({'error': f'Unsupported Content-Encoding: {encoding}'}, status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+
+        try:
+            samples = read_samples(request.stream or io.BytesIO(), request.content_type, encoding)
+            totals, accepted, errors = aggregate_samples(samples)
+        except (ValueError, OSError, EOFError, zlib.error) as e:
+            return Response({'error': f'Unreadable batch: {e}'}, status=status.HTTP_400_BAD_REQUEST)
+
+        collector.add(totals)
+        return Response({
+            'accepted': accepted,
+            'rejected': len(errors),
+            'errors': errors[:self.MAX_REPORTED_ERRORS],
+        }, status=status.HTTP_202_ACCEPTED)
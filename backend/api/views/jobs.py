@@ -0,0 +1,65 @@
+import mimetypes
+import os
+from django.http import FileResponse
+from rest_framework import viewsets, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from ..models import DataJob
+from ..serializers import DataJobSerializer
+from ..utils.permissions import IsManagerOrAdmin
+from ..utils.pagination import StandardResultsSetPagination
+from ..utils.mixins import StandardResponseMixin
+from ..services.data_jobs import create_import_job, create_export_job
+from ..tasks.data_jobs import queue_data_job
+
+def wants_background_job(request):
+    """
+    True when an import/export action was asked to run as a DataJob (?async=1).
+    """
+    value = request.data.get('async', request.query_params.get('async', ''))
+    return str(value).lower() in ('1', 'true', 'yes')
+
+def start_import_job(request, resource, csv_file):
+    job = create_import_job(resource, csv_file, request.user)
+    queue_data_job(job)
+    return Response(DataJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+def start_export_job(request, resource, **defaults):
+    """
+    Queues an export of the rows the view returns for the request's query
+    parameters, plus defaults ({name: value}) for the ones it leaves out.
+    """
+    # The worker filters the rows with the same parameters as the synchronous export
+    parameters = {name: [value] for name, value in defaults.items()}
+    parameters.update((name, values) for name, values in request.query_params.lists() if name != 'async')
+    job = create_export_job(resource, request.user, parameters)
+    queue_data_job(job)
+    return Response(DataJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+class DataJobViewSet(StandardResponseMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Status of background CSV imports and exports, and their result files.
+    """
+    queryset = DataJob.objects.all()
+    serializer_class = DataJobSerializer
+    permission_classes = [IsManagerOrAdmin]
+    pagination_class = StandardResultsSetPagination
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        status_filter = self.request.query_params.get('status')
+        if status_filter:
+            queryset = queryset.filter(status=status_filter)
+        return queryset
+
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        job = self.get_object()
+        if job.status != DataJob.COMPLETED or not job.result_file or not os.path.exists(job.result_file):
+            return Response({'error': 'Result not available'}, status=status.HTTP_404_NOT_FOUND)
+        return FileResponse(
+            open(job.result_file, 'rb'),
+            as_attachment=True,
+            filename=os.path.basename(job.result_file),
+            content_type=mimetypes.guess_type(job.result_file)[0] or 'application/octet-stream'
+        )
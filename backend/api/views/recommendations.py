@@ -5,6 +5,8 @@ from rest_framework.decorators import action
 from ..models import TariffRecommendation
 from ..serializers import TariffRecommendationSerializer
 from ..utils.permissions import IsManager, IsAdmin
+from ..utils.roles import get_roles
+from ..utils.reference_cache import get_status
 from ..utils.mixins import StandardResponseMixin
 
 class TariffRecommendationViewSet(StandardResponseMixin, viewsets.ModelViewSet):
@@ -18,11 +20,11 @@ class TariffRecommendationViewSet(StandardResponseMixin, viewsets.ModelViewSet):
 
     def get_queryset(self):
         queryset = super().get_queryset()
-        user = self.request.user
+        roles = get_roles(self.request)
 
-        if hasattr(user, 'customer_profile'):
-            queryset = queryset.filter(customer=user.customer_profile)
-        elif not user.is_staff:
+        if roles.is_customer:
+            queryset = queryset.filter(customer_id=roles.customer_id)
+        elif not roles.is_staff:
             return self.queryset.none()
         
         is_reviewed = self.request.query_params.get('is_reviewed')
@@ -70,7 +72,7 @@ class TariffRecommendationViewSet(StandardResponseMixin, viewsets.ModelViewSet):
              
         try:
             # Try to get 'New' or 'Pending' status for ConnectionRequest
-            new_status = Status.objects.filter(context__context='ConnectionRequest', status__in=['New', 'Pending']).first()
+            new_status = get_status('ConnectionRequest', 'New') or get_status('ConnectionRequest', 'Pending')
             if not new_status:
                 new_status = Status.objects.filter(context__context='ConnectionRequest').first()
         except Status.DoesNotExist:
@@ -7,11 +7,14 @@ from ..models import SupportTicket, ConnectionRequest, Status, Employee
 from ..serializers import SupportTicketSerializer, ConnectionRequestSerializer
 from ..utils.permissions import IsCustomer, IsSupport, IsManager, IsAdmin, IsManagerOrAdmin, IsTechnician, IsStaff
 from ..utils.mixins import StandardResponseMixin
-from ..services.assignment import auto_assign_technician, auto_assign_connection_request
+from ..utils.roles import get_roles
+from ..services.assignment import assign_tickets, assign_connection_requests
 
 class SupportTicketViewSet(StandardResponseMixin, viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
-    queryset = SupportTicket.objects.all().order_by('-created_at')
+    queryset = SupportTicket.objects.select_related(
+        'customer__user', 'customer__status', 'status', 'assigned_to__user', 'assigned_to__role'
+    ).order_by('-created_at')
     serializer_class = SupportTicketSerializer
     filter_backends = [filters.SearchFilter]
     search_fields = ['subject', 'description', 'customer__user__first_name']
@@ -22,25 +25,17 @@ class SupportTicketViewSet(StandardResponseMixin, viewsets.ModelViewSet):
         return [IsAuthenticated()]
 
     def get_queryset(self):
-        user = self.request.user
-        # Check for SLA breaches on uncompleted tickets
-        active_tickets = self.queryset.filter(
-            is_sla_breached=False, 
-            status__status__in=['Open', 'In Progress', 'New']
-        )
-        for ticket in active_tickets:
-            ticket.check_sla_breach()
-
-        if hasattr(user, 'customer_profile'):
-            return self.queryset.filter(customer=user.customer_profile)
+        roles = get_roles(self.request)
+        # SLA breaches are marked by the check_sla_breaches task (services.sla), reads have no side effects
+        if roles.is_customer:
+            return self.queryset.filter(customer_id=roles.customer_id)
         
-        if hasattr(user, 'employee_profile'):
-            employee = user.employee_profile
+        if roles.is_employee:
             # Managers and Admins can see all tickets
-            if employee.role.name.lower() in ['manager', 'admin']:
+            if roles.role in ['manager', 'admin']:
                 return self.queryset
             # Other employees (Support/Technician) only see their assigned tickets
-            return self.queryset.filter(assigned_to=employee)
+            return self.queryset.filter(assigned_to_id=roles.employee_id)
             
         return self.queryset
 
@@ -49,11 +44,10 @@ class SupportTicketViewSet(StandardResponseMixin, viewsets.ModelViewSet):
         """
         Auto-assign all unassigned tickets.
         """
-        unassigned_tickets = SupportTicket.objects.filter(assigned_to__isnull=True)
-        count = 0
-        for ticket in unassigned_tickets:
-            if auto_assign_technician(ticket):
-                count += 1
+        unassigned_tickets = SupportTicket.objects.filter(
+            assigned_to__isnull=True
+        ).select_related('customer__user').order_by('created_at')
+        count = len(assign_tickets(unassigned_tickets))
         return Response({'status': f'Successfully assigned {count} tickets'})
 
 class ConnectionRequestViewSet(StandardResponseMixin, viewsets.ModelViewSet):
@@ -61,17 +55,16 @@ class ConnectionRequestViewSet(StandardResponseMixin, viewsets.ModelViewSet):
     serializer_class = ConnectionRequestSerializer
 
     def get_queryset(self):
-        user = self.request.user
-        if hasattr(user, 'customer_profile'):
-            return self.queryset.filter(customer=user.customer_profile)
+        roles = get_roles(self.request)
+        if roles.is_customer:
+            return self.queryset.filter(customer_id=roles.customer_id)
         
-        if hasattr(user, 'employee_profile'):
-            employee = user.employee_profile
+        if roles.is_employee:
             # Managers and Admins can see all connection requests
-            if employee.role.name.lower() in ['manager', 'admin']:
+            if roles.role in ['manager', 'admin']:
                 return self.queryset
             # Support/Technicians only see requests assigned to them
-            return self.queryset.filter(employees=employee)
+            return self.queryset.filter(employees=roles.employee_id)
             
         return self.queryset
     
@@ -97,9 +90,8 @@ class ConnectionRequestViewSet(StandardResponseMixin, viewsets.ModelViewSet):
         Auto-assign all unassigned connection requests.
         """
         # ConnectionRequests are unassigned if they have no entries in ConnectionRequestAssignment
-        unassigned_requests = ConnectionRequest.objects.filter(connectionrequestassignment__isnull=True)
-        count = 0
-        for conn_req in unassigned_requests:
-            if auto_assign_connection_request(conn_req):
-                count += 1
+        unassigned_requests = ConnectionRequest.objects.filter(
+            connectionrequestassignment__isnull=True
+        ).select_related('customer__user').order_by('created_at')
+        count = len(assign_connection_requests(unassigned_requests))
         return Response({'status': f'Successfully assigned {count} connection requests'})
@@ -24,9 +24,10 @@ app.conf.beat_schedule = {
         'task': 'api.tasks.base.get_network_usage_task',
         'schedule': crontab(hour=1, minute=0),  # щодня о 01:00
     },
+    # Назва лишається старою: DatabaseScheduler зберігає задачі за назвою
     'check-sla-breaches-every-hour': {
         'task': 'api.tasks.tickets.check_sla_breaches',
-        'schedule': crontab(minute=0),  # щогодини
+        'schedule': crontab(),  # щохвилини
     },
     'check-negative-balances-daily': {
         'task': 'api.tasks.billing.check_negative_balances',
@@ -44,4 +45,24 @@ app.conf.beat_schedule = {
         'task': 'api.tasks.billing.check_low_balances',
         'schedule': crontab(hour=9, minute=0),  # щодня о 09:00
     },
+    'refresh-dashboard-snapshot': {
+        'task': 'api.tasks.dashboard.refresh_dashboard_snapshot_task',
+        'schedule': crontab(minute='*/5'),  # кожні 5 хвилин
+    },
+    'create-partitions-daily': {
+        'task': 'api.tasks.base.create_partitions_task',
+        'schedule': crontab(hour=0, minute=30),  # щодня о 00:30
+    },
+    'take-balance-snapshots-daily': {
+        'task': 'api.tasks.ledger.take_all_balance_snapshots',
+        'schedule': crontab(hour=2, minute=30),  # щодня о 02:30
+    },
+    'build-usage-store-daily': {
+        'task': 'api.tasks.base.build_usage_store_task',
+        'schedule': crontab(hour=1, minute=30),  # щодня о 01:30
+    },
+    'resume-stalled-data-jobs': {
+        'task': 'api.tasks.data_jobs.resume_stalled_data_jobs',
+        'schedule': crontab(minute='*/10'),  # кожні 10 хвилин
+    },
 }
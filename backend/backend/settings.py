@@ -160,6 +160,47 @@ CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
 CELERY_BROKER_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
+CELERY_RESULT_BACKEND = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+
+# Customer sweeps (scoring, recommendations, low balance alerts) fan out into id-range shards
+SWEEP_SHARD_SIZE = int(os.getenv('SWEEP_SHARD_SIZE', '1000'))
+SWEEP_SHARD_CONCURRENCY = int(os.getenv('SWEEP_SHARD_CONCURRENCY', '8'))
+
+# Shared cache (rate limits, dashboard snapshots); the web and Celery processes must see the same cache
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('CACHE_URL', os.getenv('REDIS_URL', 'redis://localhost:6379/0')),
+    }
+}
+if 'test' in sys.argv:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+# Lifetime (seconds) of a cached manager dashboard section; Celery beat rebuilds them every 5 minutes
+DASHBOARD_SNAPSHOT_TIMEOUT = int(os.getenv('DASHBOARD_SNAPSHOT_TIMEOUT', '3600'))
+
+# How often (seconds) a process checks whether its copy of the reference tables is stale
+REFERENCE_CACHE_CHECK_INTERVAL = float(os.getenv('REFERENCE_CACHE_CHECK_INTERVAL', '5'))
+
+# Background CSV import/export jobs: working directory (shared by web and Celery workers),
+# rows per checkpoint, and seconds without progress after which a running job is resumed
+DATA_JOB_DIR = os.getenv('DATA_JOB_DIR', str(BASE_DIR / 'data_jobs'))
+DATA_JOB_CHUNK_SIZE = int(os.getenv('DATA_JOB_CHUNK_SIZE', '1000'))
+DATA_JOB_STALL_TIMEOUT = int(os.getenv('DATA_JOB_STALL_TIMEOUT', '600'))
+
+# Rendered contract, invoice and receipt PDFs, keyed by id and a digest of their content
+PDF_CACHE_DIR = os.getenv('PDF_CACHE_DIR', str(BASE_DIR / 'pdf_cache'))
+
+# Usage collector endpoint: key sent by the NAS exporters (X-API-Key header), seconds between
+# flushes of the buffered counters (0 disables the background flush) and buffered (contract, date)
+# keys that trigger an early flush
+USAGE_COLLECTOR_KEY = os.getenv('USAGE_COLLECTOR_KEY', '')
+USAGE_COLLECTOR_FLUSH_INTERVAL = float(os.getenv('USAGE_COLLECTOR_FLUSH_INTERVAL', '10'))
+USAGE_COLLECTOR_MAX_KEYS = int(os.getenv('USAGE_COLLECTOR_MAX_KEYS', '50000'))
+
+# Memory-mapped daily usage history read by analytics and recommendations, and the days it keeps
+USAGE_STORE_DIR = os.getenv('USAGE_STORE_DIR', str(BASE_DIR / 'usage_store'))
+USAGE_STORE_DAYS = int(os.getenv('USAGE_STORE_DAYS', '400'))
 
 INTERNAL_IPS = [
     # ...